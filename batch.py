@@ -0,0 +1,145 @@
+""" Renders many PingStats logs to images in parallel.
+
+Every log is rendered by a `plot.PlotFile` in a worker process with the
+headless Agg backend, each on its own figure, so a batch scales with the
+number of cores instead of running one `main.py -pf` process per log. """
+import os
+import glob
+import time
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from log import core_logger as logger
+
+EXTENSIONS = ('.csv', '.psb', '.sqlite')
+DATABASE = '.sqlite'  # `sqlitelog.EXTENSION`, written beside a log
+
+
+def expand(patterns):
+    """ Returns the sorted, unique log paths matched by `patterns`, each of
+    which is a log, a directory of logs or a glob. A database is left out
+    when the log it was written beside is matched too, as it holds the same
+    rows and would render to the same image. """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in
+                       os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern)
+
+        paths.update(path for path in matches if os.path.isfile(path) and
+                     os.path.splitext(path)[1] in EXTENSIONS)
+
+    logs = set(os.path.splitext(path)[0] for path in paths
+               if not path.endswith(DATABASE))
+    return sorted(path for path in paths if not (
+        path.endswith(DATABASE) and path[:-len(DATABASE)] in logs))
+
+
+def image_path(log_path, out_dir=None):
+    """ Returns the path of the image rendered from `log_path`, in `out_dir`
+    or next to the log. """
+    name = os.path.splitext(os.path.basename(log_path))[0] + '.png'
+    return os.path.join(out_dir or os.path.dirname(log_path), name)
+
+
+def image_paths(log_paths, out_dir=None):
+    """ Returns the `image_path` of each of `log_paths`, except that logs
+    which would render to the same image, such as a CSV log and its binary
+    copy, or logs of one name in different directories with `out_dir`, are
+    named by their file name with its extension, or else by their path. """
+    if not log_paths:
+        return []
+    common = os.path.commonpath([os.path.dirname(os.path.abspath(path))
+                                 for path in log_paths])
+
+    def named(path, name):
+        return os.path.join(out_dir or os.path.dirname(path), name + '.png')
+
+    levels = [[image_path(path, out_dir) for path in log_paths],
+              [named(path, os.path.basename(path)) for path in log_paths],
+              [named(path, os.path.relpath(os.path.abspath(path), common)
+                     .replace(os.sep, '_')) for path in log_paths]]
+    counts = [Counter(images) for images in levels]
+
+    paths = []
+    for i in range(len(log_paths)):
+        for images, count in zip(levels, counts):
+            if count[images[i]] == 1:
+                break
+        paths.append(images[i])
+    return paths
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render(log_path, out_path, **kwargs):
+    """ Renders `log_path` to the image `out_path`, passing `kwargs` to
+    `plot.PlotFile`.
+
+    Returns `(log_path, out_path, seconds, error)`, where `error` is None or
+    the message of the exception that stopped rendering. """
+    started = time.perf_counter()
+    try:
+        import plot
+        plot.PlotFile(log_path, out_path, **kwargs).show_plot()
+        error = None
+    except Exception as e:
+        error = '%s: %s' % (type(e).__name__, e)
+    return log_path, out_path, time.perf_counter() - started, error
+
+
+def render_all(paths, out_dir=None, jobs=None, **kwargs):
+    """ Renders every log in `paths` across `jobs` processes, which default
+    to the number of cores.
+
+    Returns the `render` results in the order the logs finished. """
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+
+    # main.py runs at import, so workers must not re-import it.
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods
+                                          else None)
+
+    results = []
+    with ProcessPoolExecutor(jobs, mp_context=context,
+                             initializer=_init_worker) as executor:
+        futures = [executor.submit(render, path, image, **kwargs)
+                   for path, image in zip(paths, image_paths(paths,
+                                                             out_dir))]
+        for future in as_completed(futures):
+            result = future.result()
+            if result[3] is None:
+                logger.info('Rendered %s in %.2fs' % (result[1], result[2]))
+            else:
+                logger.warning('Could not render %s: %s' % (result[0],
+                                                            result[3]))
+            results.append(result)
+
+    return results
+
+
+def summary(results, wall):
+    """ Returns a report of `results` rendered in `wall` seconds. """
+    failed = [r for r in results if r[3] is not None]
+    times = sorted(r[2] for r in results)
+    if not times:
+        return 'Rendered 0 logs'
+
+    lines = ['Rendered %d of %d logs in %.2fs (%.2fs of rendering, '
+             '%.1fx parallel)' % (len(results) - len(failed), len(results),
+                                  wall, sum(times),
+                                  sum(times) / wall if wall else 0.0),
+             'per log: min=%.2fs median=%.2fs max=%.2fs' % (
+                 times[0], times[len(times) // 2], times[-1])]
+    slowest = max(results, key=lambda r: r[2])
+    lines.append('slowest: %s (%.2fs)' % (slowest[0], slowest[2]))
+    for r in failed:
+        lines.append('failed: %s: %s' % (r[0], r[3]))
+    return '\n'.join(lines)
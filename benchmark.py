@@ -0,0 +1,296 @@
+""" Benchmarks for the hot paths of PingStats.
+
+Probes are answered by a `probers.SyntheticProber`, not the network, so the
+suite needs neither raw sockets nor, apart from `animate`, a display, and
+runs the same way on every machine. Run this module to print every
+benchmark, write them to JSON with --json, and compare them with an earlier
+run with --compare:
+
+    python benchmark.py --json new.json --compare old.json
+
+Every benchmark returns a dict of measurements. Rates are per second and
+times are in seconds, so for each key the better direction is given by
+`HIGHER_IS_BETTER`. """
+import os
+import sys
+import csv
+import json
+import time
+import random
+import platform
+import tempfile
+import subprocess
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+HEAVY = ('tkinter', 'matplotlib', 'numpy')
+HIGHER_IS_BETTER = ('rows_per_s', 'points_per_s', 'probes_per_s', 'fps')
+
+
+def best_of(repeat, func):
+    """ Returns the shortest of `repeat` timed calls to `func`. """
+    times = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def rows(count, seed=0):
+    """ Returns `count` log rows one second apart, 1% of them lost. """
+    generator = random.Random(seed)
+    return [(1.5e9 + i, '' if generator.random() < 0.01 else
+             round(generator.gammavariate(4, 5), 3), 3000, 64, '127.0.0.1')
+            for i in range(count)]
+
+
+def write_log(path, count):
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(rows(count))
+
+
+def bench_plottable(count=200000, lengths=(250, 10000)):
+    """ `plot._PlotTable.append` throughput at several table lengths. """
+    import plot
+
+    result = {}
+    for length in lengths:
+        def append():
+            table = plot._PlotTable(length)
+            for i in range(count):
+                table.append(float(i), 1.0)
+        result['rows_per_s@%d' % length] = count / best_of(3, append)
+    return result
+
+
+def bench_write_csv(count=100000):
+    """ `core.write_csv_data` throughput through a `core.BatchWriter`, with
+    and without a time index. """
+    import core
+    import timeindex
+
+    data = rows(count)
+    result = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, every in (('rows_per_s', 0),
+                            ('rows_per_s@indexed', timeindex.EVERY)):
+            path = os.path.join(directory, name + '.csv')
+
+            def write():
+                with open(path, 'w') as f:
+                    pass
+                fileobj = open(path, 'a+')
+                index = timeindex.TimeIndex(path, every) if every else None
+                writer = core.BatchWriter(fileobj, index=index)
+                for row in data:
+                    core.write_csv_data(writer, row)
+                writer.close()
+            result[name] = count / best_of(3, write)
+    return result
+
+
+def bench_parse(count=200000):
+    """ Parse rates of `plot.PlotFile.yield_points` and `csvlog.read`. """
+    import types
+    import csvlog
+    import plot
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'log.csv')
+        write_log(path, count)
+        log = types.SimpleNamespace(csv_file=path)
+
+        def yield_points():
+            for point in plot.PlotFile.yield_points(log):
+                pass
+
+        return {'rows_per_s@yield_points': count / best_of(3, yield_points),
+                'rows_per_s@csvlog': count / best_of(
+                    3, lambda: csvlog.read(path))}
+
+
+def bench_animate(frames=50, lengths=(250, 2500, 25000)):
+    """ Frame time of `plot.Animate.animate` with full tables of several
+    lengths, one new row per frame. Needs a display. """
+    import tkinter
+    import core
+    import plot
+
+    root = tkinter.Tk()
+    result = {}
+    try:
+        for length in lengths:
+            c = core.Core('127.0.0.1', nofile=True)
+            p = plot.Animate(root, c, table_length=length)
+            p.pack()
+            data = [(row[0], row[1] or core.TIMEOUT_RTT) + row[2:]
+                    for row in rows(length + frames)]
+            for row in data[:length]:
+                p.ptable.append(row[0], row[1])
+
+            times = []
+            for i, row in enumerate(data[length:]):
+                p.worker.rows.append(row)
+                started = time.perf_counter()
+                p.animate(i)
+                root.update_idletasks()
+                times.append(time.perf_counter() - started)
+            p.destroy()
+
+            times.sort()
+            result['frame_s@%d' % length] = times[len(times) // 2]
+            result['fps@%d' % length] = 1 / times[len(times) // 2]
+    finally:
+        root.destroy()
+    return result
+
+
+def bench_probes(count=20000):
+    """ End to end probes per second: scheduling, a simulated probe,
+    statistics and every log writer, with no delay between probes. """
+    import core
+    import probers
+
+    with tempfile.TemporaryDirectory() as directory:
+        c = core.Core('127.0.0.1', directory, 'bench', delay=0,
+                      blocking=True,
+                      prober=probers.SyntheticProber(loss=0.01, seed=0))
+
+        started = time.perf_counter()
+        for i, row in zip(range(count), c.ping_generator):
+            c.record(row)
+        c.close()
+        return {'probes_per_s': count / (time.perf_counter() - started)}
+
+
+def imported_modules(args):
+    """ Returns the set of top level modules a `main.py` process run with
+    `args` imports, from `python -X importtime`. """
+    result = subprocess.run([sys.executable, '-X', 'importtime', MAIN] +
+                            list(args), stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and line.count('|') == 2:
+            name = line.rsplit('|', 1)[1].strip()
+            if name != 'package':  # the header
+                modules.add(name.split('.')[0])
+    return modules
+
+
+def startup(args, runs=10):
+    """ Times `runs` fresh `main.py` processes run with `args`.
+
+    Returns a dict of the fastest, median and slowest wall time in seconds,
+    and the `HEAVY` modules that were imported. """
+    times = []
+    for i in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, MAIN] + list(args),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+    times.sort()
+
+    return {'args': list(args), 'runs': runs, 'min': times[0],
+            'median': times[len(times) // 2], 'max': times[-1],
+            'heavy': sorted(set(HEAVY) & imported_modules(args))}
+
+
+def format_startup(result):
+    return '%-28s min=%.0fms median=%.0fms max=%.0fms imports: %s' % (
+        ' '.join(result['args']), result['min'] * 1000,
+        result['median'] * 1000, result['max'] * 1000,
+        ', '.join(result['heavy']) or '-')
+
+
+def bench_startup(runs=10):
+    """ Startup times of `main.py -v` and of headless image rendering. """
+    result = {'startup_s@-v': startup(['-v'], runs)['median']}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'log.csv')
+        write_log(path, 1000)
+        result['startup_s@-pf'] = startup(
+            ['-pf', path, '-gi', os.path.join(directory, 'log.png')],
+            runs)['median']
+    return result
+
+
+BENCHMARKS = {'plottable': bench_plottable, 'write_csv': bench_write_csv,
+              'parse': bench_parse, 'animate': bench_animate,
+              'probes': bench_probes, 'startup': bench_startup}
+
+
+def run(names=None):
+    """ Runs the benchmarks in `names`, or all of them.
+
+    Returns a dict describing this machine and version, with the results
+    under 'results'. A benchmark that cannot run here, such as `animate`
+    without a display, is recorded as `{'error': message}`. """
+    import core
+
+    report = {'version': core.version, 'python': platform.python_version(),
+              'platform': platform.platform(), 'time': time.time(),
+              'results': {}}
+    for name in names or BENCHMARKS:
+        try:
+            report['results'][name] = BENCHMARKS[name]()
+        except Exception as e:
+            report['results'][name] = {'error': '%s: %s' % (type(e).__name__,
+                                                            e)}
+    return report
+
+
+def compare(old, new):
+    """ Returns one line per measurement in both reports, with the change
+    from `old` to `new` as a percentage where positive is better. """
+    lines = []
+    for name, results in new['results'].items():
+        for key, value in results.items():
+            before = old['results'].get(name, {}).get(key)
+            if not isinstance(value, float) or not isinstance(before, float):
+                continue
+
+            change = (value - before) / before * 100
+            if not key.startswith(HIGHER_IS_BETTER):
+                change = -change
+            lines.append('%-36s %14.6g %14.6g %+7.1f%%' % (
+                name + '.' + key, before, value, change))
+    return '\n'.join(lines)
+
+
+def format_report(report):
+    lines = ['PingStats %s, Python %s, %s' % (
+        report['version'], report['python'], report['platform'])]
+    for name, results in report['results'].items():
+        for key, value in results.items():
+            if isinstance(value, float):
+                value = '%.6g' % value
+            lines.append('%-36s %s' % (name + '.' + key, value))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('names', nargs='*',
+                        help='The benchmarks to run, of %s. Defaults to all.'
+                             % ', '.join(BENCHMARKS))
+    parser.add_argument('--json', help='A path to write the results to.')
+    parser.add_argument('--compare',
+                        help='The path of an earlier --json to compare to.')
+    parsed = parser.parse_args()
+    for name in parsed.names:
+        if name not in BENCHMARKS:
+            parser.error('Unknown benchmark \'%s\'' % name)
+
+    report = run(parsed.names)
+    print(format_report(report))
+
+    if parsed.json is not None:
+        with open(parsed.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if parsed.compare is not None:
+        with open(parsed.compare) as f:
+            print(compare(json.load(f), report))
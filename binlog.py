@@ -0,0 +1,206 @@
+""" A compact, fixed width binary log format for PingStats.
+
+A binary log is a 16 byte header followed by 16 byte records:
+
+    timestamp   float64   seconds since the epoch
+    rtt         float32   return time in milliseconds, NaN on timeout
+    flags       uint16    see FLAG_TIMEOUT
+    target      uint16    index into the target table
+
+The target table lives next to the log in a '.targets' sidecar, one address
+per line, so a target id is simply a line number. Records can be read back
+through `mmap` as zero-copy `numpy` arrays with `BinaryLog`. """
+import os
+import csv
+import mmap
+import struct
+import datetime as dt
+
+import core
+from log import core_logger as logger
+
+EXTENSION = '.psb'
+TARGETS_EXTENSION = '.targets'
+
+MAGIC = b'PSBL'
+VERSION = 1
+HEADER = struct.Struct('<4sHH8x')
+RECORD = struct.Struct('<dfHH')
+
+FLAG_TIMEOUT = 0x1
+
+TIMEOUT_RTT = core.TIMEOUT_RTT  # the value plotted for a timed out ping
+
+
+def targets_path(path):
+    """ Returns the path of the target table sidecar for `path`. """
+    return path + TARGETS_EXTENSION
+
+
+def read_targets(path):
+    """ Returns the list of addresses in the target table for `path`. """
+    try:
+        with open(targets_path(path)) as f:
+            return [line.rstrip('\n') for line in f]
+    except FileNotFoundError:
+        return []
+
+
+def pack_row(row, target):
+    """ Packs a `(timestamp, rtt, ...)` row into a record for `target`. """
+    rtt = row[1]
+    if core.is_timeout(rtt):
+        return RECORD.pack(float(row[0]), float('nan'), FLAG_TIMEOUT, target)
+
+    return RECORD.pack(float(row[0]), float(rtt), 0, target)
+
+
+class BinaryWriter(core.BatchWriter):
+    """ A `core.BatchWriter` that commits rows as binary records.
+
+    `fileobj` must be opened in binary append mode. Addresses are assigned
+    target ids as they are first seen and appended to the target table. """
+
+    def __init__(self, fileobj, batch_rows=64, batch_ms=1000, fsync=False):
+        super(BinaryWriter, self).__init__(fileobj, batch_rows, batch_ms,
+                                           fsync)
+        if fileobj.tell() == 0:
+            fileobj.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+
+        self.targets = {address: i for i, address in
+                        enumerate(read_targets(fileobj.name))}
+
+    def target_id(self, address):
+        """ Returns the target id for `address`, registering it if needed. """
+        address = str(address)
+        try:
+            return self.targets[address]
+        except KeyError:
+            if len(self.targets) > 0xffff:
+                raise ValueError('Binary logs hold at most 65536 targets')
+
+            self.targets[address] = len(self.targets)
+            with open(targets_path(self.fileobj.name), 'a') as f:
+                f.write(address + '\n')
+            return self.targets[address]
+
+    def commit(self, rows):
+        self.fileobj.write(b''.join(pack_row(row, self.target_id(row[4]))
+                                    for row in rows))
+
+
+class BinaryLog:
+    """ A read only, memory mapped view of a binary log.
+
+    `self.records` is a structured `numpy` array over the mapped file, and
+    `self.timestamps`, `self.rtts`, `self.flags` and `self.target_ids` are
+    zero-copy views of its fields. """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        self.targets = read_targets(path)
+        dtype = np.dtype([('timestamp', '<f8'), ('rtt', '<f4'),
+                          ('flags', '<u2'), ('target', '<u2')])
+
+        with open(path, 'rb') as f:
+            magic, version, record_size = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError('%s is not a PingStats binary log' % path)
+            if version != VERSION or record_size != RECORD.size:
+                raise ValueError('Unsupported binary log version %d' % version)
+
+            count = (os.fstat(f.fileno()).st_size - HEADER.size) // RECORD.size
+            if count:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.records = np.frombuffer(self._map, dtype, count,
+                                             HEADER.size)
+            else:
+                self._map = None
+                self.records = np.zeros(0, dtype)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def timestamps(self):
+        return self.records['timestamp']
+
+    @property
+    def rtts(self):
+        return self.records['rtt']
+
+    @property
+    def flags(self):
+        return self.records['flags']
+
+    @property
+    def target_ids(self):
+        return self.records['target']
+
+    def target_mask(self, address):
+        """ Returns a boolean mask selecting the records for `address`. """
+        return self.target_ids == self.targets.index(address)
+
+    def points(self):
+        """ Returns `(timestamps, rtts)` as float64 arrays, with timeouts
+        replaced by `TIMEOUT_RTT` for plotting. """
+        import numpy as np
+
+        rtts = self.rtts.astype(np.float64)
+        rtts[(self.flags & FLAG_TIMEOUT) != 0] = TIMEOUT_RTT
+        return self.timestamps, rtts
+
+    def close(self):
+        """ Releases the memory map. Arrays taken from this log must not be
+        used afterwards. """
+        self.records = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+def parse_timestamp(text):
+    """ Returns the epoch timestamp in `text`, which is either a float or a
+    datetime written by PingStats versions before 2.5, with or without
+    microseconds. """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        parsed = dt.datetime.strptime(text, '%Y-%m-%d %H:%M:%S.%f')
+    except ValueError:
+        parsed = dt.datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
+    return parsed.timestamp()
+
+
+def convert_csv(csv_path, binary_path=None, batch_rows=4096):
+    """ Converts the CSV log at `csv_path` to a binary log, written to
+    `binary_path` or to `csv_path` with its extension replaced by
+    `EXTENSION`.
+
+    Returns the path of the binary log. Raises FileExistsError rather than
+    append to an existing one. """
+    if binary_path is None:
+        binary_path = os.path.splitext(csv_path)[0] + EXTENSION
+
+    with open(csv_path, newline='') as source, \
+            open(binary_path, 'xb') as destination:
+        try:  # left by a binary log since removed
+            os.remove(targets_path(binary_path))
+        except FileNotFoundError:
+            pass
+
+        writer = BinaryWriter(destination, batch_rows, batch_ms=float('inf'))
+        for row in csv.reader(source):
+            if len(row) < 5:
+                logger.warning('Skipping malformed row: %s' % row)
+                continue
+
+            writer.writerow((parse_timestamp(row[0]), row[1], row[2], row[3],
+                             row[4]))
+        writer.close()
+
+    return binary_path
@@ -1,14 +1,26 @@
 import time
 import socket
-import datetime as dt
 import csv
+import io
 import os
+import sys
+import atexit
+import signal
+import weakref
+import math
+import heapq
+import itertools
+import threading
+from collections import deque
 
 from pythonping import ping as pyping
 
-from log import core_logger as logger
+import metrics
+import timeindex
+from log import Sampler, core_logger as logger
 
 # GLOBALS
+TIMEOUT_RTT = -100.00  # the return time recorded for a failed ping
 buildname = "PingStats"
 version = "2.4.1"
 versiondate = "Fri Jun  2 06:35:35 2017"
@@ -16,6 +28,32 @@ versionstr = "PingStats Version %s (C) Ariana Giroux, Eclectick Media " \
              "Solutions. circa %s" % (
                  version, versiondate)
 
+# Hot path metrics, see `metrics`.
+PROBES = metrics.REGISTRY.counter('pingstats_probes_total', 'Probes sent.')
+PROBES_LOST = metrics.REGISTRY.counter('pingstats_probes_lost_total',
+                                       'Probes that never returned.')
+PROBE_SECONDS = metrics.REGISTRY.histogram(
+    'pingstats_probe_seconds', 'Time to send a probe and await its reply.')
+MISSED_SLOTS = metrics.REGISTRY.counter(
+    'pingstats_missed_slots_total', 'Probe slots skipped for running late.')
+ROWS_WRITTEN = metrics.REGISTRY.counter('pingstats_rows_written_total',
+                                        'Rows passed to Core.write_csv.')
+WRITE_SECONDS = metrics.REGISTRY.histogram(
+    'pingstats_write_seconds', 'Time Core.write_csv took per row.')
+COMMIT_SECONDS = metrics.REGISTRY.histogram(
+    'pingstats_commit_seconds', 'Time to commit a batch of rows to a log.')
+metrics.REGISTRY.gauge(
+    'pingstats_pending_rows', 'Rows held by log writers.',
+    lambda: sum(len(writer.rows) for writer in list(_open_writers)
+                if isinstance(writer, Batcher)))
+# Samplers of the messages logged for every row or probe slot.
+row_sampler = Sampler()
+missed_sampler = Sampler(every=1, per_second=1)
+error_sampler = Sampler(every=1, per_second=1)  # probes that raised
+
+WORKER_ROWS = metrics.REGISTRY.gauge('pingstats_worker_rows',
+                                     'Rows buffered by a ProbeWorker.')
+
 
 def validate_string(text):
     """ Checks `text` for illegal characters. Returns True on validation. """
@@ -32,10 +70,10 @@ def validate_string(text):
     return True
 
 
-def buildfile(path, name):
-    """ Opens a CSV file at specified `path` + `name` + '.csv'.
+def buildfile(path, name, extension='.csv', mode='a+'):
+    """ Opens a CSV file at specified `path` + `name` + `extension`.
 
-    Returns an open TextIOWrapper. """
+    Returns an open file object, a TextIOWrapper by default. """
 
     if not validate_string(path):
         raise ValueError('Illegal path!')
@@ -43,14 +81,14 @@ def buildfile(path, name):
     if not validate_string(name):
         raise ValueError('Illegal file name!')
 
-    name += '.csv'
+    name += extension
 
     try:
-        return open(os.path.join(path, name), 'a+')
+        return open(os.path.join(path, name), mode)
     except OSError:
-        print('Failed to open \'%s\', defaulting to \'%sLog.csv\'.' % (
-            (path + name), buildname))
-        return open('%sLog.csv' % buildname, 'a+')
+        print('Failed to open \'%s\', defaulting to \'%sLog%s\'.' % (
+            (path + name), buildname, extension))
+        return open('%sLog%s' % (buildname, extension), mode)
 
 
 def write_csv_data(writer, data):
@@ -58,77 +96,997 @@ def write_csv_data(writer, data):
     if data is None:  # TODO Should None data be handled by super?
         return data
     else:
-        logger.debug(data)
+        if row_sampler():
+            logger.debug('Row %s', data)
         writer.writerow(data)
         return data
 
 
-def ping(address, timeout=3000, size=64, verbose=True, delay=0.22):
+# Writers that may still hold rows, flushed by `flush_all`.
+_open_writers = weakref.WeakSet()
+
+
+def track_writer(writer):
+    """ Has `flush_all` flush `writer`, until it is untracked. """
+    _open_writers.add(writer)
+
+
+def untrack_writer(writer):
+    _open_writers.discard(writer)
+
+
+def flush_all():
+    """ Flushes every open writer. Registered with `atexit`. """
+    for writer in list(_open_writers):
+        writer.flush()
+
+
+atexit.register(flush_all)
+
+
+def _flush_and_exit(signum, frame):
+    logger.info('Caught signal %d, flushing logs' % signum)
+    flush_all()
+    sys.exit(128 + signum)
+
+
+class IdleFlusher(threading.Thread):
+    """ Commits the batch of a `Batcher` whose writes stopped, once its
+    deadline passes. One thread, started when first needed, serves every
+    writer. """
+
+    def __init__(self):
+        super(IdleFlusher, self).__init__(name='IdleFlusher', daemon=True)
+        self.changed = threading.Condition()
+        self.deadlines = []  # heap of (deadline, order, weakref to writer)
+        self.order = itertools.count()
+
+    def schedule(self, writer, deadline):
+        """ Has `writer.flush_idle` called with `deadline` once it passes,
+        a `time.monotonic` time. """
+        with self.changed:
+            if self.ident is None:
+                self.start()
+            entry = (deadline, next(self.order), weakref.ref(writer))
+            heapq.heappush(self.deadlines, entry)
+            if self.deadlines[0] is entry:
+                self.changed.notify()
+
+    def run(self):
+        with self.changed:
+            while 1:
+                if not self.deadlines:
+                    self.changed.wait()
+                    continue
+                wait = self.deadlines[0][0] - time.monotonic()
+                if wait > 0:
+                    self.changed.wait(wait)
+                    continue
+
+                deadline, order, ref = heapq.heappop(self.deadlines)
+                writer = ref()
+                if writer is None:
+                    continue
+                self.changed.release()  # writers schedule while flushing
+                try:
+                    writer.flush_idle(deadline)
+                finally:
+                    self.changed.acquire()
+
+
+idle_flusher = IdleFlusher()
+
+
+def flush_on_signals(signals=None):
+    """ Installs handlers that flush every open `BatchWriter` and exit when
+    one of `signals` is received. SIGINT is already covered by `atexit`.
+
+    Must be called from the main thread. """
+    if signals is None:
+        signals = [getattr(signal, name) for name in ('SIGTERM', 'SIGHUP')
+                   if hasattr(signal, name)]
+
+    for signum in signals:
+        signal.signal(signum, _flush_and_exit)
+
+
+class Batcher:
+    """ Holds rows in memory and commits them in groups, once `batch_rows`
+    of them have accumulated or `batch_ms` milliseconds have passed since
+    the last commit. If no row arrives to commit a stale batch, the
+    `idle_flusher` thread commits it once `batch_ms` have passed.
+
+    `self.lock` is held while rows are queued or committed, so `flush_all`
+    may be called from any thread or signal handler.
+
+    Subclasses implement `commit`, which writes a batch, and `closed`. They
+    may extend `sync`, called after every flush, and `close`. """
+
+    def __init__(self, batch_rows=64, batch_ms=1000):
+        if batch_rows < 1:
+            raise ValueError('batch_rows must be at least 1')
+        if batch_ms < 0:
+            raise ValueError('batch_ms must not be negative')
+
+        self.batch_rows = batch_rows
+        self.batch_ms = batch_ms
+        self.rows = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.RLock()
+        self.deadline = None  # of the batch, given to `idle_flusher`
+        track_writer(self)
+
+    @property
+    def closed(self):
+        raise NotImplementedError
+
+    def writerow(self, row):
+        """ Queues `row`, committing the batch if it is full or stale. """
+        with self.lock:
+            self.rows.append(row)
+            waited = (time.monotonic() - self.last_flush) * 1000
+            if len(self.rows) >= self.batch_rows or waited >= self.batch_ms:
+                self.flush()
+            elif self.deadline is None and not math.isinf(self.batch_ms):
+                self.deadline = self.last_flush + self.batch_ms / 1000
+                idle_flusher.schedule(self, self.deadline)
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        """ Commits every queued row. """
+        with self.lock:
+            self.deadline = None
+            if self.closed:
+                return
+
+            if self.rows:
+                rows, self.rows = self.rows, []
+                started = time.perf_counter()
+                self.commit(rows)
+                COMMIT_SECONDS.time(started)
+
+            self.sync()
+            self.last_flush = time.monotonic()
+
+    def flush_idle(self, deadline):
+        """ Commits the batch due at `deadline` if no row has committed it
+        since. Called by `idle_flusher`. """
+        try:
+            with self.lock:
+                if self.deadline == deadline:
+                    self.flush()
+        except Exception:
+            logger.exception('Could not commit a batch of rows')
+
+    def commit(self, rows):
+        raise NotImplementedError
+
+    def sync(self):
+        pass
+
+    def close(self):
+        """ Commits every queued row and stops tracking the writer. """
+        with self.lock:
+            self.flush()
+            untrack_writer(self)
+
+
+class BatchWriter(Batcher):
+    """ A `csv.writer` replacement that commits rows in groups.
+
+    Rows are held in memory until `batch_rows` of them have accumulated or
+    `batch_ms` milliseconds have passed since the last commit, then written
+    and flushed together, followed by an `os.fsync` if `fsync` is True.
+
+    If `index` is a `timeindex.TimeIndex`, the byte offset of every row is
+    passed to it as the row is committed. """
+
+    def __init__(self, fileobj, batch_rows=64, batch_ms=1000, fsync=False,
+                 index=None):
+        self.fileobj = fileobj
+        self.writer = csv.writer(fileobj)
+        self.fsync = fsync
+        self.index = index
+        if index is not None:
+            self.offset = os.fstat(fileobj.fileno()).st_size
+        super(BatchWriter, self).__init__(batch_rows, batch_ms)
+
+    @property
+    def closed(self):
+        return self.fileobj.closed
+
+    def sync(self):
+        """ Flushes the file to disk, and its index. """
+        self.fileobj.flush()
+        if self.fsync:
+            os.fsync(self.fileobj.fileno())
+        if self.index is not None:
+            self.index.flush()
+
+    def commit(self, rows):
+        """ Writes a batch of `rows` to `self.fileobj`. """
+        if self.index is None:
+            self.writer.writerows(rows)
+            return
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            self.index.add(float(row[0]), self.offset + buffer.tell())
+            writer.writerow(row)
+
+        text = buffer.getvalue()
+        self.fileobj.write(text)
+        self.offset += len(text)
+
+    def close(self):
+        """ Commits every queued row and closes the underlying file. """
+        with self.lock:
+            super(BatchWriter, self).close()
+            self.fileobj.close()
+
+
+class Scheduler:
+    """ Produces drift free deadlines every `interval` seconds.
+
+    Deadlines are absolute points on the monotonic clock, so the time spent
+    probing never accumulates into the cadence. Slots that have already
+    passed by the time the caller gets around to them are skipped and
+    counted in `self.missed`. """
+
+    def __init__(self, interval, start=None, clock=time.monotonic,
+                 sleep=time.sleep):
+        if interval < 0:
+            raise ValueError('Scheduler interval must not be negative')
+
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.deadline = clock() if start is None else start
+        self.missed = 0
+
+    def remaining(self):
+        """ Returns the number of seconds until the next deadline. """
+        return max(0.0, self.deadline - self.clock())
+
+    def due(self):
+        """ Returns True if the next deadline has been reached. """
+        return self.clock() >= self.deadline
+
+    def advance(self):
+        """ Moves on to the next deadline and returns the number of slots
+        that were missed on the way. """
+        if self.interval <= 0:
+            self.deadline = self.clock()
+            return 0
+
+        missed = int((self.clock() - self.deadline) // self.interval)
+        if missed > 0:
+            if missed_sampler():
+                logger.debug('Missed %d probe slot(s)', missed)
+            self.missed += missed
+            MISSED_SLOTS.inc(missed)
+        else:
+            missed = 0
+
+        self.deadline += (missed + 1) * self.interval
+        return missed
+
+    def wait(self):
+        """ Sleeps until the next deadline, then advances past it.
+
+        Returns the number of slots that were missed. """
+        remaining = self.remaining()
+        if remaining > 0:
+            self.sleep(remaining)
+        return self.advance()
+
+
+def ping(address, timeout=3000, size=64, verbose=True, delay=0.22,
+         blocking=False, prober=None):
     """ A generator that repeatedly calls `python-ping.single_ping`, and
     yields the results.
 
     All kwargs are passed to the underlying call to `python-ping`, aside
     from `delay` which specifies the length of time to wait before the
-    next call to `python-ping` is performed.
+    next call to `python-ping` is performed, and `blocking`.
 
-    Returns None if it is waiting for time to occur. """
+    Pings are scheduled on a `Scheduler`, so they hold a cadence of exactly
+    `delay` seconds. If `blocking` is True the generator sleeps until the
+    next ping is due, otherwise it yields None while it is waiting for time
+    to occur. Pings are sent by `prober`, see `probe`. """
 
     host_name = socket.gethostname()
+    scheduler = Scheduler(delay)
 
     i = 1
-    last_ping = time.time() - delay
     while 1:
-        if (time.time() - last_ping) > delay:
+        if blocking or scheduler.due():
+            scheduler.wait()
+            yield probe(address, host_name, timeout, i, size, verbose,
+                        prober)
+            i += 1
+        else:
+            yield
+
+
+class Prober:
+    """ Sends the probes `probe` makes.
+
+    Subclasses implement `send`, which sends one probe and returns its return
+    time in milliseconds, or None if it was lost. `IcmpProber` pings the
+    network; `probers` has simulated ones for testing without it. A prober
+    may be called from several threads at once by `MultiPing`.
+
+    `MultiPing` awaits `send_async` instead, which runs `send` on a thread
+    of its executor. Probers that can wait for a reply without blocking a
+    thread override it. """
+
+    def send(self, address, timeout, seq, size):
+        raise NotImplementedError
+
+    async def send_async(self, loop, executor, address, timeout, seq, size):
+        return await loop.run_in_executor(executor, self.send, address,
+                                          timeout, seq, size)
+
+    def close(self):
+        pass
+
+
+def icmp_ping(address, host_name, timeout=3000, seq=1, size=64,
+              verbose=False):
+    """ Performs a single blocking call to `python-ping.single_ping`.
+
+    Returns the return time in milliseconds, or None if the ping was lost.
+    """
+    try:
+        return pyping.single_ping(address, host_name, timeout, seq, size,
+                                  verbose=verbose)[0]
+    except TypeError:
+        return None
+
+
+class IcmpProber(Prober):
+    """ Sends ICMP echo requests with `icmp_ping`, which needs raw sockets.
+    """
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.host_name = socket.gethostname()
+
+    def send(self, address, timeout, seq, size):
+        return icmp_ping(address, self.host_name, timeout, seq, size,
+                         self.verbose)
+
+
+def probe(address, host_name, timeout=3000, seq=1, size=64, verbose=False,
+          prober=None):
+    """ Sends a single probe to `address` with `prober.send`, or with
+    `icmp_ping` if `prober` is None.
+
+    Returns a `(timestamp, rtt, timeout, size, address)` row, the same shape
+    that `ping` yields. """
+    timestamp = time.time()
+    started = time.perf_counter()
+    if prober is None:
+        rtt = icmp_ping(address, host_name, timeout, seq, size, verbose)
+    else:
+        rtt = prober.send(address, timeout, seq, size)
+
+    return probe_row(timestamp, started, rtt, timeout, size, address)
+
+
+def probe_row(timestamp, started, rtt, timeout, size, address):
+    """ Counts a probe sent at `timestamp` and `started`, a
+    `time.perf_counter`, in the probe metrics, and returns its row. """
+    PROBE_SECONDS.time(started)
+    PROBES.inc()
+    if rtt is None:
+        PROBES_LOST.inc()
+
+    return timestamp, TIMEOUT_RTT if rtt is None else rtt, timeout, size, \
+        address
+
+
+class MultiPing:
+    """ An asyncio engine that probes many addresses concurrently.
+
+    Each address is probed every `delay` seconds whether or not its previous
+    probes have returned, so up to `max_in_flight` probes may be outstanding
+    across all targets at once. Rows are produced in the same
+    `(timestamp, rtt, timeout, size, address)` shape as `ping`, so they can
+    be passed straight to `write_csv_data`.
+
+    Probes are sent by `prober.send_async`. Probers that block a thread
+    per probe, and `icmp_ping` when `prober` is None, share a pool of at
+    most `EXECUTOR_THREADS` threads; `icmp.SocketProber` needs none. A probe
+    that raises is logged and recorded as lost. `asyncio` is only imported
+    once the engine runs, as it takes longer to import than the rest of
+    this module. """
+
+    EXECUTOR_THREADS = 32
+
+    def __init__(self, addresses, timeout=3000, size=64, verbose=False,
+                 delay=0.22, max_in_flight=1024, prober=None):
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        if not addresses:
+            raise RuntimeError('core.MultiPing requires at least one address')
+        if max_in_flight < 1:
+            raise ValueError('max_in_flight must be at least 1')
+
+        self.addresses = list(addresses)
+        self.timeout = timeout
+        self.size = size
+        self.verbose = verbose
+        self.delay = delay
+        self.max_in_flight = max_in_flight
+        self.prober = prober
+        self.host_name = socket.gethostname()
+
+    async def _probe(self, loop, executor, address, seq, queue, slots):
+        """ Runs one probe and queues its row. """
+        timestamp = time.time()
+        started = time.perf_counter()
+        try:
             try:
-                yield (time.time(),
-                       pyping.single_ping(address, host_name, timeout, i,
-                       size, verbose=verbose)[0],
-                       timeout, size, address)
+                if self.prober is None:
+                    rtt = await loop.run_in_executor(
+                        executor, icmp_ping, address, self.host_name,
+                        self.timeout, seq, self.size, self.verbose)
+                else:
+                    rtt = await self.prober.send_async(
+                        loop, executor, address, self.timeout, seq,
+                        self.size)
+            except Exception as e:
+                if error_sampler():
+                    logger.error('Probe to %s failed: %r' % (address, e))
+                rtt = None
 
-            except TypeError:
-                yield (dt.datetime.fromtimestamp(time.time()),
-                       -100.00, timeout, size, address)
+            await queue.put(probe_row(timestamp, started, rtt, self.timeout,
+                                      self.size, address))
+        finally:
+            slots.release()
 
-            i += 1
-            last_ping = time.time()
+    async def _target(self, loop, executor, address, queue, slots):
+        """ Schedules probes to a single `address` every `self.delay`. """
+        import asyncio
+
+        seq = 1
+        pending = set()
+        scheduler = Scheduler(self.delay)
+        try:
+            while 1:
+                await asyncio.sleep(scheduler.remaining())
+                scheduler.advance()
+
+                await slots.acquire()  # back pressure when saturated
+                task = loop.create_task(self._probe(loop, executor, address,
+                                                    seq, queue, slots))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+                seq = seq % 0xffff + 1  # ICMP sequence numbers are 16 bit
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self):
+        """ An async generator yielding rows as probes complete. """
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        executor = ThreadPoolExecutor(max_workers=min(
+            self.max_in_flight, self.EXECUTOR_THREADS))
+
+        targets = [loop.create_task(self._target(loop, executor, address,
+                                                 queue, slots))
+                   for address in self.addresses]
+        try:
+            while 1:
+                yield await queue.get()
+        finally:
+            for task in targets:
+                task.cancel()
+            executor.shutdown(wait=False)
+
+    async def run(self, callback, duration=None):
+        """ Passes every row to `callback` until `duration` seconds have
+        passed, or forever if `duration` is None. """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        stop = None if duration is None else loop.time() + duration
+
+        rows = self.stream()
+        try:
+            while stop is None or loop.time() < stop:
+                timeout = None if stop is None else stop - loop.time()
+                try:
+                    row = await asyncio.wait_for(rows.__anext__(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                callback(row)
+        finally:
+            await rows.aclose()
+
+
+class ProbeWorker(threading.Thread):
+    """ Probes every address of a `Core` on a background thread.
+
+    A single address is probed every `core.delay` seconds on a `Scheduler`,
+    and several are probed concurrently by `core.engine` on an event loop of
+    the thread's own. Either way their cadence does not depend on how often
+    the rows are drained, and a blocking probe never holds up the thread
+    draining them. Every row is passed to `core.record` and buffered until
+    `drain` is called; at most `maxlen` rows are buffered, the oldest being
+    dropped first. A probe that raises is logged and recorded as lost.
+
+    `self.lock` is held while a row is added to `core.stats`, so they can be
+    read consistently from another thread while holding it. It is not held
+    while the row is written, so a reader never waits on disk I/O. """
+
+    def __init__(self, core, maxlen=65536):
+        super(ProbeWorker, self).__init__(name='ProbeWorker', daemon=True)
+        self.core = core
+        self.rows = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.loop = None
+        self.task = None
+
+    def record(self, row):
+        core = self.core
+        with self.lock:
+            core.stats.add(row)
+        if not core.nofile:
+            core.write_csv(row)
+        self.rows.append(row)
+        WORKER_ROWS.set(len(self.rows))
+
+    def run(self):
+        core = self.core
+        if len(core.addresses) > 1:
+            return self.run_engine()
+
+        host_name = socket.gethostname()
+        scheduler = Scheduler(core.delay)
+
+        seq = 1
+        while not self.stopped.wait(scheduler.remaining()):
+            scheduler.advance()
+            timestamp = time.time()
+            started = time.perf_counter()
+            try:
+                row = probe(core.address, host_name, core.timeout, seq,
+                            verbose=not core.quiet, prober=core.prober)
+            except Exception as e:
+                if error_sampler():
+                    logger.error('Probe to %s failed: %r' % (core.address, e))
+                row = probe_row(timestamp, started, None, core.timeout, 64,
+                                core.address)
+            self.record(row)
+            seq = seq % 0xffff + 1
+
+    def run_engine(self):
+        """ Runs `core.engine` until `stop` cancels it. """
+        import asyncio
+
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.task = self.loop.create_task(
+                self.core.engine.run(self.record))
+            if self.stopped.is_set():  # stopped before the task existed
+                self.task.cancel()
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    def drain(self):
+        """ Returns the rows buffered since the last call, oldest first. """
+        rows = []
+        try:
+            while 1:
+                rows.append(self.rows.popleft())
+        except IndexError:
+            WORKER_ROWS.set(len(self.rows))
+            return rows
+
+    def stop(self, timeout=None):
+        """ Stops probing, waiting up to `timeout` seconds for a probe in
+        progress, then commits the rows held by the core's writers. """
+        self.stopped.set()
+        if self.task is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.task.cancel)
+            except RuntimeError:
+                pass  # the loop has already closed
+        if self.is_alive():
+            self.join(timeout)
+        self.core.flush()
+
+
+def is_timeout(rtt):
+    """ Returns True if `rtt` records a ping that never returned. """
+    return rtt is None or rtt == '' or float(rtt) == TIMEOUT_RTT
+
+
+class StatsWindow:
+    """ Statistics over the pings of the last `span` seconds.
+
+    Samples are kept in a deque and expired from its left as time passes.
+    Running sums give the mean, standard deviation, jitter and loss, and
+    monotonic deques give the minimum and maximum, so each sample costs
+    amortised O(1). """
+
+    def __init__(self, span):
+        self.span = span
+        self.samples = deque()  # (timestamp, rtt or None, jitter delta)
+        self.lows = deque()  # (timestamp, rtt), rtt increasing
+        self.highs = deque()  # (timestamp, rtt), rtt decreasing
+
+        self.count = 0
+        self.lost = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.deltas = 0.0
+        self.delta_count = 0
+
+    def add(self, timestamp, rtt, delta=None):
+        """ Adds a sample. `rtt` is None for a lost ping, and `delta` is the
+        RFC 3550 transit time difference from the previous reply. """
+        self.samples.append((timestamp, rtt, delta))
+        self.count += 1
+
+        if rtt is None:
+            self.lost += 1
         else:
-            yield
+            self.total += rtt
+            self.squares += rtt * rtt
+
+            while self.lows and self.lows[-1][1] >= rtt:
+                self.lows.pop()
+            self.lows.append((timestamp, rtt))
+            while self.highs and self.highs[-1][1] <= rtt:
+                self.highs.pop()
+            self.highs.append((timestamp, rtt))
+
+        if delta is not None:
+            self.deltas += abs(delta)
+            self.delta_count += 1
+
+        self.expire(timestamp)
+
+    def expire(self, now):
+        """ Drops samples older than `self.span` seconds before `now`. """
+        oldest = now - self.span
+        while self.samples and self.samples[0][0] < oldest:
+            timestamp, rtt, delta = self.samples.popleft()
+            self.count -= 1
+
+            if rtt is None:
+                self.lost -= 1
+            else:
+                self.total -= rtt
+                self.squares -= rtt * rtt
+
+            if delta is not None:
+                self.deltas -= abs(delta)
+                self.delta_count -= 1
+
+        while self.lows and self.lows[0][0] < oldest:
+            self.lows.popleft()
+        while self.highs and self.highs[0][0] < oldest:
+            self.highs.popleft()
+
+    @property
+    def received(self):
+        return self.count - self.lost
+
+    @property
+    def mean(self):
+        return self.total / self.received if self.received else None
+
+    @property
+    def stddev(self):
+        if not self.received:
+            return None
+        mean = self.mean
+        return math.sqrt(max(self.squares / self.received - mean * mean, 0.0))
+
+    @property
+    def jitter(self):
+        """ The mean absolute RFC 3550 transit time difference. """
+        return self.deltas / self.delta_count if self.delta_count else None
+
+    @property
+    def loss(self):
+        """ The fraction of pings lost, from 0 to 1. """
+        return self.lost / self.count if self.count else None
+
+    @property
+    def minimum(self):
+        return self.lows[0][1] if self.lows else None
+
+    @property
+    def maximum(self):
+        return self.highs[0][1] if self.highs else None
+
+    def summary(self):
+        """ Returns every statistic in a dict. """
+        return {'count': self.count, 'mean': self.mean,
+                'stddev': self.stddev, 'jitter': self.jitter,
+                'loss': self.loss, 'min': self.minimum,
+                'max': self.maximum}
+
+    def format(self):
+        """ Returns a one line summary of the window. """
+        if self.span % 3600 == 0:
+            name = '%dh' % (self.span // 3600)
+        elif self.span % 60 == 0:
+            name = '%dm' % (self.span // 60)
+        else:
+            name = '%gs' % self.span
+
+        if not self.received:
+            return '%4s: n=%d loss=%s' % (
+                name, self.count, '-' if not self.count else '100.0%')
+
+        return '%4s: n=%d mean=%.1f sd=%.1f jitter=%.1f loss=%.1f%% ' \
+               'min=%.1f max=%.1f' % (
+                   name, self.count, self.mean, self.stddev,
+                   self.jitter or 0.0, self.loss * 100, self.minimum,
+                   self.maximum)
+
+
+class RollingStats:
+    """ Maintains `StatsWindow` objects for every target from a stream of
+    `(timestamp, rtt, timeout, size, address)` rows, plus a smoothed RFC 3550
+    jitter estimate per target. """
+
+    WINDOWS = (60, 900, 3600)
+
+    def __init__(self, windows=WINDOWS):
+        if not windows:
+            raise ValueError('RollingStats requires at least one window')
+
+        self.spans = tuple(windows)
+        self.windows = {}  # address: [StatsWindow, ...]
+        self.last_rtt = {}  # address: rtt of the previous reply
+        self.jitter = {}  # address: RFC 3550 smoothed jitter
+
+    def add(self, row):
+        """ Adds a ping row. Returns `row`, so it can be chained. """
+        if row is None:
+            return row
+
+        timestamp, rtt, address = float(row[0]), row[1], row[4]
+        rtt = None if is_timeout(rtt) else float(rtt)
+
+        try:
+            windows = self.windows[address]
+        except KeyError:
+            windows = self.windows[address] = [StatsWindow(span) for span in
+                                               self.spans]
+
+        delta = None
+        if rtt is not None:
+            last = self.last_rtt.get(address)
+            if last is not None:
+                delta = rtt - last
+                jitter = self.jitter.get(address, 0.0)
+                self.jitter[address] = jitter + (abs(delta) - jitter) / 16
+            self.last_rtt[address] = rtt
+
+        for window in windows:
+            window.add(timestamp, rtt, delta)
+
+        return row
+
+    def summary(self, address):
+        """ Returns `{span: StatsWindow.summary()}` for `address`. """
+        return {window.span: window.summary()
+                for window in self.windows.get(address, [])}
+
+    def format(self, address=None, now=None):
+        """ Returns a multi line summary of every window for `address`, or
+        for every target if it is None. Windows are first expired to `now`,
+        if it is given. """
+        addresses = [address] if address is not None else sorted(
+            self.windows)
+
+        lines = []
+        for address in addresses:
+            if len(addresses) > 1:
+                lines.append('%s (jitter %.1f):' % (
+                    address, self.jitter.get(address, 0.0)))
+            for window in self.windows.get(address, []):
+                if now is not None:
+                    window.expire(now)
+                lines.append(window.format())
+
+        return '\n'.join(lines)
 
 
 class Core:
     """ Provides core functionality for `PingStats`. """
 
+    @property
+    def cwriter(self):
+        """ The first of `self.writers`. """
+        if not self.writers:
+            raise AttributeError('cwriter: no log is written')
+        return self.writers[0]
+
+    @property
+    def built_file(self):
+        """ The file of the first log, the current one once a
+        `segments.SegmentWriter` has rotated it. """
+        return self.cwriter.fileobj
+
+    @property
+    def csv_file(self):
+        """ The file of the CSV log, the current one once a
+        `segments.SegmentWriter` has rotated it. """
+        if self.nofile or self.file_format == 'binary':
+            raise AttributeError('csv_file: no CSV log is written')
+        return self.writers[0].fileobj
+
     def write_csv(self, data):
-        """ Provides a wrapper to `core.write_csv_data`. """
-        write_csv_data(self.cwriter, data)
+        """ Provides a wrapper to `core.write_csv_data`, writing `data` to
+        every log in `self.writers`. """
+        started = time.perf_counter()
+        for writer in self.writers:
+            write_csv_data(writer, data)
+        WRITE_SECONDS.time(started)
+        ROWS_WRITTEN.inc()
+
+    def record(self, data):
+        """ Adds `data` to `self.stats`, and writes it unless `self.nofile`
+        is set. """
+        self.stats.add(data)
+        if not self.nofile:
+            self.write_csv(data)
+
+    def flush(self):
+        """ Commits any rows still held by `self.writers`. """
+        for writer in self.writers:
+            writer.flush()
+
+    def close(self):
+        """ Commits any held rows, closes the log files and the prober. """
+        for writer in self.writers:
+            writer.close()
+        if self.prober is not None:
+            self.prober.close()
 
     def __init__(self, address, file_path=None, file_name=None, nofile=False,
-                 quiet=False, delay=0.22, timeout=3000, *args, **kwargs):
+                 quiet=False, delay=0.22, timeout=3000, max_in_flight=1024,
+                 blocking=False, batch_rows=64, batch_ms=1000, fsync=False,
+                 file_format='csv', index_every=timeindex.EVERY,
+                 sketch_interval=60, rollups=True, rotate_bytes=0,
+                 rotate_seconds=0, compress=True, prober=None, sqlite=False,
+                 *args, **kwargs):
         """ Constructs a `Core` object.
 
-        Instantiates a `ping` generator at `self.ping_generator`, and an
-        open CSV writer at `self.cwriter`"""
+        `address` may be a single address, a comma separated string of
+        addresses or a list of addresses. `blocking` is passed to `ping`, and
+        `batch_rows`, `batch_ms` and `fsync` to `BatchWriter`.
+
+        `file_format` is one of 'csv', 'binary' (see `binlog`) or 'both'.
+        CSV logs are indexed every `index_every` rows (see `timeindex`),
+        unless it is 0. Return time sketches (see `sketch`) are saved next to
+        the log every `sketch_interval` seconds, unless it is 0. If
+        `rollups` is True, rollup tiers (see `rollup`) are written as well.
+
+        CSV logs are rotated into segments (see `segments`) once they hold
+        `rotate_bytes`, or every `rotate_seconds`, unless both are 0. Closed
+        segments are compressed if `compress` is True.
+
+        If `sqlite` is True, rows are written to a SQLite database (see
+        `sqlitelog`) next to the log as well.
+
+        Probes are sent by `prober`, a `Prober`, or by an
+        `icmp.SocketProber` if it is None, as with the -P default of
+        `main.py`.
+
+        Instantiates a `ping` generator for the first address at
+        `self.ping_generator`, a `MultiPing` engine for every address at
+        `self.engine`, a `RollingStats` at `self.stats`, and open writers at
+        `self.writers`. The first of these is also available at
+        `self.cwriter`, and the `sketch.SketchWriter` at `self.sketches`"""
 
         logger.debug((address, file_path, file_name, nofile, quiet, delay,
                       timeout, args, kwargs))
 
         self.quiet = not quiet  # flip bool
         self.delay = delay
+        self.timeout = timeout
+        if prober is None:
+            import icmp
+            prober = icmp.SocketProber(not self.quiet)
+        self.prober = prober
         # core.Core.ping
         if address is None:
             raise RuntimeError('core.Core requires address')
-        self.address = address
+        if isinstance(address, str):
+            self.addresses = [a.strip() for a in address.split(',')
+                              if a.strip()]
+        else:
+            self.addresses = list(address)
+        if not self.addresses:
+            raise RuntimeError('core.Core requires address')
+        self.address = self.addresses[0]
         self.ping_generator = ping(self.address, timeout=timeout,
-                                   verbose=not self.quiet, delay=self.delay)
+                                   verbose=not self.quiet, delay=self.delay,
+                                   blocking=blocking, prober=prober)
+        self.engine = MultiPing(self.addresses, timeout=timeout,
+                                verbose=not self.quiet, delay=self.delay,
+                                max_in_flight=max_in_flight, prober=prober)
+        self.stats = RollingStats()
 
         # core.Core.build files
         self.file_path = file_path  # validated in self.build file
         self.file_name = file_name  # validated in self.build file
         self.nofile = nofile
+        if file_format not in ('csv', 'binary', 'both'):
+            raise ValueError('file_format must be csv, binary or both')
+        self.file_format = file_format
+        self.writers = []
+        self.sketches = None
         if not self.nofile:
-            self.built_file = buildfile(self.file_path, self.file_name)
-            logger.info('Log file at %s' % self.built_file.name)
-            self.cwriter = csv.writer(self.built_file)
+            if file_format in ('csv', 'both'):
+                csv_file = buildfile(self.file_path, self.file_name)
+                logger.info('Log file at %s' % csv_file.name)
+                index = None
+                if index_every:
+                    index = timeindex.TimeIndex(csv_file.name,
+                                                index_every)
+                if rotate_bytes or rotate_seconds:
+                    import segments  # segments imports core
+                    self.writers.append(segments.SegmentWriter(
+                        csv_file, batch_rows, batch_ms, fsync, index,
+                        rotate_bytes, rotate_seconds, compress))
+                else:
+                    self.writers.append(BatchWriter(csv_file,
+                                                    batch_rows, batch_ms,
+                                                    fsync, index))
+
+            if file_format in ('binary', 'both'):
+                import binlog  # binlog imports core
+                self.binary_file = buildfile(self.file_path, self.file_name,
+                                             binlog.EXTENSION, 'ab')
+                logger.info('Binary log file at %s' % self.binary_file.name)
+                self.writers.append(binlog.BinaryWriter(
+                    self.binary_file, batch_rows, batch_ms, fsync))
+
+            if sqlite:
+                import sqlitelog  # sqlitelog imports core
+                path = os.path.splitext(self.built_file.name)[0] + \
+                    sqlitelog.EXTENSION
+                logger.info('SQLite database at %s' % path)
+                self.writers.append(sqlitelog.SqliteWriter(
+                    path, batch_rows, batch_ms, fsync))
+
+            if sketch_interval:
+                import sketch  # sketch imports core
+                self.sketches = sketch.SketchWriter(self.built_file.name,
+                                                    sketch_interval)
+                self.writers.append(self.sketches)
+
+            if rollups:
+                import rollup  # rollup imports core
+                self.writers.append(rollup.RollupWriter(
+                    self.built_file.name, batch_rows=batch_rows,
+                    batch_ms=batch_ms))
 
     def yield_generator(self):
         return self.ping_generator
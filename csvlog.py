@@ -0,0 +1,138 @@
+""" Fast readers for PingStats CSV logs.
+
+Rows are parsed a block at a time into `numpy` arrays of epoch timestamps
+and return times, rather than one Python object per row. Timed out pings,
+which are written with an empty return time, come back as `TIMEOUT_RTT`. """
+import io
+import gzip
+
+import numpy as np
+
+import segments
+import timeindex
+from binlog import TIMEOUT_RTT, parse_timestamp
+from log import core_logger as logger
+
+CHUNK_BYTES = 1 << 22
+
+
+def parse_rows(text):
+    """ Slowly parses `text` row by row, for blocks `parse_block` rejects
+    because they hold old datetime timestamps or malformed rows. """
+    x = []
+    y = []
+    for line in text.splitlines():
+        row = line.split(',')
+        try:
+            timestamp = parse_timestamp(row[0])
+            rtt = float(row[1]) if row[1] != '' else TIMEOUT_RTT
+        except (ValueError, IndexError):
+            if line.strip():
+                logger.warning('Skipping malformed row: %s' % line)
+            continue
+
+        x.append(timestamp)
+        y.append(rtt)
+
+    return np.array(x, dtype=np.float64), np.array(y, dtype=np.float64)
+
+
+def select(text, address):
+    """ Returns the rows of `text`, a block of complete CSV rows as `str`,
+    that were logged for `address`. """
+    return ''.join(line for line in text.splitlines(True)
+                   if line.rstrip('\r\n').rpartition(',')[2] == address)
+
+
+def parse_block(text, address=None):
+    """ Parses a block of complete CSV rows, as `str` or `bytes`, only
+    those for `address` unless it is None.
+
+    Returns `(timestamps, rtts)` as float64 arrays. """
+    if isinstance(text, bytes):
+        text = text.decode()
+    if address is not None:
+        text = select(text, address)
+        if not text:
+            return np.zeros(0), np.zeros(0)
+
+    try:
+        data = np.loadtxt(io.StringIO(text.replace(',,', ',nan,')),
+                          delimiter=',', usecols=(0, 1), ndmin=2,
+                          dtype=np.float64)
+    except (ValueError, IndexError):
+        return parse_rows(text)
+
+    x = data[:, 0]
+    y = data[:, 1]
+    y[np.isnan(y)] = TIMEOUT_RTT
+    return x, y
+
+
+def read_chunks(fileobj, chunk_bytes=CHUNK_BYTES, limit=None, address=None):
+    """ Yields `(timestamps, rtts)` arrays for each block of about
+    `chunk_bytes` of the open file `fileobj`, stopping after `limit` bytes if
+    it is not None. Only the rows for `address` are read, unless it is None.
+    """
+    carry = fileobj.read(0)  # an empty str or bytes
+    newline = '\n' if isinstance(carry, str) else b'\n'
+    while limit is None or limit > 0:
+        block = fileobj.read(chunk_bytes if limit is None
+                             else min(chunk_bytes, limit))
+        if not block:
+            break
+        if limit is not None:
+            limit -= len(block)
+
+        block = carry + block
+        cut = block.rfind(newline) + 1
+        carry = block[cut:]
+        if cut:
+            yield parse_block(block[:cut], address)
+
+    if carry.strip():
+        yield parse_block(carry, address)
+
+
+def read_file(path, start=None, end=None, chunk_bytes=CHUNK_BYTES,
+              address=None):
+    """ Returns the `read_chunks` of the CSV log or segment at `path` that
+    may hold rows for `address` stamped from `start` to `end`. Segments
+    compressed with gzip are read whole; others only around the range if
+    they have a `timeindex`. """
+    with segments.open_segment(path) as f:
+        if isinstance(f, gzip.GzipFile):
+            return list(read_chunks(f, chunk_bytes, address=address))
+
+        offset, limit = timeindex.byte_range(path, start, end)
+        f.seek(offset)
+        return list(read_chunks(f, chunk_bytes, limit, address))
+
+
+def read(path, start=None, end=None, chunk_bytes=CHUNK_BYTES, address=None):
+    """ Reads the rows of the CSV log at `path` stamped from `start` to `end`,
+    which default to the whole log, only those for `address` unless it is
+    None.
+
+    Rows are read from every segment the log was rotated into (see
+    `segments`) that may hold the range, oldest first, and then from the log
+    itself. Returns `(timestamps, rtts)` as float64 arrays. """
+    chunks = []
+    for log_path in segments.log_paths(path, start, end):
+        chunks.extend(read_file(log_path, start, end, chunk_bytes,
+                                address))
+
+    if not chunks:
+        return np.zeros(0), np.zeros(0)
+
+    x = np.concatenate([x for x, y in chunks])
+    y = np.concatenate([y for x, y in chunks])
+    if start is None and end is None:
+        return x, y
+
+    keep = np.ones(len(x), dtype=bool)
+    if start is not None:
+        keep &= x >= start
+    if end is not None:
+        keep &= x <= end
+    return x[keep], y[keep]
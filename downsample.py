@@ -0,0 +1,102 @@
+""" Level of detail reduction for plotting very long ping logs.
+
+Both methods reduce a log to a number of points proportional to the width
+of the figure, in pixels, while keeping its visual shape:
+
+    minmax - keeps the lowest and highest point of every pixel column, so
+             every spike and every timeout stays visible.
+    lttb   - largest-triangle-three-buckets, which keeps the points that
+             contribute most to the shape of the line. The first timeout of
+             every bucket is kept as well.
+
+Timestamps need not be sorted, as rows such as lost probes are logged late,
+but points too few to reduce are returned in the order given, so callers
+that draw them should sort them first, as `plot.PlotFile` does.
+"""
+from binlog import TIMEOUT_RTT
+
+METHODS = ('minmax', 'lttb', 'none')
+
+
+def first_per_bucket(indices, buckets):
+    """ Returns the first of `indices` to fall in each of `buckets`, which
+    holds the bucket of every index. """
+    import numpy as np
+
+    return indices[np.unique(buckets[indices], return_index=True)[1]]
+
+
+def minmax(x, y, columns):
+    """ Returns the indices of the lowest and highest point in each of
+    `columns` equal slices of time, and of the end points, in order. """
+    import numpy as np
+
+    edges = np.linspace(x[0], x[-1], columns + 1)[1:-1]
+    starts = np.concatenate(([0], np.searchsorted(x, edges, 'right')))
+    starts = np.unique(starts[starts < len(x)])  # drop empty columns
+    counts = np.diff(np.append(starts, len(x)))
+    buckets = np.repeat(np.arange(len(starts)), counts)
+
+    low = np.repeat(np.minimum.reduceat(y, starts), counts)
+    high = np.repeat(np.maximum.reduceat(y, starts), counts)
+
+    return np.unique(np.concatenate((
+        [0, len(x) - 1],
+        first_per_bucket(np.flatnonzero(y == low), buckets),
+        first_per_bucket(np.flatnonzero(y == high), buckets))))
+
+
+def lttb(x, y, threshold):
+    """ Returns the indices of `threshold` points chosen by the
+    largest-triangle-three-buckets algorithm, plus the first timeout in every
+    bucket. """
+    import numpy as np
+
+    edges = np.linspace(1, len(x) - 1, threshold - 1).astype(int)
+    chosen = np.empty(threshold, dtype=np.intp)
+    chosen[0] = 0
+    chosen[-1] = len(x) - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        following = slice(end, max(edges[i + 2] if i + 2 < len(edges)
+                                   else len(x), end + 1))
+        cx, cy = x[following].mean(), y[following].mean()
+
+        area = np.abs((x[a] - cx) * (y[start:end] - y[a]) -
+                      (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(area.argmax())
+        chosen[i + 1] = a
+
+    buckets = np.searchsorted(edges, np.arange(len(x)), 'right')
+    timeouts = first_per_bucket(np.flatnonzero(y <= TIMEOUT_RTT), buckets)
+    return np.union1d(chosen, timeouts)
+
+
+def downsample(x, y, width, method='minmax'):
+    """ Reduces the points `x` and `y` for a plot `width` pixels wide.
+
+    Returns new `x` and `y` arrays, or the originals if they are already
+    small enough or `method` is 'none'. """
+    import numpy as np
+
+    if method not in METHODS:
+        raise ValueError('method must be one of %s' % ', '.join(METHODS))
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    width = max(int(width), 1)
+    if method == 'none' or len(x) <= 2 * width:
+        return x, y
+
+    if np.any(x[1:] < x[:-1]):
+        order = np.argsort(x, kind='stable')
+        x, y = x[order], y[order]
+
+    if method == 'minmax':
+        indices = minmax(x, y, width)
+    else:
+        indices = lttb(x, y, 2 * width)
+
+    return x[indices], y[indices]
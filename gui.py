@@ -0,0 +1,351 @@
+""" The Tk user interface of PingStats, and the live `-s` and `-R` plot
+windows.
+
+Only imported by `main.py` when a window is shown, so command line
+collection and image rendering never import Tk. """
+from tkinter import *
+from tkinter import ttk
+
+import time
+
+import core
+import plot
+import replay
+from log import main_logger as logger
+
+
+def show_live_plot(parsed):
+    """ Shows the live plot of `parsed.address` alone in a window, until
+    it is closed or its Quit button is pressed. Several addresses are shown
+    on a `plot.Dashboard`. """
+    def close():
+        root.quit()
+        root.destroy()
+
+    root = Tk()
+    logger.debug('showliveplot: %s' % root)
+    c = core.Core(parsed.address, parsed.path, parsed.name, parsed.nofile,
+                  not parsed.quiet, delay=parsed.delay,
+                  timeout=parsed.timeout, max_in_flight=parsed.maxinflight,
+                  batch_rows=parsed.batchrows, batch_ms=parsed.batchms,
+                  fsync=parsed.fsync, file_format=parsed.format,
+                  index_every=parsed.indexevery,
+                  sketch_interval=parsed.sketchinterval,
+                  rollups=not parsed.norollups,
+                  rotate_bytes=parsed.rotatesize * 1e6,
+                  rotate_seconds=parsed.rotateperiod,
+                  compress=not parsed.nocompress, prober=parsed.prober,
+                  sqlite=parsed.sqlite)
+    if len(c.addresses) > 1:
+        p = plot.Dashboard(root, c, layout=parsed.layout,
+                           budget=parsed.redrawbudget,
+                           table_length=parsed.tablelength)
+    else:
+        p = plot.Animate(root, c, table_length=parsed.tablelength)
+
+    logger.debug('showliveplot: %s' % str(p))
+
+    p.grid(row=1, column=0)
+    p.start(parsed.refreshfrequency)
+
+    button = ttk.Button(root, text='Quit', command=close)
+    button.grid(row=0, columnspan=2)
+
+    root.mainloop()
+
+
+SPEEDS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1000)  # offered by -R
+SEEK_STEP = 0.05  # of the log, skipped by the arrow keys of -R
+
+
+def show_replay(parsed):
+    """ Plays the log at `parsed.replay` back on a live plot, with pause,
+    speed and position controls, until the window is closed or its Quit
+    button is pressed. Space pauses and the arrow keys seek. """
+    def close():
+        root.quit()
+        root.destroy()
+
+    found = replay.bounds(parsed.replay)
+    if found is None:
+        logger.error('%s holds no rows to replay' % parsed.replay)
+        return
+    first, last = found
+    address = parsed.address or first[4]  # None for logs without addresses
+    span = max(last - first[0], 1e-9)
+
+    root = Tk()
+    # Rows are keyed by the address logged with them, and a replay never
+    # probes, so the core gets a prober that sends nothing.
+    c = core.Core([address], nofile=True, timeout=parsed.timeout,
+                  prober=core.Prober())
+    worker = replay.Replayer(parsed.replay, c, parsed.replayspeed,
+                             start=parsed.start, address=address)
+    p = plot.Replay(root, c, worker, table_length=parsed.tablelength)
+    logger.debug('showreplay: %s' % str(p))
+
+    controls = ttk.Frame(root)
+    controls.grid(row=0, column=0, sticky=EW)
+
+    def toggle(event=None):
+        if worker.paused:
+            worker.resume()
+            pause.config(text='Pause')
+        else:
+            worker.pause()
+            pause.config(text='Play')
+
+    def set_speed():
+        try:
+            worker.set_speed(float(speed.get()))
+        except ValueError:
+            speed.set('%g' % worker.speed)
+
+    def seek(position):
+        worker.seek(first[0] + min(max(position, 0.0), 1.0) * span)
+
+    def step(direction):
+        position = worker.position
+        if position is not None:
+            seek((position - first[0]) / span + direction * SEEK_STEP)
+
+    def show_status():
+        position = worker.position
+        if position is not None:
+            if not dragging[0]:
+                scale.set((position - first[0]) / span)
+            status.config(text=time.strftime('%Y-%m-%d %H:%M:%S',
+                                             time.localtime(position)))
+        root.after(250, show_status)
+
+    ttk.Button(controls, text='Quit', command=close).pack(side=LEFT)
+    pause = ttk.Button(controls, text='Pause', command=toggle)
+    pause.pack(side=LEFT)
+
+    speed = ttk.Spinbox(controls, values=SPEEDS, width=5, command=set_speed)
+    speed.set('%g' % worker.speed)
+    speed.bind('<Return>', lambda event: set_speed())
+    speed.pack(side=LEFT)
+    ttk.Label(controls, text='x').pack(side=LEFT)
+
+    dragging = [False]  # the position is left alone while dragged
+    scale = ttk.Scale(controls, from_=0.0, to=1.0, orient=HORIZONTAL)
+    scale.bind('<ButtonPress-1>', lambda event: dragging.__setitem__(0, True))
+
+    def release(event):
+        dragging[0] = False
+        seek(scale.get())
+    scale.bind('<ButtonRelease-1>', release)
+    scale.pack(side=LEFT, fill=X, expand=True)
+
+    status = ttk.Label(controls, width=20)
+    status.pack(side=LEFT)
+
+    root.bind('<space>', toggle)
+    root.bind('<Left>', lambda event: step(-1))
+    root.bind('<Right>', lambda event: step(1))
+    root.protocol('WM_DELETE_WINDOW', close)
+
+    p.grid(row=1, column=0)
+    p.start(parsed.refreshfrequency)
+    show_status()
+
+    root.mainloop()
+
+
+class Main(Tk):
+    def __init__(self, parsed, *args, **kwargs):
+        super(Main, self).__init__(*args, **kwargs)
+        self.parsed = parsed
+        # tk.Tk.__init__(self, *args, **kwargs)
+        logger.debug('Main: %s %s' % (args, kwargs))
+        container = ttk.Frame(self)
+
+        container.pack(side="top", fill="both", expand=True)
+
+        self.frames = {
+            Settings: Settings(container, self),
+            Plot: Plot(container, self),
+        }
+
+        for F in self.frames:
+            self.frames[F].grid(row=0, column=0, sticky="nsew")
+
+        self.show_settings()
+
+    def show_settings(self):
+        logger.debug('Main: settings')
+        self.frames[Settings].tkraise()
+
+    def show_plot(self, ping, file, plot):
+        logger.debug('Main: pass args to generate_plot')
+        self.frames[Plot].generate_plot(ping, file, plot)
+        logger.debug('Main: %s.tkraise()' % str(self.frames[Plot]))
+        self.frames[Plot].tkraise()
+
+
+class Settings(ttk.Frame):
+    def __init__(self, parent, controller):
+        super(Settings, self).__init__(parent)
+        logger.debug('Settings: %s %s' % (parent, controller))
+
+        # PING SETTINGS
+        self.ping_settings = PingSettings(self, controller.parsed)
+        self.ping_settings.pack(pady=10)
+
+        # FILE SETTINGS
+        self.file_settings = FileSettings(self, controller.parsed)
+        self.file_settings.pack(pady=10)
+
+        # PLOT SETTINGS
+        self.plot_settings = PlotSettings(self, controller.parsed)
+        self.plot_settings.pack(pady=10)
+
+        self.run = ttk.Button(self, text='Start ping and display plot',
+                              command=lambda: controller.show_plot(
+                                      self.ping_settings.get_values(),
+                                      self.file_settings.get_values(),
+                                      self.plot_settings.get_values()))
+        self.run.pack(side=BOTTOM)
+
+
+class PingSettings(ttk.Frame):
+    def __init__(self, root, parsed, **kwargs):
+        super(PingSettings, self).__init__(root, **kwargs)
+        ttk.Label(self, text='Ping Settings').grid(row=0, columnspan=2)
+        logger.debug('PingSettings: %s %s' % (root, kwargs))
+
+        ttk.Label(self, text='Address:').grid(row=1, column=0)
+        if parsed.address is not None:
+            self.address_entry = ttk.Entry(self)
+            self.address_entry.insert(0, parsed.address)
+        else:
+            self.address_entry = ttk.Entry(self)
+        self.address_entry.grid(row=1, column=1)
+
+        ttk.Label(self, text='Delay between pings:').grid(row=2, column=0)
+        self.delay_entry = ttk.Entry(self)
+        self.delay_entry.insert(0, str(parsed.delay))
+        self.delay_entry.grid(row=2, column=1)
+
+        ttk.Label(self, text='Timeout:').grid(row=3, column=0)
+        self.timeout_entry = ttk.Entry(self)
+        self.timeout_entry.insert(0, str(parsed.timeout))
+        self.timeout_entry.grid(row=3, column=1)
+
+    def get_values(self):
+        logger.debug("PingSettings: %s %s %s" % (self.address_entry.get(),
+                                                 self.delay_entry.get(),
+                                                 self.timeout_entry.get()))
+        return (self.address_entry.get(), self.delay_entry.get(),
+                self.timeout_entry.get())
+
+
+class FileSettings(ttk.Frame):
+    def __init__(self, root, parsed, **kwargs):
+        super(FileSettings, self).__init__(root, **kwargs)
+        ttk.Label(self, text='CSV File Settings').grid(row=0, columnspan=2)
+        logger.debug('FileSettings: %s %s' % (root, kwargs))
+
+        ttk.Label(self, text='File Name:').grid(row=1, column=0)
+        self.name_entry = ttk.Entry(self)
+        self.name_entry.insert(0, parsed.name)
+        self.name_entry.grid(row=1, column=1)
+
+        ttk.Label(self, text='File Path:').grid(row=2, column=0)
+        self.path_entry = ttk.Entry(self)
+        self.path_entry.insert(0, parsed.path)
+        self.path_entry.grid(row=2, column=1)
+
+        self.write_file = BooleanVar(value=not parsed.nofile)
+        ttk.Checkbutton(self, text='Write CSV file',
+                        variable=self.write_file).grid(row=3, columnspan=2)
+
+    def get_values(self):
+        logger.debug('FileSettings: %s %s %s' % (self.name_entry.get(),
+                                                 self.path_entry.get(),
+                                                 self.write_file.get()))
+        return (self.name_entry.get(), self.path_entry.get(),
+                self.write_file.get())
+
+
+class PlotSettings(ttk.Frame):
+    def __init__(self, root, parsed, **kwargs):
+        super(PlotSettings, self).__init__(root, **kwargs)
+        ttk.Label(self, text='Plot Settings').grid(row=0, columnspan=2)
+        logger.debug('PlotSettings: %s %s' % (root, kwargs))
+
+        ttk.Label(self, text='Plot refresh frequency, in milliseconds:').grid(
+            row=1, column=0
+        )
+        self.frequency_entry = ttk.Entry(self)
+        self.frequency_entry.insert(0, str(parsed.refreshfrequency))
+        self.frequency_entry.grid(row=1, column=1)
+
+        ttk.Label(self, text='Number of points to display:').grid(row=2,
+                                                                  column=0)
+        self.length_entry = ttk.Entry(self)
+        self.length_entry.insert(0, str(parsed.tablelength))
+        self.length_entry.grid(row=2, column=1)
+
+    def get_values(self):
+        logger.debug('PlotSettings: %s %s' % (self.frequency_entry.get(),
+                                              self.length_entry.get()))
+        return self.frequency_entry.get(), self.length_entry.get()
+
+
+class Plot(ttk.Frame):
+    def __init__(self, parent, controller):
+        super(Plot, self).__init__(parent)
+        logger.debug('Plot: %s %s' % (parent, controller))
+        self.parsed = controller.parsed
+
+        button = ttk.Button(self, text='Stop ping and return to settings.',
+                            command=lambda: self.destroy_and_return(controller))
+        button.pack(side=BOTTOM)
+
+        self.plot_frame = ttk.Frame(self)
+        self.plot_frame.pack()
+
+        self.p = None
+
+    def generate_plot(self, ping_tuple, file_tuple, plot_tuple):
+        logger.debug('Plot: %s %s %s' % (ping_tuple, file_tuple, plot_tuple))
+        address, delay, timeout = ping_tuple
+        name, path, write = file_tuple
+        frequency, length = plot_tuple
+
+        delay = float(delay)
+        timeout = int(timeout)
+        frequency = float(frequency)
+        length = int(length)
+        parsed = self.parsed
+
+        c = core.Core(address, path, name, not write, not parsed.quiet,
+                      delay, timeout=timeout,
+                      max_in_flight=parsed.maxinflight,
+                      batch_rows=parsed.batchrows, batch_ms=parsed.batchms,
+                      fsync=parsed.fsync, file_format=parsed.format,
+                      index_every=parsed.indexevery,
+                      sketch_interval=parsed.sketchinterval,
+                      rollups=not parsed.norollups,
+                      rotate_bytes=parsed.rotatesize * 1e6,
+                      rotate_seconds=parsed.rotateperiod,
+                      compress=not parsed.nocompress, prober=parsed.prober,
+                      sqlite=parsed.sqlite)
+        if len(c.addresses) > 1:
+            self.p = plot.Dashboard(self.plot_frame, c, layout=parsed.layout,
+                                    budget=parsed.redrawbudget,
+                                    table_length=length)
+        else:
+            self.p = plot.Animate(self.plot_frame, c, table_length=length)
+        self.p.pack(side=TOP, fill=BOTH)
+        self.p.start(frequency)
+
+    def destroy_and_return(self, controller):
+        logger.debug('Plot: destroy')
+        self.p.stop()  # so no row is written once the core is closed
+        self.p.core.close()
+        self.p.destroy()
+        logger.debug('Plot: show')
+        controller.show_settings()
@@ -0,0 +1,280 @@
+""" ICMP echo over one long lived socket per address family.
+
+`pythonping` opens, uses and closes a raw socket for every ping. A
+`SocketProber` instead keeps one socket open for IPv4 and one for IPv6,
+shared by every probe to every target, and a receiver thread per socket
+hands each echo reply to the probe waiting for it, matched by the ICMP
+identifier and sequence number of the reply. The source address is not
+compared, as a target such as 0.0.0.0 is answered from another address.
+
+An unprivileged datagram ICMP socket is used where the system allows one
+(see net.ipv4.ping_group_range on Linux), and a raw socket otherwise. """
+import os
+import time
+import struct
+import socket
+import threading
+
+import core
+from log import Sampler, core_logger as logger
+
+error_sampler = Sampler(every=1, per_second=1)  # failed receives
+
+ECHO_REQUEST = {socket.AF_INET: 8, socket.AF_INET6: 128}
+ECHO_REPLY = {socket.AF_INET: 0, socket.AF_INET6: 129}
+PROTOCOLS = {socket.AF_INET: socket.IPPROTO_ICMP,
+             socket.AF_INET6: socket.IPPROTO_ICMPV6}
+HEADER = struct.Struct('!BBHHH')  # type, code, checksum, identifier, seq
+
+
+def checksum(data):
+    """ Returns the internet checksum of `data`, as in RFC 1071. """
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def echo_request(family, identifier, seq, size):
+    """ Returns an ICMP echo request packet with `size` bytes of payload. """
+    payload = bytes(i & 0xff for i in range(size))
+    header = HEADER.pack(ECHO_REQUEST[family], 0, 0, identifier, seq)
+    return HEADER.pack(ECHO_REQUEST[family], 0,
+                       checksum(header + payload), identifier, seq) + payload
+
+
+def parse_reply(family, packet, raw):
+    """ Returns the `(identifier, seq)` of the echo reply `packet`, or None
+    if it is anything else. Packets read from a raw IPv4 socket start with
+    their IP header, which is skipped if `raw` is True. """
+    if raw and family == socket.AF_INET:
+        packet = packet[(packet[0] & 0x0f) * 4:]
+    if len(packet) < HEADER.size:
+        return None
+
+    kind, code, _, identifier, seq = HEADER.unpack_from(packet)
+    if kind != ECHO_REPLY[family] or code:
+        return None
+    return identifier, seq
+
+
+class EchoSocket:
+    """ A socket sending echo requests of one address `family`, and the
+    thread receiving their replies.
+
+    `send` may be called from many threads at once. Every request gets the
+    next sequence number of the socket, so no two outstanding requests
+    share one whatever their target. """
+
+    def __init__(self, family):
+        self.family = family
+        try:
+            self.socket = socket.socket(family, socket.SOCK_DGRAM,
+                                        PROTOCOLS[family])
+            self.raw = False
+        except OSError:
+            self.socket = socket.socket(family, socket.SOCK_RAW,
+                                        PROTOCOLS[family])
+            self.raw = True
+
+        # Datagram sockets have their identifier set by the kernel, which
+        # only passes them replies bearing it.
+        if self.raw:
+            self.identifier = (os.getpid() ^ id(self)) & 0xffff
+        else:
+            self.identifier = self.socket.getsockname()[1]
+
+        self.seq = 0
+        self.pending = {}  # seq: called with the reply time
+        self.lock = threading.Lock()
+        self.closed = False
+        self.socket.settimeout(0.25)  # how often the receiver sees `closed`
+        self.receiver = threading.Thread(target=self.receive,
+                                         name='EchoReceiver', daemon=True)
+        self.receiver.start()
+
+    def receive(self):
+        """ Hands replies to the `send` calls awaiting them, until closed. """
+        while not self.closed:
+            try:
+                packet = self.socket.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if self.closed:
+                    return
+                if error_sampler():  # such as an ICMP error for a request
+                    logger.error('Could not receive an ICMP reply: %s', e)
+                continue
+            received = time.perf_counter()
+
+            reply = parse_reply(self.family, packet, self.raw)
+            if reply is None or (self.raw and reply[0] != self.identifier):
+                continue
+            with self.lock:
+                callback = self.pending.pop(reply[1], None)
+            if callback is not None:
+                callback(received)
+
+    def request(self, address, size, callback):
+        """ Sends an echo request to the resolved `address`, and has the
+        receiver call `callback` with the `time.perf_counter` its reply
+        arrived at.
+
+        Returns the key of the request in `self.pending`, which the caller
+        removes once it stops waiting, and the time it was sent at. """
+        with self.lock:
+            self.seq = self.seq % 0xffff + 1
+            key = self.seq
+            self.pending[key] = callback
+
+        packet = echo_request(self.family, self.identifier, key, size)
+        try:
+            sent = time.perf_counter()
+            self.socket.sendto(packet, (address, 0))
+        except BaseException:
+            self.forget(key)
+            raise
+        return key, sent
+
+    def forget(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def send(self, address, timeout, size):
+        """ Sends an echo request to the resolved `address` and waits up to
+        `timeout` milliseconds for its reply.
+
+        Returns the return time in milliseconds, or None if it was lost. """
+        replied = threading.Event()
+        received = []
+
+        def callback(at):
+            received.append(at)
+            replied.set()
+
+        key, sent = self.request(address, size, callback)
+        try:
+            replied.wait(timeout / 1000.0)
+        finally:
+            self.forget(key)
+
+        if not received:
+            return None
+        return (received[0] - sent) * 1000
+
+    async def send_async(self, address, timeout, size):
+        """ `send` for an event loop, awaiting the reply without blocking a
+        thread. """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def set_result(at):
+            if not future.done():
+                future.set_result(at)
+
+        def callback(at):
+            try:
+                loop.call_soon_threadsafe(set_result, at)
+            except RuntimeError:
+                pass  # the loop has closed
+
+        key, sent = self.request(address, size, callback)
+        try:
+            received = await asyncio.wait_for(future, timeout / 1000.0)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.forget(key)
+        return (received - sent) * 1000
+
+    def close(self):
+        self.closed = True
+        self.receiver.join()
+        self.socket.close()
+
+
+class SocketProber(core.Prober):
+    """ Sends probes over an `EchoSocket` per address family, opened the
+    first time a target of that family is probed.
+
+    If a family's socket cannot be opened, for lack of privileges, a
+    warning is logged and its targets are pinged with `core.icmp_ping`
+    instead. """
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.host_name = socket.gethostname()
+        self.sockets = {}  # family: EchoSocket, or None to fall back
+        self.addresses = {}  # target: (family, resolved address)
+        self.lock = threading.Lock()
+
+    def resolve(self, address):
+        """ Returns the family and numeric address of `address`, once per
+        target. """
+        try:
+            return self.addresses[address]
+        except KeyError:
+            pass
+
+        info = socket.getaddrinfo(address, None, 0, socket.SOCK_DGRAM)[0]
+        resolved = self.addresses[address] = (info[0], info[4][0])
+        return resolved
+
+    def echo_socket(self, family):
+        with self.lock:
+            if family not in self.sockets:
+                try:
+                    self.sockets[family] = EchoSocket(family)
+                except OSError as e:
+                    logger.warning('Could not open an ICMP socket, pinging '
+                                   'with pythonping instead: %s', e)
+                    self.sockets[family] = None
+            return self.sockets[family]
+
+    def send(self, address, timeout, seq, size):
+        try:
+            family, resolved = self.resolve(address)
+        except OSError:
+            return None  # unresolvable targets never answer
+
+        echo = self.echo_socket(family)
+        if echo is None:
+            return core.icmp_ping(address, self.host_name, timeout, seq,
+                                  size, self.verbose)
+        try:
+            return echo.send(resolved, timeout, size)
+        except OSError:
+            return None  # such as an unreachable network
+
+    async def send_async(self, loop, executor, address, timeout, seq, size):
+        """ Awaits replies on the event loop, so `MultiPing` needs no thread
+        per probe. Targets are resolved, and pythonping falls back to, on
+        `executor`. """
+        if address not in self.addresses:
+            try:
+                await loop.run_in_executor(executor, self.resolve, address)
+            except OSError:
+                return None
+        family, resolved = self.addresses[address]
+
+        echo = self.echo_socket(family)
+        if echo is None:
+            return await loop.run_in_executor(
+                executor, core.icmp_ping, address, self.host_name, timeout,
+                seq, size, self.verbose)
+        try:
+            return await echo.send_async(resolved, timeout, size)
+        except OSError:
+            return None
+
+    def close(self):
+        with self.lock:
+            for echo in self.sockets.values():
+                if echo is not None:
+                    echo.close()
+            self.sockets.clear()
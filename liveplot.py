@@ -0,0 +1,511 @@
+""" The live plot of PingStats, drawn in a Tk window.
+
+Kept apart from `plot`, which re-exports `Animate`, so that rendering logs
+to images never imports Tk. """
+import sys
+import math
+import time
+from collections import deque
+
+from tkinter import *
+from tkinter import ttk
+
+import metrics
+import downsample
+from core import ProbeWorker
+from plot import _PlotTable, epoch_to_num, use_style, LOCAL_TZ
+from log import Sampler, plot_logger as logger
+
+try:
+    import matplotlib
+    matplotlib.use('TkAgg')
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+    from matplotlib.transforms import Bbox
+    from matplotlib.ticker import MaxNLocator
+    import numpy as np
+except OSError as e:
+    raise RuntimeError('Could not load matplotlib!')
+
+row_sampler = Sampler()  # samples the rows logged by `Animate.get_pings`
+
+FRAMES = metrics.REGISTRY.counter('pingstats_frames_total',
+                                  'Frames drawn by the live plots.')
+REDRAWS = metrics.REGISTRY.counter('pingstats_redraws_total',
+                                   'Frames that redrew the whole figure.')
+FRAME_SECONDS = metrics.REGISTRY.histogram(
+    'pingstats_frame_seconds', 'Time a live plot took to draw a frame.')
+
+
+class _Plot(ttk.Frame):
+    """ Base class for `Animate` and `Dashboard`, maintains several
+    matplotlib properties. Every instance draws on a figure of its own, so
+    several live plots can be shown at once.
+
+    Subclasses set `self.core` and the `self.worker` probing it, and
+    implement `animate`, which `start` calls on a timer. """
+
+    title_str = ''
+    for arg in sys.argv:
+        if sys.argv.index(arg) == 0:
+            pass
+        else:
+            title_str += ' ' + arg
+
+    @property
+    def x_list(self):
+        return self.ptable.getx()
+
+    @x_list.setter
+    def x_list(self, i):
+        self.ptable.appendx(i)
+
+    @property
+    def y_list(self):
+        return self.ptable.gety()
+
+    @y_list.setter
+    def y_list(self, i):
+        self.ptable.appendy(i)
+
+    def __init__(self, root, *args, **kwargs):
+        """ Validates `self.title_str` and rotates plot labels. """
+        super(_Plot, self).__init__(root)
+
+        # table_length validation
+        try:
+            table_length = kwargs['table_length']
+        except KeyError:
+            table_length = None
+        if table_length is not None and type(table_length) is not int:
+            raise TypeError('table_length is not None or int')
+        self.ptable = _PlotTable(table_length)
+
+        # title_str validation
+        if type(self.title_str) is not str:
+            raise TypeError('Plot title_str requires a string object')
+        if self.title_str.count('\x00'):
+            raise(ValueError('Title String must not have null bytes'))
+
+        use_style()
+
+        self.fig = Figure(figsize=(5, 5), dpi=100)
+        self.ax1 = self.fig.add_subplot(111)
+        self.fig.subplots_adjust(left=0.13, bottom=0.33, right=0.95, top=0.89)
+
+        for label in self.ax1.xaxis.get_ticklabels():
+            label.set_rotation(45)
+
+        self.canvas = FigureCanvasTkAgg(self.fig, self)
+        self.canvas.draw()
+        self.canvas.get_tk_widget().pack(side=BOTTOM, fill=BOTH, expand=True)
+        self.worker = None
+        self.timer = None
+
+    def get_figure(self):
+        """ Executes `matplotlib.pyplot.show` """
+        return self.canvas
+
+    def start(self, interval):
+        """ Starts probing, and calls `self.animate` every `interval`
+        milliseconds. """
+        if not self.worker.is_alive():
+            self.worker.start()
+
+        self.timer = self.canvas.new_timer(interval=int(interval))
+        self.timer.add_callback(self.animate, None)
+        self.timer.start()
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
+        if self.worker is not None:
+            self.worker.stop(timeout=self.core.timeout / 1000.0)
+
+    def destroy(self):
+        self.stop()
+        super(_Plot, self).destroy()
+
+
+class Animate(_Plot):
+    """ Handles live plot generation.
+
+    Pings are probed and logged by a `core.ProbeWorker` thread, so the probe
+    rate follows the core's delay and a lost ping never blocks the GUI. Each
+    frame only drains the rows the worker has buffered.
+
+    The ping line is a persistent, animated artist. Each frame only updates
+    its data and blits it over a cached background; the whole figure is
+    redrawn only when the axes limits have to change. """
+    def animate(self, i):
+        """ Drains the rows probed since the last frame into the plot.
+
+        "i" - Required by matplotlib.animation.FuncAnimation
+        Returns the updated artists, which is empty if no new data arrived.
+        """
+        rows = self.worker.drain()
+        if not rows:
+            return ()
+
+        started = time.perf_counter()
+        for row in rows:
+            self.ptable.append(row[0], row[1])
+
+        x = epoch_to_num(self.x_list)
+        y = self.y_list
+        self.line.set_data(x, y)
+        with self.worker.lock:
+            text = self.core.stats.format(self.core.address)
+        self.stats_text.set_text(text)
+
+        if self.rescale(x, y):
+            self.canvas.draw()  # re-caches the background through on_draw
+            REDRAWS.inc()
+        else:
+            self.blit()
+
+        FRAME_SECONDS.time(started)
+        FRAMES.inc()
+        return self.line, self.stats_text
+
+    def rescale(self, x, y):
+        """ Updates the axes limits if `x` and `y` no longer fit them.
+
+        The x axis is given headroom past the newest point, so it only has to
+        move every tenth of a table. Returns True if the limits changed. """
+        xmin, xmax = self.ax1.get_xlim()
+        ymin, ymax = self.ax1.get_ylim()
+        low, high = y.min(), y.max()
+        changed = False
+
+        if x[-1] > xmax or x[0] < xmin:
+            headroom = max((x[-1] - x[0]) * 0.1, 1 / 86400.0)
+            self.ax1.set_xlim(x[0], x[-1] + headroom)
+            changed = True
+
+        if high > ymax or low < ymin or (high - low) < (ymax - ymin) / 4:
+            margin = max((high - low) * 0.05, 1.0)
+            self.ax1.set_ylim(low - margin, high + margin)
+            changed = True
+
+        return changed
+
+    def on_draw(self, event):
+        """ Caches the background after a full redraw, and draws the line
+        back over it. """
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self.ax1.draw_artist(self.line)
+        self.ax1.draw_artist(self.stats_text)
+
+    def blit(self):
+        """ Draws the line over the cached background. """
+        if self.background is None:
+            self.canvas.draw()
+            return
+
+        self.canvas.restore_region(self.background)
+        self.ax1.draw_artist(self.line)
+        self.ax1.draw_artist(self.stats_text)
+        self.canvas.blit(self.ax1.bbox)
+
+    def get_pings(self, obj):
+        """ Checks for None or appends to `self._PlotTable`. Yields True when
+        a point was appended. """
+        for val in obj:
+            if val is not None:
+                if row_sampler():
+                    logger.debug('Row %s', val)
+                self.core.record(val)
+
+            if val is None:
+                yield False
+            else:
+                if val[1] is None:
+                    self.ptable.append(val[0], -100.0)
+                else:
+                    self.ptable.append(val[0], val[1])
+
+                yield True
+
+    def __init__(self, root, core, worker=None, *args, **kwargs):
+        """ Validates kwargs, and generates a _PlotTable object. Rows come
+        from `worker`, by default a new `core.ProbeWorker`. """
+        super(Animate, self).__init__(root, *args, **kwargs)
+        self.core = core
+        self.nofile = core.nofile
+        if not self.nofile:
+            logger.info('write log')
+        else:
+            logger.info('-sNF')
+        self.generator = core.ping_generator
+        if worker is None:
+            worker = ProbeWorker(core, self.ptable.length)
+        self.worker = worker
+
+        # TODO Re-enable plot labels
+        # self.ax1.xlabel('Timestamps')
+        # self.ax1.ylabel('Return Time (in milliseconds)')
+        # self.ax1.title('Ping Over Time')
+        self.ax1.clear()
+        self.line, = self.ax1.plot([], [], 'g-', animated=True)
+        self.stats_text = self.ax1.text(0.01, 0.99, '', va='top', fontsize=7,
+                                        family='monospace', animated=True,
+                                        transform=self.ax1.transAxes)
+        self.ax1.xaxis_date(tz=LOCAL_TZ)
+        self.ax1.tick_params(axis='x', labelrotation=45)
+
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+
+class Replay(Animate):
+    """ Plays a recorded log back through an `Animate`, fed by a
+    `replay.Replayer` rather than probes. The plot starts over whenever the
+    replayer seeks. """
+    def __init__(self, root, core, replayer, *args, **kwargs):
+        super(Replay, self).__init__(root, core, replayer, *args, **kwargs)
+        self.seeks = replayer.seeks
+
+    def animate(self, i):
+        if self.worker.seeks != self.seeks:
+            self.seeks = self.worker.seeks
+            self.ptable = _PlotTable(self.ptable.length)
+            self.ax1.set_xlim(0, 1)  # refitted by the next row
+        return super(Replay, self).animate(i)
+
+
+class Dashboard(_Plot):
+    """ Handles live plot generation for every address of a `Core` at once.
+
+    Each target has a `_PlotTable` and a line of its own, either overlaid
+    on one axes or, with `layout` 'grid', on small multiples sharing their
+    time axis. Every address is probed by one `core.ProbeWorker`.
+
+    A frame's cost is bounded however many targets are shown. Lines are cut
+    down to an equal share of `points` before drawing. Overlaid lines share
+    an axes, so all of them are blitted every frame. Grid cells are blitted
+    in turn, oldest change first, until `budget` milliseconds have gone,
+    and the rest wait for the next frame; a cell whose return times outgrow
+    it is redrawn alone. Whole figure redraws, needed when the time axis
+    moves, happen at most every `redraw_every` seconds. """
+
+    LAYOUTS = ('overlay', 'grid')
+
+    def __init__(self, root, core, layout='grid', budget=20, points=20000,
+                 redraw_every=1.0, *args, **kwargs):
+        super(Dashboard, self).__init__(root, *args, **kwargs)
+        if layout not in self.LAYOUTS:
+            raise ValueError('layout must be one of %s'
+                             % ', '.join(self.LAYOUTS))
+
+        self.core = core
+        self.layout = layout
+        self.budget = budget / 1000.0
+        self.redraw_every = redraw_every
+        self.addresses = list(core.addresses)
+        self.share = max(points // len(self.addresses), 4)
+        self.tables = {address: _PlotTable(self.ptable.length)
+                       for address in self.addresses}
+        self.worker = ProbeWorker(core,
+                                  self.ptable.length * len(self.addresses))
+
+        self.pending = deque()  # targets with rows not yet drawn, oldest first
+        self.queued = set()  # the targets in `self.pending`
+        self.stale = False  # the time axis moved since the last redraw
+        self.last_redraw = None
+        self.background = None  # {axes: cached region}
+
+        if layout == 'overlay':
+            self.axes = [self.ax1] * len(self.addresses)
+        else:
+            self.fig.delaxes(self.ax1)
+            columns = int(math.ceil(math.sqrt(len(self.addresses))))
+            rows = int(math.ceil(len(self.addresses) / float(columns)))
+            grid = self.fig.subplots(rows, columns, sharex=True,
+                                     squeeze=False).flat
+            self.axes = [next(grid) for address in self.addresses]
+            for ax in grid:
+                ax.set_visible(False)
+            self.fig.subplots_adjust(left=0.01, bottom=0.01, right=0.99,
+                                     top=0.99, wspace=0.03, hspace=0.03)
+
+        self.lines, self.texts = {}, {}
+        for address, ax in zip(self.addresses, self.axes):
+            self.lines[address], = ax.plot([], [], '-' if layout == 'overlay'
+                                           else 'g-', lw=1, animated=True,
+                                           label=address)
+            ax.xaxis_date(tz=LOCAL_TZ)
+            if layout == 'grid':
+                # Cells are redrawn alone, so nothing may lie outside them,
+                # and their grid lines need no date aware locator.
+                ax.tick_params(labelbottom=False, labelleft=False)
+                ax.xaxis.set_major_locator(MaxNLocator(4))
+                ax.yaxis.set_major_locator(MaxNLocator(3))
+                self.texts[address] = ax.text(
+                    0.01, 0.97, address, va='top', fontsize=6,
+                    family='monospace', animated=True,
+                    transform=ax.transAxes)
+        if layout == 'overlay':
+            self.ax1.tick_params(axis='x', labelrotation=45)
+            if len(self.addresses) <= 10:
+                self.ax1.legend(loc='upper left', fontsize=6)
+
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def points(self, address):
+        """ Returns the x and y points of `address` to draw, cut down to
+        its share of the point budget. """
+        table = self.tables[address]
+        x, y = epoch_to_num(table.x), table.y
+        if len(x) > self.share:
+            x, y = downsample.downsample(x, y, self.share // 2)
+        return x, y
+
+    def label(self, address, ax):
+        """ Returns the text shown over the grid cell of `address`. """
+        with self.worker.lock:
+            window = self.core.stats.summary(address).get(
+                self.core.stats.spans[0])
+        ymin, ymax = ax.get_ylim()
+        if window is None or window['mean'] is None:
+            return address
+        return '%s %.1fms %.0f%% [%.0f-%.0f]' % (
+            address, window['mean'], window['loss'] * 100, ymin, ymax)
+
+    def fit(self, ax, x, y):
+        """ Updates the limits of `ax` if `x` and `y` no longer fit them,
+        as `Animate.rescale` does. `x` is only read at its ends.
+
+        The time axis spans a full table of pings, with a tenth of one
+        ahead of the newest, so it only moves every tenth of a table.
+        Returns whether the x and the y limits changed. """
+        xmin, xmax = ax.get_xlim()
+        ymin, ymax = ax.get_ylim()
+        low, high = y.min(), y.max()
+        moved, scaled = False, False
+
+        if x[-1] > xmax or x[0] < xmin:
+            span = max(self.ptable.length * self.core.delay / 86400.0,
+                       x[-1] - x[0], 1 / 86400.0)
+            ax.set_xlim(x[-1] - span, x[-1] + span * 0.1)
+            moved = True
+
+        if high > ymax or low < ymin or (high - low) < (ymax - ymin) / 4:
+            margin = max((high - low) * 0.05, 1.0)
+            ax.set_ylim(low - margin, high + margin)
+            scaled = True
+
+        return moved, scaled
+
+    def animate(self, i):
+        """ Drains the rows probed since the last frame into the tables,
+        and draws as much as the budget allows.
+
+        "i" - Required by matplotlib.animation.FuncAnimation
+        Returns the artists that were updated. """
+        for row in self.worker.drain():
+            table = self.tables.get(row[4])
+            if table is None:
+                continue
+            table.append(row[0], row[1])
+            if row[4] not in self.queued:
+                self.queued.add(row[4])
+                self.pending.append(row[4])
+        if not self.pending:
+            return ()
+
+        started = time.perf_counter()
+        redraw = self.redraw_due()
+        drawn = []
+        if self.layout == 'overlay' or redraw:
+            drawn = list(self.pending)
+            self.pending.clear()
+            self.queued.clear()
+            for address in drawn:
+                self.update(address)
+            if self.layout == 'overlay':
+                self.fit_overlay()
+
+        if redraw:
+            self.canvas.draw()  # re-caches the backgrounds through on_draw
+            REDRAWS.inc()
+        elif self.layout == 'overlay':
+            self.blit(self.addresses)  # restoring the axes erases them all
+        else:
+            while self.pending and (not drawn or time.perf_counter() -
+                                    started < self.budget):
+                address = self.pending.popleft()
+                self.queued.discard(address)
+                self.update(address)
+                self.blit([address], flush=False)
+                drawn.append(address)
+            self.canvas.blit(Bbox.union([
+                self.axes[self.addresses.index(address)].bbox
+                for address in drawn]))
+
+        FRAME_SECONDS.time(started)
+        FRAMES.inc()
+        return [self.lines[address] for address in drawn]
+
+    def update(self, address):
+        """ Updates the artists of `address`. A grid cell is fitted to its
+        line, and redrawn at once if its limits change; overlaid lines are
+        fitted together by `fit_overlay`. """
+        x, y = self.points(address)
+        self.lines[address].set_data(x, y)
+        if self.layout == 'overlay':
+            return
+
+        ax = self.axes[self.addresses.index(address)]
+        moved, scaled = self.fit(ax, x, y)
+        self.stale |= moved
+        if scaled and self.background is not None:
+            ax.draw(self.canvas.get_renderer())  # skips animated artists
+            self.background[ax] = self.canvas.copy_from_bbox(ax.bbox)
+        self.texts[address].set_text(self.label(address, ax))
+
+    def fit_overlay(self):
+        """ Fits the overlaid axes to every line. """
+        data = [self.lines[address].get_data() for address in
+                self.addresses if len(self.tables[address].x)]
+        x = np.concatenate([d[0] for d in data])
+        y = np.concatenate([d[1] for d in data])
+        self.stale |= any(self.fit(self.ax1, (x.min(), x.max()), y))
+
+    def redraw_due(self):
+        """ Returns True if the whole figure should be redrawn: before the
+        first frame, and once the time axis has moved and `redraw_every`
+        seconds have passed since the last redraw. """
+        if self.background is None:
+            return True
+        return self.stale and \
+            time.perf_counter() - self.last_redraw >= self.redraw_every
+
+    def blit(self, addresses, flush=True):
+        """ Draws the artists of `addresses` over their cached backgrounds,
+        and shows them unless `flush` is False. """
+        axes = []
+        for address in addresses:
+            ax = self.axes[self.addresses.index(address)]
+            if ax not in axes:
+                self.canvas.restore_region(self.background[ax])
+                axes.append(ax)
+            ax.draw_artist(self.lines[address])
+            if address in self.texts:
+                ax.draw_artist(self.texts[address])
+
+        if flush:
+            self.canvas.blit(Bbox.union([ax.bbox for ax in axes]))
+
+    def on_draw(self, event):
+        """ Caches the background of every axes after a full redraw, and
+        draws the lines back over them. """
+        self.stale = False
+        self.last_redraw = time.perf_counter()
+        self.background = {ax: self.canvas.copy_from_bbox(ax.bbox)
+                           for ax in set(self.axes)}
+        for address, ax in zip(self.addresses, self.axes):
+            ax.draw_artist(self.lines[address])
+            if address in self.texts:
+                ax.draw_artist(self.texts[address])
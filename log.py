@@ -1,11 +1,30 @@
+""" The loggers of PingStats, and the pipeline behind them.
+
+Records are put on a bounded queue by a `QueueHandler` and formatted and
+written by a listener thread, so a logging call never waits on formatting
+or file I/O. As a record's arguments are only formatted on the listener,
+they must not be changed once logged. Records that arrive while the queue
+is full are dropped and counted in the pingstats_log_records_dropped_total
+metric.
+
+Messages logged for every ping go through a `Sampler`, and are skipped
+before any formatting unless hot path logging is enabled with
+`set_hot_path`. """
 import logging
 import logging.handlers as handlers
 import sys  # for grabbing the program directory
 import os  # for splitting sys.argv
+import time
+import queue
+import atexit
+
+import metrics
+
 PROGRAM_PATH = os.path.split(sys.argv[0])[0]
 CORE_LOG_PATH = os.path.join(PROGRAM_PATH, 'logs', 'core.log')
 MAIN_LOG_PATH = os.path.join(PROGRAM_PATH, 'logs', 'main.log')
 PLOT_LOG_PATH = os.path.join(PROGRAM_PATH, 'logs', 'plot.log')
+QUEUE_SIZE = 10000  # records held for the listener before dropping
 
 # BEGIN Logger setup
 file_formatter = logging.Formatter(
@@ -42,17 +61,136 @@ plot_handler = handlers.RotatingFileHandler(PLOT_LOG_PATH,
 plot_handler.setFormatter(file_formatter)
 plot_handler.setLevel(logging.DEBUG)
 
+# The handlers the listener passes each logger's records to.
+ROUTES = {'base.core': (core_handler, stream_handler),
+          'base.main': (main_handler, stream_handler),
+          'base.plot': (plot_handler, stream_handler)}
+
+DROPPED = metrics.REGISTRY.counter(
+    'pingstats_log_records_dropped_total',
+    'Log records dropped because the logging queue was full.')
+
+
+class DroppingQueueHandler(handlers.QueueHandler):
+    """ A `QueueHandler` that drops records when its queue is full, instead
+    of blocking or reporting an error. """
+
+    def prepare(self, record):
+        """ Queues `record` unformatted, for the listener to format. The
+        queue never leaves the process, so records need not be pickled. """
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DROPPED.inc()
+
+
+class RouteHandler(logging.Handler):
+    """ Passes each record to the handlers `ROUTES` gives its logger. """
+
+    def handle(self, record):
+        for handler in ROUTES.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+
+log_queue = queue.Queue(QUEUE_SIZE)
+queue_handler = DroppingQueueHandler(log_queue)
+listener = handlers.QueueListener(log_queue, RouteHandler())
+listener.start()
+listening = True  # until `stop_listener`
+
+
+def stop_listener():
+    """ Writes every queued record and stops the listener thread. """
+    global listening
+    if listener is not None and listening:
+        listening = False
+        listener.stop()
+
+
+atexit.register(stop_listener)
+
+
+def _log_synchronously():
+    """ Has every logger write its records itself. The listener thread is
+    not copied into a forked process, so this is run in every child. """
+    global listener
+    listener = None
+    for name, route in ROUTES.items():
+        logger = logging.getLogger(name)
+        logger.removeHandler(queue_handler)
+        for handler in route:
+            logger.addHandler(handler)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_log_synchronously)
+
 core_logger = logging.getLogger('base.core')
 core_logger.setLevel(logging.DEBUG)
-core_logger.addHandler(core_handler)
-core_logger.addHandler(stream_handler)
+core_logger.addHandler(queue_handler)
 
 main_logger = logging.getLogger('base.main')
 main_logger.setLevel(logging.DEBUG)
-main_logger.addHandler(main_handler)
-main_logger.addHandler(stream_handler)
+main_logger.addHandler(queue_handler)
 
 plot_logger = logging.getLogger('base.plot')
 plot_logger.setLevel(logging.DEBUG)
-plot_logger.addHandler(plot_handler)
-plot_logger.addHandler(stream_handler)
+plot_logger.addHandler(queue_handler)
+
+# BEGIN Hot path sampling
+hot_path_every = 0  # log one in this many hot path messages, 0 for none
+
+
+def set_hot_path(every):
+    """ Has every `Sampler` that follows the default let one in `every` of
+    its calls through, or none if `every` is 0. """
+    global hot_path_every
+    if every < 0:
+        raise ValueError('every must not be negative')
+    hot_path_every = every
+
+
+class Sampler:
+    """ Decides which calls from one call site on the hot path are logged.
+
+    Calling a sampler returns True if the caller should log. One in every
+    `every` calls is let through, but no more than `per_second` a second.
+    If `every` is None it follows `set_hot_path`, and no calls are let
+    through while hot path logging is off. `self.skipped` counts the calls
+    held back while it was on. """
+
+    def __init__(self, every=None, per_second=10, clock=time.monotonic):
+        self.every = every
+        self.per_second = per_second
+        self.clock = clock
+        self.calls = 0
+        self.skipped = 0
+        self.allowance = per_second
+        self.last = None
+
+    def __call__(self):
+        every = hot_path_every if self.every is None else self.every
+        if not every:
+            return False
+
+        self.calls += 1
+        if self.calls % every:
+            self.skipped += 1
+            return False
+
+        if self.per_second:
+            now = self.clock()
+            if self.last is not None:
+                self.allowance = min(self.per_second, self.allowance +
+                                     (now - self.last) * self.per_second)
+            self.last = now
+            if self.allowance < 1:
+                self.skipped += 1
+                return False
+            self.allowance -= 1
+        return True
@@ -1,20 +1,48 @@
 import core
-import plot
+import binlog
+import sqlitelog
+import metrics
+import downsample
+import sketch
+import timeindex
+import replay
+import probers
 import argparse
+import atexit
 import time
+import datetime as dt
 
-from tkinter import *
-from tkinter import ttk
-import matplotlib.animation as animation
-
+import log
 from log import main_logger as logger
 
+
+def parse_time(text):
+    """ Parses an epoch timestamp or a local 'YYYY-MM-DD HH:MM[:SS]' time
+    for --start and --end. """
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return dt.datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+
+    raise argparse.ArgumentTypeError('Could not parse time \'%s\'' % text)
+
+
 parser = argparse.ArgumentParser(
     description='%s. This program defines some basic ping statistic '
                 'visualizationmethods through Python\'s \'matplotlib\'.'
                 % core.versionstr)
 
-parser.add_argument('-a', '--address', help='The IP address to ping.')
+parser.add_argument('-a', '--address',
+                    help='The IP address to ping. Used with -c, several '
+                         'comma separated addresses are pinged '
+                         'concurrently. Used with -pf, only the rows of this '
+                         'address are plotted.')
 
 parser.add_argument('-d', '--delay', help='The interval of time (in seconds) '
                                           'to wait between ping requests.',
@@ -44,6 +72,56 @@ parser.add_argument('-pf', '--plotfile',
                     help='Include the path to a previously generated CSV'
                     'file to generate a plot.')
 
+parser.add_argument('-F', '--follow',
+                    help='Used in conjunction with the -pf option, keep '
+                         'adding the rows a collector appends to the CSV '
+                         'log to the plot, every -sF milliseconds.',
+                    action='store_true')
+
+parser.add_argument('-b', '--batch', nargs='+',
+                    help='Include one or more CSV or binary logs, '
+                         'directories of logs or globs to render each to a '
+                         '\'*.png\' file in parallel, then print a summary '
+                         'of timings. Logs that would share an image name, '
+                         'such as \'log.csv\' and \'log.psb\', are named with '
+                         'their extension, or else their path.')
+
+parser.add_argument('-bo', '--batchout',
+                    help='Used in conjunction with the -b option, the '
+                         'directory to save images to. Defaults to next to '
+                         'each log.')
+
+parser.add_argument('-j', '--jobs',
+                    type=int, default=None,
+                    help='The number of processes -b renders with. Defaults '
+                         'to the number of cores.')
+
+parser.add_argument('-ds', '--downsample',
+                    choices=list(downsample.METHODS), default='minmax',
+                    help='The method used to reduce -pf plots to a few points '
+                         'per pixel. minmax keeps every spike and timeout, '
+                         'lttb best keeps the shape of the line.')
+
+parser.add_argument('--start', type=parse_time,
+                    help='Used in conjunction with the -pf option, the '
+                         'earliest time to plot, as an epoch timestamp or a '
+                         'local \'YYYY-MM-DD HH:MM[:SS]\' time. With -R, '
+                         'where the replay starts.')
+
+parser.add_argument('--end', type=parse_time,
+                    help='Used in conjunction with the -pf option, the latest '
+                         'time to plot, in the same formats as --start.')
+
+parser.add_argument('-ie', '--indexevery',
+                    type=int, default=timeindex.EVERY,
+                    help='The number of csv rows between entries of the time '
+                         'index kept next to the csv file. 0 disables the '
+                         'index.')
+
+parser.add_argument('-ri', '--reindex',
+                    help='Include the path to a previously generated CSV file '
+                         'to rebuild its time index.')
+
 parser.add_argument('-q', '--quiet', help='Flag this for quiet operation.',
                     action='store_true')
 
@@ -62,7 +140,8 @@ parser.add_argument('-sF', '--refreshfrequency',
                     help='Specify a number of milliseconds to wait between'
                     'refreshes of the -s plot visualization feature.'
                     'The lower the number, the better the performance'
-                    'of %s visualization. Handy for \"potatoes\"'
+                    'of %s visualization. Handy for \"potatoes\". '
+                    'Pings are still sent every -d seconds.'
                     % core.buildname)
 
 parser.add_argument('-sL', '--tablelength',
@@ -72,255 +151,265 @@ parser.add_argument('-sL', '--tablelength',
                     '%s visualization. Handy for \"potatoes.\"'
                     % core.buildname)
 
+parser.add_argument('-sl', '--layout', choices=('grid', 'overlay'),
+                    default='grid',
+                    help='How -s shows several addresses: \'grid\' draws '
+                         'each on a small plot of its own, \'overlay\' '
+                         'draws them all on one plot. Defaults to grid.')
+
+parser.add_argument('-sB', '--redrawbudget',
+                    type=float, default=20,
+                    help='The number of milliseconds -s may spend drawing '
+                         'the plots of several addresses each refresh. '
+                         'Plots left over are drawn next refresh. Defaults '
+                         'to 20.')
+
+parser.add_argument('-R', '--replay',
+                    help='Include the path to a previously generated CSV or '
+                         'binary log to play it back on a live plot, with '
+                         'pause, speed and seek controls. Replays the first '
+                         'address of the log, or the one given with -a.')
+
+parser.add_argument('-rx', '--replayspeed',
+                    type=float, default=60,
+                    help='How many times faster than real time -R plays the '
+                         'log, up to %g. Defaults to 60.'
+                         % replay.MAX_SPEED)
+
 parser.add_argument('-sNF', '--nofile',
                     help='Flag this option to disable outputting ping '
                     'information to a csv  file during live plotting.'
                     ' Helps with memory consumption.', action='store_true')
 
+parser.add_argument('-wR', '--batchrows',
+                    type=int, default=64,
+                    help='The number of ping rows to hold in memory before '
+                         'committing them to the csv file together.')
+
+parser.add_argument('-wT', '--batchms',
+                    type=float, default=1000,
+                    help='The maximum number of milliseconds a ping row may '
+                         'be held in memory before it is committed.')
+
+parser.add_argument('-wS', '--fsync',
+                    help='Flag this option to fsync the csv file after every '
+                         'commit.', action='store_true')
+
+parser.add_argument('-f', '--format',
+                    choices=['csv', 'binary', 'both'], default='csv',
+                    help='The format to log pings in. Binary logs are '
+                         'written to \'*%s\' files, and can be plotted with '
+                         '-pf.' % binlog.EXTENSION)
+
+parser.add_argument('-db', '--sqlite',
+                    help='Flag this option to also log pings to a SQLite '
+                         'database next to the log, indexed for queries by '
+                         'address and time. It can be plotted with -pf, '
+                         'and -a picks the address to plot.',
+                    action='store_true')
+
+parser.add_argument('-cv', '--convert',
+                    help='Include the path to a previously generated CSV file '
+                         'to convert it to a binary log, which must not exist '
+                         'yet.')
+
+parser.add_argument('-st', '--statsinterval',
+                    type=float, default=10,
+                    help='The number of seconds between printing rolling '
+                         'ping statistics during -c. 0 disables them.')
+
+parser.add_argument('-sk', '--sketchinterval',
+                    type=float, default=60,
+                    help='The number of seconds between saving return time '
+                         'quantile sketches next to the log file. 0 disables '
+                         'them.')
+
+parser.add_argument('-qs', '--quantiles', nargs='+',
+                    help='Include the paths to one or more \'*%s\' files to '
+                         'print their merged p50, p95 and p99 return times.'
+                         % sketch.EXTENSION)
+
+parser.add_argument('-nR', '--norollups',
+                    help='Flag this option to neither write 1s, 1m and 1h '
+                         'rollups next to the log file, nor plot long spans '
+                         'from them with -pf. Rollups take about 12 MB of '
+                         'sparse files per target.', action='store_true')
+
+parser.add_argument('-rs', '--rotatesize',
+                    type=float, default=0,
+                    help='The size, in megabytes, at which the CSV log is '
+                         'rotated into a segment. 0 disables it.')
+
+parser.add_argument('-rp', '--rotateperiod',
+                    type=float, default=0,
+                    help='The number of seconds of wall clock time each CSV '
+                         'log segment covers, such as 86400 for a segment '
+                         'per day. 0 disables it.')
+
+parser.add_argument('-nz', '--nocompress',
+                    help='Flag this option to keep rotated log segments '
+                         'uncompressed, instead of compressing them with '
+                         'gzip.', action='store_true')
+
+parser.add_argument('-P', '--prober', default='icmp',
+                    help='What sends pings: \'icmp\' for the network over '
+                         'one shared socket, \'pythonping\' for the network '
+                         'with a socket per ping, '
+                         '\'synthetic[:option=value,...]\' for simulated '
+                         'pings, or \'replay:PATH\' to replay the return '
+                         'times of a log. See probers.py for the options.')
+
+parser.add_argument('-m', '--maxinflight',
+                    type=int, default=1024,
+                    help='The maximum number of ping requests to keep '
+                         'outstanding at once when -c pings several '
+                         'addresses.')
+
+parser.add_argument('-mf', '--metricsfile',
+                    help='A path to periodically write hot path metrics to, '
+                         'in the Prometheus text format. Metrics are also '
+                         'written to stderr on SIGUSR1.')
+
+parser.add_argument('-mi', '--metricsinterval',
+                    type=float, default=10,
+                    help='The interval (in seconds) between rewrites of '
+                         '-mf. Defaults to 10.')
+
+parser.add_argument('-lh', '--loghotpath',
+                    type=int, default=0,
+                    help='Log one in this many of the messages logged for '
+                         'every ping, at most 10 a second from each place '
+                         'they are logged. Defaults to 0, which skips them '
+                         'without formatting them.')
+
 parser.add_argument('-v', '--version',
                     help='Flag this option to display software version.',
                     action='store_true')
 
 parsed = parser.parse_args()
 
-
-def _quit():  # used by -s
-    root.quit()
-    root.destroy()
-
-
-class Main(Tk):
-    def __init__(self, *args, **kwargs):
-        super(Main, self).__init__(*args, **kwargs)
-        # tk.Tk.__init__(self, *args, **kwargs)
-        logger.debug('Main: %s %s' % (args, kwargs))
-        container = ttk.Frame(self)
-
-        container.pack(side="top", fill="both", expand=True)
-
-        self.frames = {
-            Settings: Settings(container, self),
-            Plot: Plot(container, self),
-        }
-
-        for F in self.frames:
-            self.frames[F].grid(row=0, column=0, sticky="nsew")
-
-        self.show_settings()
-
-    def show_settings(self):
-        logger.debug('Main: settings')
-        self.frames[Settings].tkraise()
-
-    def show_plot(self, ping, file, plot):
-        logger.debug('Main: pass args to generate_plot')
-        self.frames[Plot].generate_plot(ping, file, plot)
-        logger.debug('Main: %s.tkraise()' % str(self.frames[Plot]))
-        self.frames[Plot].tkraise()
-
-
-class Settings(ttk.Frame):
-    def __init__(self, parent, controller):
-        super(Settings, self).__init__(parent)
-        logger.debug('Settings: %s %s' % (parent, controller))
-
-        # PING SETTINGS
-        self.ping_settings = PingSettings(self)
-        self.ping_settings.pack(pady=10)
-
-        # FILE SETTINGS
-        self.file_settings = FileSettings(self)
-        self.file_settings.pack(pady=10)
-
-        # PLOT SETTINGS
-        self.plot_settings = PlotSettings(self)
-        self.plot_settings.pack(pady=10)
-
-        self.run = ttk.Button(self, text='Start ping and display plot',
-                              command=lambda: controller.show_plot(
-                                      self.ping_settings.get_values(),
-                                      self.file_settings.get_values(),
-                                      self.plot_settings.get_values()))
-        self.run.pack(side=BOTTOM)
-
-
-class PingSettings(ttk.Frame):
-    def __init__(self, root, **kwargs):
-        super(PingSettings, self).__init__(root, **kwargs)
-        ttk.Label(self, text='Ping Settings').grid(row=0, columnspan=2)
-        logger.debug('PingSettings: %s %s' % (root, kwargs))
-
-        ttk.Label(self, text='Address:').grid(row=1, column=0)
-        if parsed.address is not None:
-            self.address_entry = ttk.Entry(self)
-            self.address_entry.insert(0, parsed.address)
-        else:
-            self.address_entry = ttk.Entry(self)
-        self.address_entry.grid(row=1, column=1)
-
-        ttk.Label(self, text='Delay between pings:').grid(row=2, column=0)
-        self.delay_entry = ttk.Entry(self)
-        self.delay_entry.insert(0, str(parsed.delay))
-        self.delay_entry.grid(row=2, column=1)
-
-        ttk.Label(self, text='Timeout:').grid(row=3, column=0)
-        self.timeout_entry = ttk.Entry(self)
-        self.timeout_entry.insert(0, str(parsed.timeout))
-        self.timeout_entry.grid(row=3, column=1)
-
-    def get_values(self):
-        logger.debug("PingSettings: %s %s %s" % (self.address_entry.get(),
-                                                 self.delay_entry.get(),
-                                                 self.timeout_entry.get()))
-        return (self.address_entry.get(), self.delay_entry.get(),
-                self.timeout_entry.get())
-
-
-class FileSettings(ttk.Frame):
-    def __init__(self, root, **kwargs):
-        super(FileSettings, self).__init__(root, **kwargs)
-        ttk.Label(self, text='CSV File Settings').grid(row=0, columnspan=2)
-        logger.debug('FileSettings: %s %s' % (root, kwargs))
-
-        ttk.Label(self, text='File Name:').grid(row=1, column=0)
-        self.name_entry = ttk.Entry(self)
-        self.name_entry.insert(0, parsed.name)
-        self.name_entry.grid(row=1, column=1)
-
-        ttk.Label(self, text='File Path:').grid(row=2, column=0)
-        self.path_entry = ttk.Entry(self)
-        self.path_entry.insert(0, parsed.path)
-        self.path_entry.grid(row=2, column=1)
-
-        self.write_file = BooleanVar(value=not parsed.nofile)
-        ttk.Checkbutton(self, text='Write CSV file',
-                        variable=self.write_file).grid(row=3, columnspan=2)
-
-    def get_values(self):
-        logger.debug('FileSettings: %s %s %s' % (self.name_entry.get(),
-                                                 self.path_entry.get(),
-                                                 self.write_file.get()))
-        return (self.name_entry.get(), self.path_entry.get(),
-                self.write_file.get())
-
-
-class PlotSettings(ttk.Frame):
-    def __init__(self, root, **kwargs):
-        super(PlotSettings, self).__init__(root, **kwargs)
-        ttk.Label(self, text='Plot Settings').grid(row=0, columnspan=2)
-        logger.debug('PlotSettings: %s %s' % (root, kwargs))
-
-        ttk.Label(self, text='Plot refresh frequency, in milliseconds:').grid(
-            row=1, column=0
-        )
-        self.frequency_entry = ttk.Entry(self)
-        self.frequency_entry.insert(0, str(parsed.refreshfrequency))
-        self.frequency_entry.grid(row=1, column=1)
-
-        ttk.Label(self, text='Number of points to display:').grid(row=2,
-                                                                  column=0)
-        self.length_entry = ttk.Entry(self)
-        self.length_entry.insert(0, str(parsed.tablelength))
-        self.length_entry.grid(row=2, column=1)
-
-    def get_values(self):
-        logger.debug('PlotSettings: %s %s' % (self.frequency_entry.get(),
-                                              self.length_entry.get()))
-        return self.frequency_entry.get(), self.length_entry.get()
-
-
-class Plot(ttk.Frame):
-    def __init__(self, parent, controller):
-        super(Plot, self).__init__(parent)
-        logger.debug('Plot: %s %s' % (parent, controller))
-
-        button = ttk.Button(self, text='Stop ping and return to settings.',
-                            command=lambda: self.destroy_and_return(controller))
-        button.pack(side=BOTTOM)
-
-        self.plot_frame = ttk.Frame(self)
-        self.plot_frame.pack()
-
-        self.p = None
-        self.ani = None
-
-    def generate_plot(self, ping_tuple, file_tuple, plot_tuple):
-        logger.debug('Plot: %s %s %s' % (ping_tuple, file_tuple, plot_tuple))
-        address, delay, timeout = ping_tuple
-        name, path, write = file_tuple
-        frequency, length = plot_tuple
-
-        delay = float(delay)
-        timeout = int(timeout)
-        frequency = float(frequency)
-        length = int(length)
-
-        self.p = plot.Animate(self.plot_frame,
-                              core.Core(address, path, name, not write,
-                                        not parsed.quiet, delay,
-                                        timeout=timeout),
-                              table_length=length)
-        self.p.pack(side=TOP, fill=BOTH)
-
-        self.ani = animation.FuncAnimation(self.p.fig, self.p.animate,
-                                           interval=frequency)
-
-    def destroy_and_return(self, controller):
-        logger.debug('Plot: destroy')
-        self.p.destroy()
-        logger.debug('Plot: show')
-        controller.show_settings()
+try:
+    parsed.prober = probers.from_spec(parsed.prober, not parsed.quiet)
+except (ValueError, OSError) as e:
+    parser.error(str(e))
+
+if parsed.follow and parsed.generateimage is not None:
+    parser.error('-F cannot be used with -gi')
+if parsed.follow and (parsed.plotfile or '').endswith(
+        (binlog.EXTENSION, sqlitelog.EXTENSION)):
+    parser.error('-F can only follow CSV logs')
+if parsed.metricsinterval <= 0:
+    parser.error('-mi must be positive')
+if parsed.redrawbudget < 0:
+    parser.error('-sB must not be negative')
+if not 0 < parsed.replayspeed <= replay.MAX_SPEED:
+    parser.error('-rx must be above 0 and at most %g' % replay.MAX_SPEED)
+if parsed.loghotpath < 0:
+    parser.error('-lh must not be negative')
+log.set_hot_path(parsed.loghotpath)
+
+core.flush_on_signals()
+metrics.dump_on_signal(parsed.metricsfile)
+if parsed.metricsfile is not None:
+    dumper = metrics.Dumper(parsed.metricsfile, parsed.metricsinterval)
+    dumper.start()
+    atexit.register(dumper.stop)
 
 
 if parsed.version:
     print(core.versionstr)
+    quit()
 
-elif parsed.address is not None:
-
-    if parsed.showliveplot:
-        root = Tk()
-        logger.debug('showliveplot: %s' % root)
-        p = plot.Animate(root,
-                         core.Core(parsed.address, parsed.path, parsed.name,
-                                   parsed.nofile, not parsed.quiet,
-                                   timeout=parsed.timeout),
-                         table_length=parsed.tablelength
-                         )
-
-        logger.debug('showliveplot: plot.Animate = %s' % str(p))
-
-        p.grid(row=1, column=0)
-
-        ani = animation.FuncAnimation(p.fig, p.animate,
-                                      interval=parsed.refreshfrequency)
-
-        logger.debug('showliveplot: ani = %s' % str(ani))
+elif parsed.replay is not None:
+    import gui
+    gui.show_replay(parsed)
+    quit()
 
-        button = ttk.Button(root, text='Quit', command=_quit)
-        button.grid(row=0, columnspan=2)
+elif parsed.address is not None and (parsed.showliveplot or parsed.cli):
 
-        root.mainloop()
+    if parsed.showliveplot:
+        import gui
+        gui.show_live_plot(parsed)
         quit()
 
     elif parsed.cli:
         c = core.Core(parsed.address, parsed.path, parsed.name,
-                      parsed.nofile, not parsed.quiet, timeout=parsed.timeout)
+                      parsed.nofile, not parsed.quiet, timeout=parsed.timeout,
+                      delay=parsed.delay, max_in_flight=parsed.maxinflight,
+                      blocking=True, batch_rows=parsed.batchrows,
+                      batch_ms=parsed.batchms, fsync=parsed.fsync,
+                      file_format=parsed.format,
+                      index_every=parsed.indexevery,
+                      sketch_interval=parsed.sketchinterval,
+                      rollups=not parsed.norollups,
+                      rotate_bytes=parsed.rotatesize * 1e6,
+                      rotate_seconds=parsed.rotateperiod,
+                      compress=not parsed.nocompress,
+                      prober=parsed.prober, sqlite=parsed.sqlite)
 
         logger.debug('cli: core = %s' % str(c))
 
-        for return_data in c.ping_generator:
-            if not c.nofile:
-                core.write_csv_data(c.cwriter, return_data)
+        stats_schedule = core.Scheduler(parsed.statsinterval)
+        stats_schedule.advance()
+
+        def record(row):
+            c.record(row)
+            if parsed.statsinterval and stats_schedule.due():
+                stats_schedule.advance()
+                print(c.stats.format(now=row[0]))
+                if c.sketches is not None:
+                    print(c.sketches.format())
+
+        if len(c.addresses) > 1:
+            import asyncio
+            try:
+                asyncio.run(c.engine.run(record))
+            except KeyboardInterrupt:
+                pass
+            quit()
 
-            time.sleep(parsed.delay)
+        for return_data in c.ping_generator:
+            record(return_data)
 
         quit()
 
+elif parsed.convert is not None:
+    try:
+        print('Wrote %s' % binlog.convert_csv(parsed.convert))
+    except FileExistsError as e:
+        parser.error('%s already exists' % e.filename)
+    quit()
+
+elif parsed.quantiles is not None:
+    print(sketch.format_quantiles(sketch.merge_files(parsed.quantiles)))
+    quit()
+
+elif parsed.reindex is not None:
+    print('Wrote %d index entries' % timeindex.rebuild(parsed.reindex,
+                                                       parsed.indexevery))
+    quit()
+
+elif parsed.batch is not None:
+    import batch
+    paths = batch.expand(parsed.batch)
+    started = time.perf_counter()
+    results = batch.render_all(paths, parsed.batchout, parsed.jobs,
+                               method=parsed.downsample, start=parsed.start,
+                               end=parsed.end, rollups=not parsed.norollups)
+    print(batch.summary(results, time.perf_counter() - started))
+    quit()
+
 elif parsed.plotfile is not None:
-    pf = plot.PlotFile(parsed.plotfile, image_path=parsed.generateimage)
+    import plot
+    pf = plot.PlotFile(parsed.plotfile, image_path=parsed.generateimage,
+                       method=parsed.downsample, start=parsed.start,
+                       end=parsed.end, rollups=not parsed.norollups,
+                       follow=parsed.follow,
+                       interval=parsed.refreshfrequency,
+                       address=parsed.address)
     pf.show_plot()
     quit()
 
 if __name__ == '__main__':
-    root = Main()
-    root.mainloop()
+    import gui
+    gui.Main(parsed).mainloop()
@@ -0,0 +1,256 @@
+""" Counters, gauges and latency histograms for the hot paths of PingStats.
+
+Every stage of a collector, from sending a probe to drawing a frame,
+updates the metrics registered here. Updating one costs a lock and a few
+additions, so they are always on. `render` writes them all in the
+Prometheus text format, which `Dumper` rewrites to a file every few seconds
+and `dump_on_signal` writes whenever SIGUSR1 is received:
+
+    python main.py -a 8.8.8.8 -c -mf pingstats.prom
+    kill -USR1 <pid>
+
+The metrics are:
+
+    pingstats_probes_total              probes sent
+    pingstats_probes_lost_total         probes that never returned
+    pingstats_probe_seconds             time to send and await a probe
+    pingstats_missed_slots_total        probe slots skipped for running late
+    pingstats_rows_written_total        rows passed to `Core.write_csv`
+    pingstats_write_seconds             time `Core.write_csv` took per row
+    pingstats_commit_seconds            time to commit a batch to a log
+    pingstats_pending_rows              rows held by log writers
+    pingstats_worker_rows               rows buffered by a `ProbeWorker`
+    pingstats_frames_total              frames drawn by the live plots
+    pingstats_redraws_total             frames that redrew the whole figure
+    pingstats_frame_seconds             time a live plot took per frame
+"""
+import os
+import sys
+import time
+import bisect
+import signal
+import threading
+
+# Latency buckets in seconds, from 50 microseconds to 10 seconds.
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value):
+    """ Formats `value` as a Prometheus sample value. """
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Counter:
+    """ A count that only goes up. """
+    kind = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+
+class Gauge:
+    """ A value that goes up and down, either `set` or read from `func` as it
+    is rendered. """
+    kind = 'gauge'
+
+    def __init__(self, name, help, func=None):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.func = func
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        return [(self.name, self.func() if self.func is not None
+                 else self.value)]
+
+
+class Histogram:
+    """ Counts observations into cumulative `buckets`, tracking their count
+    and sum as well. """
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # the last is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def time(self, started):
+        """ Observes the seconds since `started`, a `time.perf_counter`. """
+        self.observe(time.perf_counter() - started)
+
+    def quantile(self, q):
+        """ Returns the upper bound of the bucket holding the `q` quantile,
+        or None if nothing has been observed. """
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return None
+
+        rank, total = q * count, 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            total += n
+            if total >= rank:
+                return bound
+
+    def samples(self):
+        with self.lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+
+        samples, cumulative = [], 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            bound = format_value(float(bound))
+            samples.append(('%s_bucket{le="%s"}' % (self.name, bound),
+                            cumulative))
+        return samples + [(self.name + '_sum', total),
+                          (self.name + '_count', count)]
+
+
+class Registry:
+    """ The metrics of a process, by name, in the order registered. """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError('Metric \'%s\' is already registered'
+                             % metric.name)
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help):
+        return self.register(Counter(name, help))
+
+    def gauge(self, name, help, func=None):
+        return self.register(Gauge(name, help, func))
+
+    def histogram(self, name, help, buckets=BUCKETS):
+        return self.register(Histogram(name, help, buckets))
+
+    def render(self):
+        """ Returns every metric in the Prometheus text format. """
+        lines = []
+        for metric in self.metrics.values():
+            lines.append('# HELP %s %s' % (metric.name, metric.help))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            for name, value in metric.samples():
+                lines.append('%s %s' % (name, format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def render():
+    """ Returns every metric of `REGISTRY` in the Prometheus text format. """
+    return REGISTRY.render()
+
+
+def write(path, registry=REGISTRY):
+    """ Atomically replaces the file at `path` with `registry.render()`, so a
+    scraper never reads half a file. """
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        f.write(registry.render())
+    os.replace(temporary, path)
+
+
+class Dumper(threading.Thread):
+    """ Rewrites the file at `path` with `write` every `interval` seconds,
+    and once more when stopped. """
+
+    def __init__(self, path, interval=10, registry=REGISTRY):
+        if interval <= 0:
+            raise ValueError('Dumper interval must be positive')
+
+        super(Dumper, self).__init__(name='MetricsDumper', daemon=True)
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        try:
+            write(self.path, self.registry)
+        except OSError as e:
+            sys.stderr.write('Could not write metrics to %s: %s\n'
+                             % (self.path, e))
+
+    def stop(self):
+        self.stopped.set()
+        if self.is_alive():
+            self.join()
+        self.dump()
+
+
+def dump_on_signal(path=None, signum=None):
+    """ Installs a handler that writes every metric to stderr, and to the
+    file at `path` unless it is None, when `signum` is received. `signum`
+    defaults to SIGUSR1, and nothing is installed where it does not exist.
+
+    The handler only wakes a thread that writes the metrics, as the main
+    thread may be interrupted while it holds the lock of a metric.
+
+    Must be called from the main thread. """
+    if signum is None:
+        signum = getattr(signal, 'SIGUSR1', None)
+        if signum is None:
+            return
+
+    requested = threading.Event()
+
+    def dump():
+        while 1:
+            requested.wait()
+            requested.clear()
+            text = render()
+            sys.stderr.write(text)
+            sys.stderr.flush()
+            if path is not None:
+                try:
+                    write(path)
+                except OSError as e:
+                    sys.stderr.write('Could not write metrics to %s: %s\n'
+                                     % (path, e))
+
+    threading.Thread(target=dump, name='MetricsSignalDumper',
+                     daemon=True).start()
+
+    def handler(signum, frame):
+        requested.set()
+
+    signal.signal(signum, handler)
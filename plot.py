@@ -2,31 +2,127 @@ import datetime as dt
 import csv
 from warnings import warn
 import os
-
-from tkinter import *
-from tkinter import ttk
-
+import math
+
+import binlog
+import csvlog
+import downsample
+import rollup
+import segments
+import sqlitelog
+import tail
+import timeindex
 from log import plot_logger as logger
 
 try:
     import matplotlib
-    matplotlib.use('TkAgg')
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
     from matplotlib.figure import Figure
-    # import matplotlib.animation as animation
     from matplotlib import style
     import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    import numpy as np
 except OSError as e:
     raise RuntimeError('Could not load matplotlib!')
 
+# matplotlib date number of the epoch, which differs between versions.
+EPOCH_NUM = mdates.date2num(dt.datetime(1970, 1, 1))
+LOCAL_TZ = dt.datetime.now().astimezone().tzinfo
+# The plot style, named differently by matplotlib 3.6 and later.
+STYLES = ('seaborn-v0_8-darkgrid', 'seaborn-darkgrid')
+
+
+def __getattr__(name):
+    """ Imports the Tk based live plot from `liveplot` when it is first
+    used, so plotting logs to images never imports Tk. """
+    if name in ('_Plot', 'Animate', 'Replay', 'Dashboard'):
+        import liveplot
+        return getattr(liveplot, name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def use_style():
+    """ Uses the first of `STYLES` this matplotlib has, or its default
+    style if it has none. """
+    for name in STYLES:
+        try:
+            style.use(name)
+            return
+        except OSError:
+            pass
+
+
+def epoch_to_num(timestamps):
+    """ Converts an array of epoch timestamps to matplotlib date numbers,
+    which should be plotted on an axis set to `LOCAL_TZ`. """
+    return timestamps / 86400.0 + EPOCH_NUM
+
+
+def first_timestamp(path):
+    """ Returns the timestamp of the first row of the CSV or binary log at
+    `path`, or of its oldest segment, or None if it has no rows. """
+    if path.endswith(binlog.EXTENSION):
+        log = binlog.BinaryLog(path)
+        try:
+            return float(log.timestamps[0]) if len(log) else None
+        finally:
+            log.close()
+
+    found = segments.list_segments(path)
+    if found:
+        return found[0][0]
+    return segments.first_timestamp(path)
+
+
+class _Ring:
+    """ A fixed length ring buffer of floats.
+
+    Until it first fills, values are stored in an array that doubles as
+    needed. From then on every value is stored twice, `length` slots apart,
+    so the most recent `length` values are always available as one
+    contiguous, oldest first view without copying. """
+
+    def __init__(self, length):
+        self.length = length
+        self.data = np.empty(min(length, 1024))
+        self.head = 0
+        self.count = 0
+
+    def append(self, a):
+        if self.count < self.length:
+            if self.count == len(self.data):
+                grown = np.empty(min(2 * len(self.data), self.length))
+                grown[:self.count] = self.data
+                self.data = grown
+
+            self.data[self.count] = a
+            self.count += 1
+            if self.count == self.length:
+                self.data = np.concatenate((self.data, self.data))
+            return
+
+        self.data[self.head] = a
+        self.data[self.head + self.length] = a
+        self.head += 1
+        if self.head == self.length:
+            self.head = 0
+
+    def view(self):
+        """ Returns a view of the stored values, oldest first. The view is
+        only valid until the next call to `append`. """
+        if self.count < self.length:
+            return self.data[:self.count]
+        return self.data[self.head:self.head + self.length]
+
 
 class _PlotTable:
         """ A class to maintain a specified number of objects to plot to
         matplotlib.
 
-        Manages two lists:
-            self.x (takes `datetime.datetime` objects)
-            self.y (takes any `float` data type)
+        Manages two ring buffers, so appending costs the same
+        whatever the table length:
+            self.x (epoch timestamps, as `float`)
+            self.y (return times, as `float`)
         """
 
         def __init__(self, length=None):
@@ -34,9 +130,6 @@ class _PlotTable:
 
             Length must be `int` or None. """
 
-            self.x = []
-            self.y = []
-
             if length is not None and type(length) is not int:
                 raise TypeError('length must be int or None')
 
@@ -47,21 +140,40 @@ class _PlotTable:
             else:
                 self.length = int(length)
 
+            self._x = _Ring(self.length)
+            self._y = _Ring(self.length)
+
+        @property
+        def x(self):
+            return self._x.view()
+
+        @property
+        def y(self):
+            return self._y.view()
+
+        def append(self, x, y):
+            """ Appends a point without validation. The fast path for live
+            plotting.
+
+            "x" - An epoch timestamp.
+            "y" - A return time.
+            """
+            self._x.append(x)
+            self._y.append(y)
+
         def appendx(self, a):
             """ Append a new value to the x value of the table. Maintains
             specified length of table upon reaching max.
 
-            "a" - A `datetime.datetime` object.
+            "a" - A `datetime.datetime` object or an epoch timestamp `float`.
             """
 
-            if type(a) is not dt.datetime:
-                raise TypeError('Requires a datetime.datetime object')
+            if type(a) is dt.datetime:
+                a = a.timestamp()
+            elif type(a) is not float:
+                raise TypeError('Requires a datetime.datetime object or float')
 
-            if len(self.x) < self.length:
-                self.x.append(a)
-            else:
-                self.x.pop(0)
-                self.x.append(a)
+            self._x.append(a)
 
         def appendy(self, a):
             """ Append a new value to the y value of the table. Maintains
@@ -73,11 +185,7 @@ class _PlotTable:
             if type(a) is not float:
                 raise TypeError('PlotTable.appendy requires float type data.')
 
-            if len(self.y) < self.length:
-                self.y.append(a)
-            else:
-                self.y.pop(0)
-                self.y.append(a)
+            self._y.append(a)
 
         def getx(self):  # arbitrary get method
             return self.x
@@ -86,132 +194,12 @@ class _PlotTable:
             return self.y
 
 
-class _Plot(ttk.Frame):
-    """ Base class for `Animate` and `PlotFile`, maintains several matplotlib
-    properties. """
-
-    fig = Figure(figsize=(5, 5), dpi=100)
-
-    title_str = ''
-    for arg in sys.argv:
-        if sys.argv.index(arg) is 0:
-            pass
-        else:
-            title_str += ' ' + arg
-
-    ax1 = fig.add_subplot(111)
-    fig.subplots_adjust(left=0.13, bottom=0.33, right=0.95, top=0.89)
-
-    @property
-    def x_list(self):
-        return self.ptable.getx()
-
-    @x_list.setter
-    def x_list(self, i):
-        self.ptable.appendx(i)
-
-    @property
-    def y_list(self):
-        return self.ptable.gety()
-
-    @y_list.setter
-    def y_list(self, i):
-        self.ptable.appendy(i)
-
-    def __init__(self, root, *args, **kwargs):
-        """ Validates `self.title_str` and rotates plot labels. """
-        super(_Plot, self).__init__(root)
-        self.ptable = _PlotTable()
-
-        # table_length validation
-        try:
-            table_length = kwargs['table_length']
-        except KeyError:
-            table_length = None
-        if table_length is not None and type(table_length) is not int:
-            raise TypeError('table_length is not None or int')
-        if table_length is not None:
-            self.ptable.length = table_length
-
-        # title_str validation
-        if type(self.title_str) is not str:
-            raise TypeError('Plot title_str requires a string object')
-        if self.title_str.count('\x00'):
-            raise(ValueError('Title String must not have null bytes'))
-
-        style.use('seaborn-darkgrid')
-
-        for label in self.ax1.xaxis.get_ticklabels():
-            label.set_rotation(45)
-
-        self.canvas = FigureCanvasTkAgg(self.fig, self)
-        self.canvas.show()
-        self.canvas.get_tk_widget().pack(side=BOTTOM, fill=BOTH, expand=True)
-
-    def get_figure(self):
-        """ Executes `matplotlib.pyplot.show` """
-        return self.canvas
-
-
-class Animate(_Plot):
-    """ Handles live plot generation. """
-    def animate(self, i):
-        """ Calls the next iteration of `c.Core.ping_generator`, and yields
-        data to the plot.
-
-        "i" - Required by matplotlib.animation.FuncAnimation
-        Returns None.
-        """
-        self.ax1.clear()
-
-        # TODO Re-enable plot labels
-        # self.ax1.xlabel('Timestamps')
-        # self.ax1.ylabel('Return Time (in milliseconds)')
-        # self.ax1.title('Ping Over Time')
-
-        # DRAW POINTS
-        self.ax1.plot_date(self.x_list, self.y_list, 'g-')
-        for label in self.ax1.xaxis.get_ticklabels():
-            label.set_rotation(45)
-
-        self.fig.subplots_adjust(left=0.13, bottom=0.33, right=0.95, top=0.89)
-
-        next(self.get_pings(self.generator))
-
-    def get_pings(self, obj):
-        """ Checks for None or appends to `self._PlotTable` """
-        for val in obj:
-            if not self.nofile and val is not None:
-                logger.debug(val)
-                self.core.write_csv(val)
-
-            if val is None:
-                yield
-            else:
-                self.x_list = dt.datetime.fromtimestamp(val[0])
-
-                if val[1] is None:
-                    self.y_list = -100.0
-                else:
-                    self.y_list = val[1]
-
-                yield
-
-    def __init__(self, root, core, *args, **kwargs):
-        """ Validates kwargs, and generates a _PlotTable object. """
-        super(Animate, self).__init__(root, *args, **kwargs)
-        self.core = core
-        self.nofile = core.nofile
-        if not self.nofile:
-            logger.info('write log')
-        else:
-            logger.info('-sNF')
-        self.generator = core.ping_generator
-
-
 class PlotFile:
-    fig = plt.figure(figsize=(5, 5), dpi=100)
-    ax1 = plt.axes()
+    """ Plots a log file, either to a window or to an image.
+
+    Every instance draws on its own figure. When an image is rendered the
+    figure is not managed by `pyplot` and has an Agg canvas, so no GUI is
+    needed and instances can be rendered in parallel processes. """
 
     @staticmethod
     def generate_reader(csv_path):
@@ -231,46 +219,191 @@ class PlotFile:
         return dt.datetime.fromtimestamp(timestamp)
 
     def yield_points(self):
-        """ Yields an x and y coordinate for each row in `reader` """
-        for row in self.creader:
-            x = dt.datetime.fromtimestamp(float(row[0]))
-
-            if row[1] == '':  # none
-                y = -100.0
-
-            else:
-                y = float(row[1])
-
-            yield x, y
-
-    def __init__(self, csv_file, image_path=None):
-        # TODO Re-enable plotfile
-        plt.subplots_adjust(left=0.13, bottom=0.33, right=0.95, top=0.89)
-        style.use('seaborn-darkgrid')
-        for label in self.ax1.xaxis.get_ticklabels():
-            label.set_rotation(45)
+        """ Yields an x and y coordinate for each row in the log.
+
+        Much slower than `csvlog.read_chunks`, which `PlotFile` uses. """
+        with open(self.csv_file) as f:
+            for x, y in csvlog.read_chunks(f):
+                for a, b in zip(x.tolist(), y.tolist()):
+                    yield dt.datetime.fromtimestamp(a), b
+
+    def __init__(self, csv_file, image_path=None, method='minmax', start=None,
+                 end=None, rollups=True, follow=False, interval=1000,
+                 address=None):
+        """ Reads and plots `csv_file`, either a CSV or a binary log or a
+        SQLite database, from the epoch timestamps `start` to `end`, which
+        default to the whole log. A CSV log is read along with every segment
+        it was rotated into. Only the rows for `address` are plotted, unless
+        it is None.
+
+        If `rollups` is True and the span is long, the finest rollup tier
+        that fits the figure is plotted instead of the log's raw rows.
+
+        The points are reduced with `downsample.downsample` `method` to about
+        two per pixel column of the figure before they are drawn.
+
+        If `follow` is True, the rows a collector appends to a CSV log
+        afterwards are added to the plot by `update`, which `show_plot`
+        calls every `interval` milliseconds. `self.x` and `self.y` only ever
+        hold the rows read here. """
+        use_style()
+        if image_path is None:
+            self.fig = plt.figure(figsize=(5, 5), dpi=100)
+        else:
+            self.fig = Figure(figsize=(5, 5), dpi=100)
+            FigureCanvasAgg(self.fig)
+        self.ax1 = self.fig.add_subplot(111)
+        self.fig.subplots_adjust(left=0.13, bottom=0.33, right=0.95, top=0.89)
+        self.ax1.tick_params(axis='x', labelrotation=45)
 
         self.image_path = image_path
-
-        self.creader = self.generate_reader(csv_file)
-
-        self.points_generator = self.yield_points()
-
-        self.x = []
-        self.y = []
-
-        for a, b in self.points_generator:
-            self.x.append(a)
-            self.y.append(b)
-
-        self.ax1.plot_date(self.x, self.y, 'r-')
-
-        plt.xlabel('Timestamps')
-        plt.ylabel('Return Time (in milliseconds)')
-        plt.title('Ping Over Time')
+        self.csv_file = csv_file
+
+        if not os.access(csv_file, os.F_OK):
+            raise RuntimeError('Cannot access %s!' % csv_file)
+
+        self.method = method
+        self.follower = None
+        self.interval = interval
+        if follow:
+            if csv_file.endswith((binlog.EXTENSION, sqlitelog.EXTENSION)):
+                raise ValueError('Only CSV logs can be followed')
+            # Watched before reading, so no change is missed. Rows appended
+            # while the log is read below are read twice, and dropped by
+            # `update` the second time.
+            self.watcher = tail.Watcher(csv_file)
+            self.follower = tail.Follower(csv_file, os.path.getsize(csv_file),
+                                          address=address)
+
+        width = self.fig.get_figwidth() * self.fig.dpi
+        tier = None
+        if rollups and not csv_file.endswith(sqlitelog.EXTENSION):
+            tier = rollup.choose_tier(csv_file, start, end, 20 * width,
+                                      address=address,
+                                      first=first_timestamp(csv_file))
+
+        if tier is not None:
+            self.plot_rollup(csv_file, tier, start, end, address)
+        elif csv_file.endswith(sqlitelog.EXTENSION):
+            self.x, self.y = sqlitelog.read(csv_file, address, start, end)
+        elif csv_file.endswith(binlog.EXTENSION):
+            self.log = binlog.BinaryLog(csv_file)
+            x, y = self.log.points()
+            if address is not None:
+                if address in self.log.targets:
+                    keep = self.log.target_mask(address)
+                else:
+                    keep = np.zeros(len(x), dtype=bool)
+                x, y = x[keep], y[keep]
+            low, high = 0, len(x)
+            if start is not None:  # widened, as rows may be out of order
+                low = np.searchsorted(x, start - timeindex.SLACK, 'left')
+            if end is not None:
+                high = np.searchsorted(x, end + timeindex.SLACK, 'right')
+            x, y = x[low:high], y[low:high]
+            keep = np.ones(len(x), dtype=bool)
+            if start is not None:
+                keep &= x >= start
+            if end is not None:
+                keep &= x <= end
+            self.x, self.y = x[keep], y[keep]
+        else:
+            self.x, self.y = csvlog.read(csv_file, start, end,
+                                         address=address)
+
+        if tier is None:
+            # Late rows, such as lost probes, are logged out of order.
+            if np.any(self.x[1:] < self.x[:-1]):
+                order = np.argsort(self.x, kind='stable')
+                self.x, self.y = self.x[order], self.y[order]
+
+            x, y = downsample.downsample(self.x, self.y, width, method)
+            logger.info('Plotting %d of %d points' % (len(x), len(self.x)))
+
+            self.line, = self.ax1.plot(epoch_to_num(x), y, 'r-')
+            self.shown = x, y
+        self.ax1.xaxis_date(tz=LOCAL_TZ)
+
+        # Followed rows not yet downsampled, and the last row read above.
+        self.tail = np.zeros(0), np.zeros(0)
+        self.seen = self.x[-1] if len(self.x) else None
+
+        self.ax1.set_xlabel('Timestamps')
+        self.ax1.set_ylabel('Return Time (in milliseconds)')
+        self.ax1.set_title('Ping Over Time')
+
+    def plot_rollup(self, csv_file, tier, start=None, end=None,
+                    address=None):
+        """ Plots the mean of every slot of the `tier` rollup of `csv_file`,
+        or of its `address`, shading the range from its minimum to its
+        maximum. """
+        slots = rollup.read_tier(csv_file, tier, address)
+        if start is not None:
+            slots = slots[slots['start'] >= start]
+        if end is not None:
+            slots = slots[slots['start'] <= end]
+
+        self.x, lows, self.y, highs = rollup.points(slots)
+        x = epoch_to_num(self.x)
+        self.ax1.fill_between(x, lows, highs, color='r', alpha=0.25,
+                              linewidth=0)
+        self.line, = self.ax1.plot(x, self.y, 'r-')
+        self.shown = self.x, self.y
+
+    def update(self, *args):
+        """ Adds the rows appended to a followed log since the last call
+        to the plot. Returns True if the plot changed.
+
+        Only the appended bytes are read. New rows are kept apart until
+        they would fill two points per pixel, then downsampled at the
+        resolution of the rest of the line and merged into it, so each
+        update costs the same however long the log has been followed. """
+        if self.follower is None or not self.watcher.changed():
+            return False
+
+        x, y, truncated = self.follower.read()
+        if truncated:
+            self.shown = self.tail = np.zeros(0), np.zeros(0)
+        elif self.seen is not None:
+            keep = x > self.seen
+            x, y = x[keep], y[keep]
+        self.seen = None
+        if not len(x) and not truncated:
+            return False
+
+        width = self.fig.get_figwidth() * self.fig.dpi
+        tail_x = np.concatenate((self.tail[0], x))
+        tail_y = np.concatenate((self.tail[1], y))
+        shown_x, shown_y = self.shown
+        if len(tail_x) > 2 * width:
+            first = shown_x[0] if len(shown_x) else tail_x[0]
+            columns = (tail_x[-1] - tail_x[0]) / max(
+                (tail_x[-1] - first) / width, 1e-9)
+            tail_x, tail_y = downsample.downsample(
+                tail_x, tail_y, max(math.ceil(columns), 1), self.method)
+            shown_x = np.concatenate((shown_x, tail_x))
+            shown_y = np.concatenate((shown_y, tail_y))
+            tail_x, tail_y = np.zeros(0), np.zeros(0)
+            if len(shown_x) > 4 * width:
+                shown_x, shown_y = downsample.downsample(shown_x, shown_y,
+                                                         width, self.method)
+        self.shown = shown_x, shown_y
+        self.tail = tail_x, tail_y
+
+        self.line.set_data(epoch_to_num(np.concatenate((shown_x, tail_x))),
+                           np.concatenate((shown_y, tail_y)))
+        self.ax1.relim()
+        self.ax1.autoscale_view()
+        self.fig.canvas.draw_idle()
+        return True
 
     def show_plot(self):
         if self.image_path is not None:
-            plt.savefig(self.image_path)
-        else:
-            plt.show()
+            self.fig.savefig(self.image_path)
+            return
+
+        if self.follower is not None:
+            self.timer = self.fig.canvas.new_timer(interval=self.interval)
+            self.timer.add_callback(self.update)
+            self.timer.start()
+        plt.show()
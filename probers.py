@@ -0,0 +1,194 @@
+""" Simulated `core.Prober`s, for running PingStats without a network.
+
+`SyntheticProber` draws return times from a latency distribution, with
+bursts of loss and whole outages, and `ReplayProber` plays back the return
+times of an existing log. Both answer at once unless asked to `sleep` for
+each return time, so `Core`, `Animate` and the log writers can be driven
+far faster than any real network allows, without raw sockets or root.
+
+`from_spec` builds a prober from the -P option of `main.py`:
+
+    icmp                                the network, the default
+    pythonping                          the network, a socket per ping
+    synthetic                           20ms gamma latency, no loss
+    synthetic:mean=80,loss=0.02,burst=5 options of `SyntheticProber`
+    replay:PingStatsLog.csv             the return times of a log
+"""
+import math
+import time
+import random
+import threading
+
+import core
+
+LATENCIES = ('constant', 'uniform', 'normal', 'gamma')
+
+
+class SyntheticProber(core.Prober):
+    """ Answers probes with return times drawn from `latency`, one of
+    `LATENCIES`, averaging `mean` milliseconds and varying by about
+    `spread`.
+
+    `loss` of all probes are lost, in bursts averaging `burst` probes to a
+    target. Every `outage_every` seconds on average, every probe is lost
+    for `outage_length` seconds. Lost probes never count as a return time.
+    If `sleep` is True each probe takes its return time, or `timeout` when
+    lost, to answer, like a real one. Runs with the same `seed` draw the
+    same values. """
+
+    def __init__(self, latency='gamma', mean=20.0, spread=5.0, loss=0.0,
+                 burst=1.0, outage_every=0.0, outage_length=0.0, sleep=False,
+                 seed=None, clock=time.monotonic):
+        if latency not in LATENCIES:
+            raise ValueError('latency must be one of %s'
+                             % ', '.join(LATENCIES))
+        if mean <= 0 or spread < 0:
+            raise ValueError('mean must be positive and spread not negative')
+        if not 0 <= loss <= 1 or burst < 1:
+            raise ValueError('loss must be between 0 and 1, and burst at '
+                             'least 1')
+
+        self.latency = latency
+        self.mean = mean
+        self.spread = spread
+        self.loss = loss
+        self.burst = burst
+        self.outage_every = outage_every
+        self.outage_length = outage_length
+        self.sleep = sleep
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.bursts = {}  # address: probes left in its loss burst
+        self.outage_start = self.next_outage(clock())
+
+    def next_outage(self, now):
+        if not self.outage_every:
+            return math.inf
+        return now + self.random.expovariate(1.0 / self.outage_every)
+
+    def draw(self):
+        """ Returns a return time drawn from the latency distribution. """
+        if self.latency == 'constant' or not self.spread:
+            return self.mean
+        if self.latency == 'uniform':
+            return max(self.random.uniform(self.mean - self.spread,
+                                           self.mean + self.spread), 0.0)
+        if self.latency == 'normal':
+            return max(self.random.gauss(self.mean, self.spread), 0.0)
+
+        shape = (self.mean / self.spread) ** 2
+        return self.random.gammavariate(shape, self.mean / shape)
+
+    def lost(self, address):
+        """ Returns True if the next probe to `address` is lost. """
+        now = self.clock()
+        if now >= self.outage_start:
+            if now < self.outage_start + self.outage_length:
+                return True
+            self.outage_start = self.next_outage(now)
+
+        left = self.bursts.get(address, 0)
+        if left:
+            self.bursts[address] = left - 1
+            return True
+
+        # Bursts start often enough that `loss` of all probes are lost.
+        if self.loss and self.random.random() < \
+                self.loss / (self.burst * (1 - self.loss) + self.loss):
+            length = 1
+            if self.burst > 1:
+                length += int(self.random.expovariate(
+                    1.0 / (self.burst - 1)) + 0.5)
+            self.bursts[address] = length - 1
+            return True
+        return False
+
+    def send(self, address, timeout, seq, size):
+        with self.lock:
+            rtt = None if self.lost(address) else self.draw()
+
+        if self.sleep:
+            time.sleep((timeout if rtt is None else rtt) / 1000.0)
+        return rtt
+
+
+class ReplayProber(core.Prober):
+    """ Answers probes to each target with the return times logged for it in
+    the log at `path`, in order, starting over once they run out if `loop`
+    is True and losing every probe otherwise. A target the log holds no
+    pings for is answered with those of its only target, if it has one, and
+    loses every probe otherwise. If `sleep` is True each probe takes its
+    return time to answer. """
+
+    def __init__(self, path, loop=True, sleep=False):
+        import replay
+
+        self.rtts = {}  # address: its return times, in order
+        for row in replay.rows(path):
+            self.rtts.setdefault(row[4], []).append(
+                None if core.is_timeout(row[1]) else row[1])
+        if not self.rtts:
+            raise ValueError('%s holds no pings to replay' % path)
+
+        self.loop = loop
+        self.sleep = sleep
+        self.positions = {}  # address: index of its next return time
+        self.lock = threading.Lock()
+
+    def send(self, address, timeout, seq, size):
+        rtts = self.rtts.get(address)
+        if rtts is None:
+            if len(self.rtts) != 1:
+                return None
+            rtts, = self.rtts.values()
+
+        with self.lock:
+            i = self.positions.get(address, 0)
+            if i >= len(rtts):
+                if not self.loop:
+                    return None
+                i = 0
+            self.positions[address] = i + 1
+
+        rtt = rtts[i]
+        if self.sleep:
+            time.sleep((timeout if rtt is None else rtt) / 1000.0)
+        return rtt
+
+
+def from_spec(spec, verbose=False):
+    """ Returns the prober described by `spec`, as in the module docstring.
+    Raises ValueError if `spec` is malformed. """
+    kind, sep, options = spec.partition(':')
+
+    if kind == 'icmp' and not options:
+        import icmp
+        return icmp.SocketProber(verbose)
+
+    if kind == 'pythonping' and not options:
+        return core.IcmpProber(verbose)
+
+    if kind == 'replay' and options:
+        return ReplayProber(options)
+
+    if kind == 'synthetic':
+        kwargs = {}
+        for option in filter(None, options.split(',')):
+            key, sep, value = option.partition('=')
+            if key == 'latency':
+                kwargs[key] = value
+            elif key == 'seed':
+                kwargs[key] = int(value)
+            elif key == 'sleep':
+                kwargs[key] = value.lower() in ('1', 'true', 'yes')
+            elif key in ('mean', 'spread', 'loss', 'burst', 'outage_every',
+                         'outage_length'):
+                kwargs[key] = float(value)
+            else:
+                raise ValueError('Unknown synthetic prober option \'%s\''
+                                 % key)
+        return SyntheticProber(**kwargs)
+
+    raise ValueError('Unknown prober \'%s\'' % spec)
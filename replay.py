@@ -0,0 +1,280 @@
+""" Replays recorded PingStats logs through the live plot.
+
+A `Replayer` stands in for the `core.ProbeWorker` of a `plot.Animate`,
+feeding it the rows of a CSV or binary log as they were recorded, sped up
+by 1 to `MAX_SPEED` times, with pause and seek. Seeking never re-reads the
+log from its start: CSV logs and their segments are entered at the nearest
+`timeindex` entry, and binary logs, whose records have a fixed size, are
+searched by timestamp directly. """
+import os
+import gzip
+import threading
+import time
+from collections import deque
+
+import binlog
+import core
+import segments
+import timeindex
+from log import core_logger as logger
+
+MAX_SPEED = 1000.0
+TAIL_BYTES = 4096  # read from the end of a log to find its last row
+
+
+def parse_row(line):
+    """ Returns the `(timestamp, rtt, timeout, size, address)` row of a CSV
+    log `line`, in bytes, or None if it is malformed. Timed out pings get a
+    return time of `core.TIMEOUT_RTT`. """
+    fields = line.decode().rstrip('\r\n').split(',')
+    try:
+        timestamp = binlog.parse_timestamp(fields[0])
+        rtt = fields[1]
+        rtt = core.TIMEOUT_RTT if core.is_timeout(rtt) else float(rtt)
+    except (ValueError, IndexError):
+        return None
+
+    fields += [None] * (5 - len(fields))
+    return timestamp, rtt, fields[2], fields[3], fields[4]
+
+
+def csv_rows(path, start=None):
+    """ Yields the rows of the CSV log at `path` stamped `start` or later,
+    from every segment it was rotated into. Each uncompressed file is
+    entered at the `timeindex` entry before `start`. """
+    for log_path in segments.log_paths(path, start):
+        f = segments.open_segment(log_path)
+        if not isinstance(f, gzip.GzipFile):
+            f.seek(timeindex.byte_range(log_path, start)[0])
+
+        with f:
+            for line in f:
+                row = parse_row(line)
+                if row is None:
+                    if line.strip():
+                        logger.warning('Skipping malformed row: %s' % line)
+                    continue
+                if start is None or row[0] >= start:
+                    yield row
+
+
+def binary_rows(path, start=None, chunk=4096):
+    """ Yields the rows of the binary log at `path` stamped `start` or
+    later. Their timeout and size were not recorded, so are None. Records
+    are copied out of the log `chunk` at a time, from `timeindex.SLACK`
+    seconds before `start`, as they may be out of order. """
+    import numpy as np
+
+    log = binlog.BinaryLog(path)
+    try:
+        first = 0
+        if start is not None:
+            first = int(np.searchsorted(log.timestamps,
+                                        start - timeindex.SLACK))
+        for i in range(first, len(log), chunk):
+            records = log.records[i:i + chunk]
+            rtts = records['rtt'].astype(np.float64)
+            rtts[(records['flags'] & binlog.FLAG_TIMEOUT) != 0] = \
+                core.TIMEOUT_RTT
+            rows = zip(records['timestamp'].tolist(), rtts.tolist(),
+                       records['target'].tolist())
+            del records  # holds the memory map open
+            for timestamp, rtt, target in rows:
+                if start is None or timestamp >= start:
+                    yield timestamp, rtt, None, None, log.targets[target]
+    finally:
+        log.close()
+
+
+def rows(path, start=None, address=None):
+    """ Yields the rows of the log at `path`, binary or CSV, stamped `start`
+    or later, only those for `address` unless it is None. """
+    if path.endswith(binlog.EXTENSION):
+        source = binary_rows(path, start)
+    else:
+        source = csv_rows(path, start)
+
+    try:
+        for row in source:
+            if address is None or row[4] == address:
+                yield row
+    finally:
+        source.close()
+
+
+def bounds(path):
+    """ Returns the first row of the log at `path` and the timestamp of its
+    last, or None if it holds no rows. """
+    if path.endswith(binlog.EXTENSION):
+        log = binlog.BinaryLog(path)
+        try:
+            if not len(log):
+                return None
+            last = float(log.timestamps[-1])
+        finally:
+            log.close()
+    else:
+        last = None
+        with open(path, 'rb') as f:
+            f.seek(max(os.fstat(f.fileno()).st_size - TAIL_BYTES, 0))
+            for line in reversed(f.read().splitlines()[1:] or [b'']):
+                row = parse_row(line)
+                if row is not None:
+                    last = row[0]
+                    break
+
+    source = rows(path)
+    try:
+        first = next(source, None)
+    finally:
+        source.close()
+    if first is None:
+        return None
+    return first, first[0] if last is None else max(last, first[0])
+
+
+class Replayer(threading.Thread):
+    """ Replays the log at `path` into `core` on a background thread, in
+    place of a `core.ProbeWorker`.
+
+    Rows for `address`, or every row if it is None, are passed to
+    `core.record` and buffered for `drain` as the replay clock reaches their
+    timestamps. The clock starts at `start`, or the first row, and runs
+    `speed` times faster than real time. Gaps that would take longer than
+    `max_wait` seconds to replay, such as the collector being down, are
+    skipped. `self.seeks` counts the calls to `seek`, so a plot can tell
+    when to clear itself. """
+
+    def __init__(self, path, core, speed=60.0, start=None, address=None,
+                 max_wait=1.0, maxlen=65536, clock=time.monotonic):
+        super(Replayer, self).__init__(name='Replayer', daemon=True)
+        self.path = path
+        self.core = core
+        self.address = address
+        self.max_wait = max_wait
+        self.clock = clock
+        self.rows = deque(maxlen=maxlen)
+        self.lock = threading.Lock()  # held while a row is recorded
+        self.changed = threading.Condition()
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+
+        self.speed = self.check_speed(speed)
+        self.paused = False
+        self.target = start  # where to seek to next, or None
+        self.seeks = 0
+        self.log_anchor = None  # the replay time at `self.wall_anchor`
+        self.wall_anchor = clock()
+
+    @staticmethod
+    def check_speed(speed):
+        if not 0 < speed <= MAX_SPEED:
+            raise ValueError('speed must be above 0 and at most %g'
+                             % MAX_SPEED)
+        return float(speed)
+
+    @property
+    def position(self):
+        """ The replay clock, as an epoch timestamp, or None before the
+        first row. """
+        if self.log_anchor is None or self.paused:
+            return self.log_anchor
+        return self.log_anchor + (self.clock() - self.wall_anchor) * \
+            self.speed
+
+    def anchor(self, position):
+        """ Sets the replay clock to `position`. Called holding
+        `self.changed`. """
+        self.log_anchor = position
+        self.wall_anchor = self.clock()
+
+    def pause(self):
+        with self.changed:
+            if not self.paused:
+                self.anchor(self.position)
+                self.paused = True
+
+    def resume(self):
+        with self.changed:
+            if self.paused:
+                self.wall_anchor = self.clock()
+                self.paused = False
+                self.changed.notify_all()
+
+    def set_speed(self, speed):
+        speed = self.check_speed(speed)
+        with self.changed:
+            self.anchor(self.position)
+            self.speed = speed
+            self.changed.notify_all()
+
+    def seek(self, timestamp):
+        """ Continues the replay from the first row stamped `timestamp` or
+        later, discarding the buffered rows and the statistics so far. """
+        with self.changed:
+            self.target = timestamp
+            self.seeks += 1
+            self.rows.clear()
+            with self.lock:
+                self.core.stats = core.RollingStats(self.core.stats.spans)
+            self.finished.clear()
+            self.changed.notify_all()
+
+    def record(self, row):
+        with self.changed:
+            if self.target is not None:
+                return  # seeking away from this row
+            with self.lock:
+                self.core.record(row)
+            self.rows.append(row)
+
+    def run(self):
+        source = None
+        row = None
+        try:
+            while not self.stopped.is_set():
+                with self.changed:
+                    if self.target is not None or source is None:
+                        start, self.target = self.target, None
+                        if source is not None:
+                            source.close()
+                        source = rows(self.path, start, self.address)
+                        row = next(source, None)
+                        if row is not None:
+                            self.anchor(row[0] if start is None else start)
+
+                    if row is None or self.paused:
+                        if row is None:
+                            self.finished.set()
+                        self.changed.wait(0.25)
+                        continue
+
+                    wait = (row[0] - self.position) / self.speed
+                    if wait > self.max_wait:
+                        self.anchor(row[0])  # skip the gap
+                        wait = 0
+                    if wait > 0:
+                        self.changed.wait(min(wait, 0.1))
+                        continue
+
+                self.record(row)
+                row = next(source, None)
+        finally:
+            if source is not None:
+                source.close()
+
+    def drain(self):
+        """ Returns the rows buffered since the last call, oldest first. """
+        rows = []
+        try:
+            while 1:
+                rows.append(self.rows.popleft())
+        except IndexError:
+            return rows
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        with self.changed:
+            self.changed.notify_all()
+        if self.is_alive():
+            self.join(timeout)
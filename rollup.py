@@ -0,0 +1,292 @@
+""" Multi-resolution rollups of the ping stream, in the style of RRDtool.
+
+Every target gets one fixed size file per tier next to the log. A tier file
+is a 16 byte header followed by `retention / step` slots of 40 bytes:
+
+    start   float64   epoch timestamp the slot begins at
+    count   uint32    pings sent
+    lost    uint32    pings that never returned
+    min     float32   lowest return time
+    max     float32   highest return time
+    sum     float64   sum of return times
+    squares float64   sum of squared return times
+
+The slot for a timestamp is `(timestamp // step) % slots`, so each file wraps
+around and only ever holds its tier's retention. Long spans are plotted from
+the finest tier that fits the plot's point budget, instead of raw rows.
+"""
+import os
+import glob
+import struct
+
+import core
+from log import core_logger as logger
+
+EXTENSION = '.rollup'
+MAGIC = b'PSRR'
+HEADER = struct.Struct('<4sIQ')
+SLOT = struct.Struct('<dIIffdd')
+
+RAW_SPAN = 3600  # spans up to this many seconds are plotted from raw rows
+
+# (name, step in seconds, retention in seconds)
+TIERS = (('1s', 1, 2 * 86400),
+         ('1m', 60, 60 * 86400),
+         ('1h', 3600, 5 * 365 * 86400))
+
+
+def safe_name(address):
+    """ Returns `address` with characters that are unsafe in file names
+    replaced. """
+    return ''.join(c if c.isalnum() or c in '.-_' else '_' for c in address)
+
+
+def tier_path(log_path, address, name):
+    """ Returns the path of the `name` tier file of `address`. """
+    return '%s.%s.%s%s' % (log_path, safe_name(address), name, EXTENSION)
+
+
+class Slot:
+    """ The running aggregate of one slot. """
+    __slots__ = ('start', 'count', 'lost', 'minimum', 'maximum', 'total',
+                 'squares')
+
+    def __init__(self, start, count=0, lost=0, minimum=float('inf'),
+                 maximum=float('-inf'), total=0.0, squares=0.0):
+        self.start = start
+        self.count = count
+        self.lost = lost
+        self.minimum = minimum
+        self.maximum = maximum
+        self.total = total
+        self.squares = squares
+
+    def add(self, rtt):
+        self.count += 1
+        if rtt is None:
+            self.lost += 1
+        else:
+            if rtt < self.minimum:
+                self.minimum = rtt
+            if rtt > self.maximum:
+                self.maximum = rtt
+            self.total += rtt
+            self.squares += rtt * rtt
+
+    def pack(self):
+        return SLOT.pack(self.start, self.count, self.lost, self.minimum,
+                         self.maximum, self.total, self.squares)
+
+
+class TierFile:
+    """ One fixed size, wrapping tier file, holding `retention` seconds of
+    slots `step` seconds wide. """
+
+    def __init__(self, path, step, retention):
+        self.path = path
+        self.step = step
+        self.slots = max(int(retention // step), 1)
+
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, step, self.slots))
+                f.truncate(HEADER.size + self.slots * SLOT.size)
+
+        self.file = open(path, 'r+b')
+        magic, step, slots = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC or step != self.step or slots != self.slots:
+            raise ValueError('%s does not match its tier' % path)
+
+        self.current = None
+
+    def position(self, start):
+        return HEADER.size + int(start // self.step) % self.slots * SLOT.size
+
+    def load(self, start):
+        """ Returns the stored slot for `start`, or an empty one. """
+        self.file.seek(self.position(start))
+        stored = SLOT.unpack(self.file.read(SLOT.size))
+        if stored[0] == start and stored[1]:
+            return Slot(*stored)
+        return Slot(start)
+
+    def store(self, slot):
+        self.file.seek(self.position(slot.start))
+        self.file.write(slot.pack())
+
+    def add(self, timestamp, rtt):
+        """ Adds a ping, writing out the current slot once a ping arrives for
+        a later one. """
+        start = timestamp - timestamp % self.step
+
+        if self.current is None or start != self.current.start:
+            if self.current is not None:
+                self.store(self.current)
+                if start < self.current.start:  # a late ping
+                    late = self.load(start)
+                    late.add(rtt)
+                    self.store(late)
+                    return
+            self.current = self.load(start)
+
+        self.current.add(rtt)
+
+    def flush(self):
+        if self.current is not None:
+            self.store(self.current)
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class RollupWriter(core.Batcher):
+    """ A `core.Batcher` that aggregates ping rows into the `tiers` of every
+    target, next to the log at `log_path`. Each batch is added to the tiers
+    and their current slots written out, so readers see the rollups as
+    often as the log itself. """
+
+    def __init__(self, log_path, tiers=TIERS, batch_rows=64, batch_ms=1000):
+        self.log_path = log_path
+        self.tiers = tiers
+        self.files = {}  # address: [TierFile, ...], None once closed
+        super(RollupWriter, self).__init__(batch_rows, batch_ms)
+
+    @property
+    def closed(self):
+        return self.files is None
+
+    def commit(self, rows):
+        for row in rows:
+            address = str(row[4])
+            try:
+                files = self.files[address]
+            except KeyError:
+                files = self.files[address] = [
+                    TierFile(tier_path(self.log_path, address, name), step,
+                             retention) for name, step, retention in
+                    self.tiers]
+
+            timestamp = float(row[0])
+            rtt = None if core.is_timeout(row[1]) else float(row[1])
+            for tier in files:
+                tier.add(timestamp, rtt)
+
+    def sync(self):
+        for files in self.files.values():
+            for tier in files:
+                tier.flush()
+
+    def close(self):
+        """ Commits every queued row and closes the tier files. """
+        with self.lock:
+            super(RollupWriter, self).close()
+            if self.files is not None:
+                for files in self.files.values():
+                    for tier in files:
+                        tier.close()
+                self.files = None
+
+
+def tier_paths(log_path, name, address=None):
+    """ Returns the paths of the `name` tier files of `address`, or of
+    every target of the log at `log_path`. """
+    if address is not None:
+        path = tier_path(log_path, address, name)
+        return [path] if os.path.exists(path) else []
+    return glob.glob(glob.escape(log_path) + '.*.' + name + EXTENSION)
+
+
+def read_tier(log_path, name, address=None):
+    """ Reads the `name` tier of `address`, or of every target of the log
+    at `log_path`, merging targets whose slots start at the same time.
+
+    Returns a structured `numpy` array of the filled slots, oldest first. """
+    import numpy as np
+
+    dtype = np.dtype([('start', '<f8'), ('count', '<u4'), ('lost', '<u4'),
+                      ('min', '<f4'), ('max', '<f4'), ('sum', '<f8'),
+                      ('squares', '<f8')])
+
+    parts = []
+    for path in tier_paths(log_path, name, address):
+        slots = np.fromfile(path, dtype, offset=HEADER.size)
+        parts.append(slots[slots['count'] > 0])
+    if not parts:
+        return np.zeros(0, dtype)
+
+    slots = np.concatenate(parts)
+    slots = slots[np.argsort(slots['start'], kind='stable')]
+    if len(parts) == 1:
+        return slots
+
+    starts, first = np.unique(slots['start'], return_index=True)
+    merged = np.zeros(len(starts), dtype)
+    merged['start'] = starts
+    for field in ('count', 'lost', 'sum', 'squares'):
+        merged[field] = np.add.reduceat(slots[field], first)
+    merged['min'] = np.minimum.reduceat(slots['min'], first)
+    merged['max'] = np.maximum.reduceat(slots['max'], first)
+    return merged
+
+
+def points(slots):
+    """ Returns `(timestamps, lows, means, highs)` float64 arrays for
+    plotting `slots`. Lows are `core.TIMEOUT_RTT` where pings were lost. """
+    import numpy as np
+
+    received = slots['count'] - slots['lost']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(received > 0, slots['sum'] / received,
+                         core.TIMEOUT_RTT)
+    lows = np.where(slots['lost'] > 0, core.TIMEOUT_RTT,
+                    slots['min']).astype(np.float64)
+    highs = np.where(received > 0, slots['max'],
+                     core.TIMEOUT_RTT).astype(np.float64)
+    return slots['start'], lows, means, highs
+
+
+def choose_tier(log_path, start, end, budget, tiers=TIERS, address=None,
+                first=None):
+    """ Returns the name of the finest tier of the log at `log_path` that
+    covers `start` to `end` in at most `budget` slots, or None if raw rows
+    should be read instead, because the span is at most `RAW_SPAN` or there
+    are no rollups. `start` and `end` may be None for the whole log. Only
+    the tiers of `address` are considered, unless it is None.
+
+    `first` is the timestamp of the log's first raw row, if known. Raw rows
+    are read when the span begins before the earliest rollup, as older rows,
+    such as those logged before rollups were written, are only in the log.
+    """
+    import time
+
+    available = [tier for tier in tiers
+                 if tier_paths(log_path, tier[0], address)]
+    if not available:
+        return None
+
+    coarsest = read_tier(log_path, available[-1][0], address)
+    if not len(coarsest):
+        return None
+    earliest = coarsest['start'][0]
+    if first is not None and first < earliest and \
+            (start is None or start < earliest):
+        logger.info('Plotting raw rows, as the log is older than its '
+                    'rollups')
+        return None
+
+    if start is None or end is None:
+        start = earliest if start is None else start
+        end = coarsest['start'][-1] + available[-1][1] if end is None else end
+
+    if end - start <= RAW_SPAN:
+        return None
+
+    for name, step, retention in available:
+        if (end - start) / step <= budget and \
+                time.time() - retention <= start:
+            logger.info('Plotting %s rollups' % name)
+            return name
+
+    return available[-1][0]
@@ -0,0 +1,220 @@
+""" Rotation of PingStats CSV logs into compressed segments.
+
+`SegmentWriter` keeps writing the log at its usual path, and once the log
+grows past a size or a row crosses a wall clock period, it renames the log
+to a segment and starts a new one. A segment is named after the log and the
+timestamp of its first row, in milliseconds:
+
+    PingStatsLog.csv                        the log being written
+    PingStatsLog.csv.1760781234000.gz       an older, compressed segment
+    PingStatsLog.csv.1760784834000          a segment not yet compressed
+
+Closed segments are compressed with gzip on a background thread. Together
+the log and its segments make up a segment set, which `csvlog.read` reads
+as one time ordered log. """
+import os
+import re
+import csv
+import glob
+import gzip
+import queue
+import shutil
+import threading
+
+import core
+import timeindex
+from log import core_logger as logger
+
+SEGMENT = re.compile(r'\.(\d{13,})(\.gz)?$')
+
+
+def segment_path(path, start):
+    """ Returns the path of the segment of the log at `path` whose first row
+    is stamped `start`. """
+    return '%s.%013d' % (path, round(start * 1000))
+
+
+def list_segments(path):
+    """ Returns `(start, segment path)` for every segment of the log at
+    `path`, oldest first. Where a segment exists both compressed and not,
+    because it is being compressed, only the uncompressed one is listed; open
+    it with `open_segment`, as it may be removed before it is read. """
+    found = {}
+    for segment in glob.glob(glob.escape(path) + '.*'):
+        match = SEGMENT.match(segment[len(path):])
+        if match is None:
+            continue
+        start = int(match.group(1)) / 1000.0
+        if match.group(2) is None or start not in found:
+            found[start] = segment
+    return sorted(found.items())
+
+
+def log_paths(path, start=None, end=None):
+    """ Returns the paths of every segment of the log at `path` that may hold
+    rows stamped from `start` to `end`, oldest first, followed by the log
+    itself. Segments are chosen `timeindex.SLACK` wider than the range, as
+    rows may be written out of order. """
+    segments = list_segments(path)
+    paths = []
+    for i, (first, segment) in enumerate(segments):
+        following = segments[i + 1][0] if i + 1 < len(segments) else None
+        if end is not None and first > end + timeindex.SLACK:
+            break
+        if start is not None and following is not None and \
+                following <= start - timeindex.SLACK:
+            continue
+        paths.append(segment)
+    return paths + [path]
+
+
+def open_segment(path):
+    """ Opens the log or segment at `path` to read bytes, decompressing
+    it if it is compressed. An uncompressed segment that is compressed and
+    removed once listed is opened from its compressed copy instead. """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        if SEGMENT.search(path) is None:
+            raise
+        return gzip.open(path + '.gz', 'rb')
+
+
+def compress(path):
+    """ Replaces the file at `path` with a gzip compressed copy at `path` +
+    '.gz', removing its time index, which does not apply to the copy. """
+    temporary = path + '.gz.tmp'
+    with open(path, 'rb') as source, gzip.open(temporary, 'wb') as target:
+        shutil.copyfileobj(source, target)
+    os.replace(temporary, path + '.gz')
+
+    os.remove(path)
+    try:
+        os.remove(timeindex.index_path(path))
+    except FileNotFoundError:
+        pass
+
+
+class Compressor(threading.Thread):
+    """ Compresses the segments passed to `add` one at a time, on a
+    background thread. """
+
+    def __init__(self):
+        super(Compressor, self).__init__(name='Compressor', daemon=True)
+        self.queue = queue.Queue()
+        self.start()
+
+    def add(self, path):
+        self.queue.put(path)
+
+    def run(self):
+        while 1:
+            path = self.queue.get()
+            if path is None:
+                return
+            try:
+                compress(path)
+                logger.info('Compressed %s' % path)
+            except OSError as e:
+                logger.warning('Could not compress %s: %s' % (path, e))
+
+    def close(self):
+        """ Waits for every queued segment to be compressed. """
+        self.queue.put(None)
+        self.join()
+
+
+def first_timestamp(path):
+    """ Returns the timestamp of the first row of the log at `path`, or None
+    if it is empty or unreadable. """
+    try:
+        with open(path, 'rb') as f:
+            return timeindex.row_timestamp(f.readline())
+    except (OSError, ValueError):
+        return None
+
+
+class SegmentWriter(core.BatchWriter):
+    """ A `core.BatchWriter` that rotates its log into segments.
+
+    The log is rotated before a batch once it holds `max_bytes` or more, and
+    before any row stamped in a later `period` of seconds since the epoch
+    than the first row of the log, so daily segments start at midnight UTC.
+    Either is disabled by 0. Rows stamped in an earlier period, such as
+    lost probes written a timeout late, are kept in the current log. Closed
+    segments, and any left uncompressed by an earlier run, are compressed in
+    the background if `compress` is True.
+    """
+
+    def __init__(self, fileobj, batch_rows=64, batch_ms=1000, fsync=False,
+                 index=None, max_bytes=0, period=0, compress=True):
+        if max_bytes < 0 or period < 0:
+            raise ValueError('max_bytes and period must not be negative')
+
+        super(SegmentWriter, self).__init__(fileobj, batch_rows, batch_ms,
+                                            fsync, index)
+        self.path = fileobj.name
+        self.max_bytes = max_bytes
+        self.period = period
+        self.start = first_timestamp(self.path)
+
+        self.compressor = None
+        if compress:
+            self.compressor = Compressor()
+            for start, segment in list_segments(self.path):
+                if not segment.endswith('.gz'):
+                    self.compressor.add(segment)
+
+    def commit(self, rows):
+        if self.max_bytes and self.start is not None and \
+                self.fileobj.tell() >= self.max_bytes:
+            self.rotate(float(rows[0][0]))
+
+        first = 0
+        for i, row in enumerate(rows):
+            timestamp = float(row[0])
+            if self.start is None:
+                self.start = timestamp
+            elif self.period and timestamp // self.period > \
+                    self.start // self.period:
+                super(SegmentWriter, self).commit(rows[first:i])
+                self.rotate(timestamp)
+                first = i
+
+        super(SegmentWriter, self).commit(rows[first:])
+
+    def rotate(self, start):
+        """ Renames the log to a segment and starts a new log, whose first row
+        will be stamped `start`. """
+        self.fileobj.flush()
+        if self.fsync:
+            os.fsync(self.fileobj.fileno())
+        self.fileobj.close()
+
+        segment = segment_path(self.path, self.start)
+        while os.path.exists(segment) or os.path.exists(segment + '.gz'):
+            self.start += 0.001  # rotated twice within a millisecond
+            segment = segment_path(self.path, self.start)
+        os.replace(self.path, segment)
+
+        self.fileobj = open(self.path, self.fileobj.mode)
+        self.writer = csv.writer(self.fileobj)
+        self.start = start
+
+        if self.index is not None:
+            self.index.flush()
+            if os.path.exists(self.index.path):
+                os.replace(self.index.path, timeindex.index_path(segment))
+            self.index = timeindex.TimeIndex(self.path, self.index.every)
+            self.offset = 0
+        logger.info('Rotated %s to %s' % (self.path, segment))
+
+        if self.compressor is not None:
+            self.compressor.add(segment)
+
+    def close(self):
+        super(SegmentWriter, self).close()
+        if self.compressor is not None:
+            self.compressor.close()
@@ -0,0 +1,243 @@
+""" Bounded memory, mergeable return time quantile sketches.
+
+`DDSketch` is a logarithmic histogram in the style of DDSketch: every bucket
+covers values within `relative_accuracy` of each other, so any quantile is
+answered within that relative error from a few hundred buckets, however many
+pings were added. Sketches with the same accuracy merge by adding buckets,
+so sketches from several logs or hosts can be combined.
+
+`SketchWriter` keeps one sketch per target from the ping stream and rewrites
+them to a '.sketch' JSON sidecar next to the log every `interval` seconds.
+"""
+import os
+import json
+import math
+
+import core
+
+EXTENSION = '.sketch'
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class DDSketch:
+    """ A quantile sketch of positive values with `relative_accuracy`.
+
+    At most `max_bins` buckets are kept; past that the lowest buckets are
+    collapsed together, which only costs accuracy in the lowest quantiles.
+    Lost pings are counted in `self.lost` rather than sketched. """
+
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        if max_bins < 1:
+            raise ValueError('max_bins must be at least 1')
+
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+        self.bins = {}  # key: count
+        self.zeros = 0
+        self.count = 0
+        self.lost = 0
+        self.minimum = None
+        self.maximum = None
+
+    def key(self, value):
+        return int(math.ceil(math.log(value) / self.log_gamma))
+
+    def value(self, key):
+        """ Returns the representative value of the bucket `key`. """
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        """ Adds `value`, or a lost ping if it is None. """
+        if value is None:
+            self.lost += count
+            return
+
+        if value <= self.MIN_VALUE:
+            self.zeros += count
+        else:
+            key = self.key(value)
+            self.bins[key] = self.bins.get(key, 0) + count
+            if len(self.bins) > self.max_bins:
+                self.collapse()
+
+        self.count += count
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def collapse(self):
+        """ Merges the lowest buckets until at most `max_bins` remain. """
+        keys = sorted(self.bins)
+        excess = keys[:len(keys) - self.max_bins + 1]
+        self.bins[excess[-1]] += sum(self.bins.pop(key) for key in
+                                     excess[:-1])
+
+    def merge(self, other):
+        """ Adds every value in the sketch `other` to this sketch. """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches of different accuracy')
+
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        if len(self.bins) > self.max_bins:
+            self.collapse()
+
+        self.zeros += other.zeros
+        self.count += other.count
+        self.lost += other.lost
+        for value in (other.minimum, other.maximum):
+            if value is not None:
+                if self.minimum is None or value < self.minimum:
+                    self.minimum = value
+                if self.maximum is None or value > self.maximum:
+                    self.maximum = value
+        return self
+
+    def quantile(self, q):
+        """ Returns the `q` quantile of the added values, or None if the
+        sketch is empty. """
+        if not 0 <= q <= 1:
+            raise ValueError('q must be between 0 and 1')
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                return min(max(self.value(key), self.minimum), self.maximum)
+
+        return self.maximum
+
+    def to_dict(self):
+        return {'relative_accuracy': self.relative_accuracy,
+                'max_bins': self.max_bins,
+                'bins': {str(key): count for key, count in self.bins.items()},
+                'zeros': self.zeros, 'count': self.count, 'lost': self.lost,
+                'min': self.minimum, 'max': self.maximum}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls(data['relative_accuracy'], data['max_bins'])
+        obj.bins = {int(key): count for key, count in data['bins'].items()}
+        obj.zeros = data['zeros']
+        obj.count = data['count']
+        obj.lost = data['lost']
+        obj.minimum = data['min']
+        obj.maximum = data['max']
+        return obj
+
+
+def sketch_path(path):
+    """ Returns the path of the sketch sidecar for the log at `path`. """
+    return path + EXTENSION
+
+
+def load(path):
+    """ Returns the `{address: DDSketch}` saved in the sidecar at `path`. """
+    with open(path) as f:
+        return {address: DDSketch.from_dict(data) for address, data in
+                json.load(f).items()}
+
+
+def save(sketches, path):
+    """ Atomically replaces the sidecar at `path` with `sketches`. """
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({address: s.to_dict() for address, s in sketches.items()},
+                  f)
+    os.replace(temporary, path)
+
+
+def merge_files(paths):
+    """ Returns the `{address: DDSketch}` merged from every sidecar in
+    `paths`. """
+    merged = {}
+    for path in paths:
+        for address, s in load(path).items():
+            if address in merged:
+                merged[address].merge(s)
+            else:
+                merged[address] = s
+    return merged
+
+
+def format_quantiles(sketches, quantiles=QUANTILES):
+    """ Returns one line of `quantiles` for every target in `sketches`. """
+    lines = []
+    for address in sorted(sketches):
+        s = sketches[address]
+        values = ' '.join(
+            'p%g=%s' % (q * 100, '-' if s.quantile(q) is None
+                        else '%.1f' % s.quantile(q)) for q in quantiles)
+        lines.append('%s: n=%d lost=%d %s' % (address, s.count + s.lost,
+                                              s.lost, values))
+    return '\n'.join(lines)
+
+
+class SketchWriter(core.Batcher):
+    """ Sketches the return times of every target in a stream of ping rows,
+    and saves them next to the log at `log_path` every `interval` seconds.
+
+    Rows are queued as a `core.Batcher` batch and added to the sketches as
+    it is committed, every `interval` seconds, at most `batch_rows` rows, or
+    whenever the writer is flushed, and the sketches are then saved. So
+    `format` and saving never run while a row is being added. Sketches
+    already saved next to the log are loaded and added to. """
+
+    def __init__(self, log_path, interval=60, relative_accuracy=0.01,
+                 batch_rows=65536):
+        self.path = sketch_path(log_path)
+        self.interval = interval
+        self.relative_accuracy = relative_accuracy
+        self.sketches = load(self.path) if os.path.exists(self.path) else {}
+        self.dirty = False
+        self.stopped = False
+        super(SketchWriter, self).__init__(batch_rows, interval * 1000)
+
+    @property
+    def closed(self):
+        return self.stopped
+
+    def commit(self, rows):
+        """ Adds a batch of `rows` to the sketches. """
+        for row in rows:
+            address = row[4]
+            try:
+                s = self.sketches[address]
+            except KeyError:
+                s = self.sketches[address] = DDSketch(self.relative_accuracy)
+            s.add(None if core.is_timeout(row[1]) else float(row[1]))
+        self.dirty = True
+
+    def sync(self):
+        """ Saves the sketches if rows were added since they were saved. """
+        if self.dirty:
+            save(self.sketches, self.path)
+            self.dirty = False
+
+    def close(self):
+        with self.lock:
+            super(SketchWriter, self).close()
+            self.stopped = True
+
+    def format(self):
+        """ Returns the quantiles of every target, including the rows not
+        committed yet, which are saved with the next batch. """
+        with self.lock:
+            if self.rows:
+                rows, self.rows = self.rows, []
+                self.commit(rows)
+            return format_quantiles(self.sketches)
@@ -0,0 +1,181 @@
+""" A SQLite database of pings, written next to the CSV or binary log.
+
+Every row is stored in the `pings` table, indexed on its target and
+timestamp, so one target's rows over a span of time are found without
+scanning the rest:
+
+    CREATE TABLE targets (id INTEGER PRIMARY KEY, address TEXT UNIQUE);
+    CREATE TABLE pings (target INTEGER, timestamp REAL, rtt REAL,
+                        timeout INTEGER, size INTEGER);
+    CREATE INDEX pings_target_timestamp ON pings (target, timestamp);
+
+Timed out pings have a NULL `rtt`. The database is kept in WAL mode, so it
+can be queried, with `read`, `loss` or the sqlite3 shell, while a
+collector writes to it:
+
+    SELECT address, CAST(timestamp / 3600 AS INTEGER) * 3600 AS hour,
+           AVG(rtt IS NULL) AS loss
+    FROM pings JOIN targets ON target = id
+    WHERE timestamp >= strftime('%s', 'now', '-7 days')
+    GROUP BY address, hour; """
+import sqlite3
+from urllib.parse import quote
+
+import core
+
+EXTENSION = '.sqlite'
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS targets (id INTEGER PRIMARY KEY,
+                                    address TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS pings (target INTEGER NOT NULL
+                                      REFERENCES targets (id),
+                                  timestamp REAL NOT NULL, rtt REAL,
+                                  timeout INTEGER, size INTEGER);
+CREATE INDEX IF NOT EXISTS pings_target_timestamp ON pings (target,
+                                                            timestamp);
+'''
+
+
+def connect(path, fsync=False):
+    """ Opens the database at `path` for writing, creating its tables if
+    needed. Commits are only synced to disk at WAL checkpoints unless
+    `fsync` is True. """
+    connection = sqlite3.connect(path, isolation_level=None,
+                                 check_same_thread=False)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=%s' % ('FULL' if fsync
+                                                  else 'NORMAL'))
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def connect_read_only(path):
+    """ Opens the existing database at `path` for queries. """
+    return sqlite3.connect('file:%s?mode=ro' % quote(path), uri=True)
+
+
+def optional_int(value):
+    return None if value is None or value == '' else int(value)
+
+
+class SqliteWriter(core.Batcher):
+    """ A `core.Batcher` that commits rows to the database at `path`, each
+    batch in one transaction. """
+
+    def __init__(self, path, batch_rows=64, batch_ms=1000, fsync=False):
+        self.path = path
+        self.connection = connect(path, fsync)
+        self.targets = dict((address, i) for i, address in
+                            self.connection.execute(
+                                'SELECT id, address FROM targets'))
+        super(SqliteWriter, self).__init__(batch_rows, batch_ms)
+
+    @property
+    def closed(self):
+        return self.connection is None
+
+    def target_id(self, address):
+        """ Returns the id of `address`, registering it if needed. Called
+        within the transaction committing its row. """
+        address = str(address)
+        try:
+            return self.targets[address]
+        except KeyError:
+            cursor = self.connection.execute(
+                'INSERT INTO targets (address) VALUES (?)', (address,))
+            self.targets[address] = cursor.lastrowid
+            return cursor.lastrowid
+
+    def commit(self, rows):
+        connection = self.connection
+        connection.execute('BEGIN')
+        try:
+            connection.executemany(
+                'INSERT INTO pings VALUES (?, ?, ?, ?, ?)',
+                [(self.target_id(row[4]), float(row[0]),
+                  None if core.is_timeout(row[1]) else float(row[1]),
+                  optional_int(row[2]), optional_int(row[3]))
+                 for row in rows])
+        except BaseException:
+            connection.execute('ROLLBACK')
+            self.targets = dict((address, i) for i, address in
+                                connection.execute(
+                                    'SELECT id, address FROM targets'))
+            raise
+        connection.execute('COMMIT')
+
+    def close(self):
+        """ Commits every queued row and closes the database. """
+        with self.lock:
+            super(SqliteWriter, self).close()
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+
+def where(target, start, end):
+    """ Returns the WHERE clause selecting rows of `target` stamped from
+    `start` to `end`, any of which may be None, and its parameters. """
+    clauses, parameters = [], []
+    if target is not None:
+        clauses.append('target = (SELECT id FROM targets WHERE address = ?)')
+        parameters.append(target)
+    if start is not None:
+        clauses.append('timestamp >= ?')
+        parameters.append(start)
+    if end is not None:
+        clauses.append('timestamp <= ?')
+        parameters.append(end)
+    if not clauses:
+        return '', parameters
+    return ' WHERE ' + ' AND '.join(clauses), parameters
+
+
+def targets(path):
+    """ Returns the addresses in the database at `path`, in the order they
+    were first seen. """
+    connection = connect_read_only(path)
+    try:
+        return [address for address, in connection.execute(
+            'SELECT address FROM targets ORDER BY id')]
+    finally:
+        connection.close()
+
+
+def read(path, target=None, start=None, end=None):
+    """ Reads the rows of `target`, or of every target, stamped from `start`
+    to `end` from the database at `path`.
+
+    Returns `(timestamps, rtts)` as float64 arrays in time order, with
+    timeouts as `core.TIMEOUT_RTT`. """
+    import numpy as np
+
+    clause, parameters = where(target, start, end)
+    connection = connect_read_only(path)
+    try:
+        rows = connection.execute(
+            'SELECT timestamp, IFNULL(rtt, ?) FROM pings%s ORDER BY timestamp'
+            % clause, [core.TIMEOUT_RTT] + parameters).fetchall()
+    finally:
+        connection.close()
+
+    if not rows:
+        return np.zeros(0), np.zeros(0)
+    data = np.array(rows, dtype=np.float64)
+    return data[:, 0], data[:, 1]
+
+
+def loss(path, step=3600, target=None, start=None, end=None):
+    """ Returns `(address, slot start, pings, lost)` for every `step` second
+    slot of every target, or of `target`, from `start` to `end`, ordered by
+    address and time. """
+    clause, parameters = where(target, start, end)
+    connection = connect_read_only(path)
+    try:
+        return connection.execute(
+            'SELECT address, CAST(timestamp / ? AS INTEGER) * ? AS slot, '
+            'COUNT(*), SUM(rtt IS NULL) FROM pings JOIN targets '
+            'ON target = id%s GROUP BY address, slot ORDER BY address, slot'
+            % clause, [step, step] + parameters).fetchall()
+    finally:
+        connection.close()
@@ -0,0 +1,215 @@
+""" Follows a PingStats CSV log, like `tail -F`, as a collector in another
+process writes it.
+
+A `Follower` remembers how far into the log it has read and only ever
+reads the bytes appended since, however large the log has grown. When the
+log is rotated into a segment (see `segments`) it finishes the rows left in
+the old file before moving on to the new one, and when it is truncated it
+starts again from the top.
+
+A `Watcher` tells whether the log may have changed without reading it,
+through inotify where Linux provides it and by comparing `os.stat` results
+everywhere else. """
+import os
+import errno
+import struct
+import select
+
+import numpy as np
+
+import csvlog
+
+CHUNK_BYTES = csvlog.CHUNK_BYTES
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+WATCHED = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+           IN_CREATE | IN_DELETE)
+EVENT = struct.Struct('iIII')  # wd, mask, cookie, length of the name
+
+
+def identity(stat):
+    return stat.st_dev, stat.st_ino
+
+
+class Follower:
+    """ Reads the rows appended to the CSV log at `path`, starting `offset`
+    bytes in. An `offset` inside a row skips to the start of the next.
+
+    Rows are only returned once their line is complete, so a row the
+    collector is half way through writing is read on a later call. Only the
+    rows for `address` are returned, unless it is None. """
+
+    def __init__(self, path, offset=0, chunk_bytes=CHUNK_BYTES, address=None):
+        self.path = path
+        self.offset = offset
+        self.chunk_bytes = chunk_bytes
+        self.address = address
+        self.file = None
+        self.identity = None
+        self.carry = b''  # the start of an incomplete row
+        self.skip = False  # True until the row `offset` fell in is skipped
+
+    def open(self, offset):
+        """ Opens the log at `self.path` at `offset`. Returns False if there
+        is no log there yet. """
+        try:
+            self.file = open(self.path, 'rb')
+        except FileNotFoundError:
+            return False
+
+        self.identity = identity(os.fstat(self.file.fileno()))
+        self.carry = b''
+        self.skip = False
+        if offset:
+            self.file.seek(offset - 1)
+            self.skip = self.file.read(1) != b'\n'
+        self.offset = offset
+        return True
+
+    def read_available(self):
+        """ Returns `(timestamps, rtts)` chunks for the complete rows from
+        `self.offset` to the end of the open file. """
+        chunks = []
+        while 1:
+            block = self.file.read(self.chunk_bytes)
+            if not block:
+                return chunks
+            self.offset += len(block)
+
+            block = self.carry + block
+            if self.skip:
+                cut = block.find(b'\n') + 1
+                if not cut:
+                    self.carry = b''
+                    continue
+                block = block[cut:]
+                self.skip = False
+
+            cut = block.rfind(b'\n') + 1
+            self.carry = block[cut:]
+            if cut:
+                chunks.append(csvlog.parse_block(block[:cut],
+                                                 self.address))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def read(self):
+        """ Returns `(timestamps, rtts, truncated)` for the rows appended
+        since the last call, as float64 arrays. If `truncated` is True the
+        log was cut short or replaced by a shorter one, and the rows were
+        read from its start. """
+        truncated = False
+        chunks = []
+        if self.file is None and not self.open(self.offset):
+            return np.zeros(0), np.zeros(0), truncated
+
+        chunks.extend(self.read_available())
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None  # rotated away, the new log is yet to be created
+
+        if stat is not None and identity(stat) != self.identity:
+            # Rotated: the rows left in the old file were read above.
+            if self.carry.strip():
+                chunks.append(csvlog.parse_block(self.carry, self.address))
+            self.close()
+            self.open(0)
+            chunks.extend(self.read_available())
+        elif stat is not None and stat.st_size < self.offset:
+            truncated = True
+            chunks = []
+            self.close()
+            self.open(0)
+            chunks.extend(self.read_available())
+
+        if not chunks:
+            return np.zeros(0), np.zeros(0), truncated
+        return (np.concatenate([x for x, y in chunks]),
+                np.concatenate([y for x, y in chunks]), truncated)
+
+
+class Watcher:
+    """ Tells whether the file at `path` may have changed since the last
+    call to `changed`.
+
+    inotify watches the directory holding the file, so its replacement by
+    a rotation is seen as well as its growth. If `inotify` is False or it
+    is unavailable, `changed` compares the file's size, modification time
+    and inode with those it last saw instead. """
+
+    def __init__(self, path, inotify=True):
+        self.path = path
+        self.name = os.fsencode(os.path.basename(path))
+        self.fd = None
+        self.last = self.stat()
+        if inotify:
+            self.fd = self.watch(os.path.dirname(os.path.abspath(path)))
+
+    @staticmethod
+    def watch(directory):
+        """ Returns an inotify descriptor watching `directory`, or None. """
+        import ctypes
+        import ctypes.util
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError, TypeError):
+            return None
+
+        fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if add_watch(fd, os.fsencode(directory), WATCHED) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns, identity(stat)
+
+    def changed(self):
+        if self.fd is None:
+            stat = self.stat()
+            changed, self.last = stat != self.last, stat
+            return changed
+
+        changed = False
+        while select.select([self.fd], [], [], 0)[0]:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+
+            i = 0
+            while i < len(data):
+                wd, mask, cookie, length = EVENT.unpack_from(data, i)
+                name = data[i + EVENT.size:i + EVENT.size + length]
+                i += EVENT.size + length
+                if mask & IN_Q_OVERFLOW or name.rstrip(b'\0') == self.name:
+                    changed = True
+        return changed
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
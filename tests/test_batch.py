@@ -0,0 +1,63 @@
+import unittest
+
+# Test resources
+import os
+import tempfile
+
+# PingStats modules
+import batch
+
+
+class Batch_test(unittest.TestCase):
+    """ Tests `batch` log discovery, rendering and reporting. """
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        for name in ('a.csv', 'a.sqlite', 'b.psb', 'c.txt', 'd.sqlite'):
+            with open(os.path.join(self.dir.name, name), 'w') as f:
+                f.write('1500000000.0,12.5,3000,64,127.0.0.1\n')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_expand(self):
+        a = os.path.join(self.dir.name, 'a.csv')
+        b = os.path.join(self.dir.name, 'b.psb')
+        d = os.path.join(self.dir.name, 'd.sqlite')
+
+        self.assertEqual(batch.expand([self.dir.name]), [a, b, d])
+        self.assertEqual(batch.expand([os.path.join(self.dir.name,
+                                                    'a.sqlite')]),
+                         [os.path.join(self.dir.name, 'a.sqlite')])
+        self.assertEqual(batch.expand([os.path.join(self.dir.name, '*.csv'),
+                                       a]), [a])
+        self.assertEqual(batch.expand([os.path.join(self.dir.name, 'x*')]),
+                         [])
+
+    def test_image_path(self):
+        self.assertEqual(batch.image_path('logs/a.csv'), 'logs/a.png')
+        self.assertEqual(batch.image_path('logs/a.csv', 'out'), 'out/a.png')
+
+    def test_image_paths(self):
+        paths = ['logs/a.csv', 'logs/a.psb', 'logs/b.csv', 'old/b.csv']
+        self.assertEqual(batch.image_paths(paths),
+                         ['logs/a.csv.png', 'logs/a.psb.png', 'logs/b.png',
+                          'old/b.png'])
+        self.assertEqual(batch.image_paths(paths, 'out'),
+                         ['out/a.csv.png', 'out/a.psb.png',
+                          'out/logs_b.csv.png', 'out/old_b.csv.png'])
+        self.assertEqual(batch.image_paths([]), [])
+
+    def test_render_all(self):
+        out = os.path.join(self.dir.name, 'out')
+        results = batch.render_all(
+            [os.path.join(self.dir.name, 'a.csv'), 'missing.csv'], out, 2,
+            rollups=False)
+
+        errors = {os.path.basename(r[0]): r[3] for r in results}
+        self.assertIsNone(errors['a.csv'])
+        self.assertIsNotNone(errors['missing.csv'])
+        self.assertTrue(os.path.exists(os.path.join(out, 'a.png')))
+
+        report = batch.summary(results, 1.0)
+        self.assertIn('Rendered 1 of 2 logs', report)
+        self.assertIn('failed: missing.csv', report)
@@ -0,0 +1,33 @@
+import unittest
+
+# PingStats modules
+import benchmark
+
+
+class Benchmark_test(unittest.TestCase):
+    """ Tests the `benchmark` harness, not the speed of PingStats. """
+    def test_probes(self):
+        result = benchmark.bench_probes(count=200)
+        self.assertGreater(result['probes_per_s'], 0)
+
+    def test_run_records_errors(self):
+        benchmark.BENCHMARKS['broken'] = lambda: 1 / 0
+        try:
+            report = benchmark.run(['broken', 'probes'])
+        finally:
+            del benchmark.BENCHMARKS['broken']
+
+        self.assertIn('ZeroDivisionError',
+                      report['results']['broken']['error'])
+        self.assertIn('probes_per_s', report['results']['probes'])
+
+    def test_compare(self):
+        old = {'results': {'a': {'rows_per_s': 100.0, 'frame_s@1': 0.1}}}
+        new = {'results': {'a': {'rows_per_s': 150.0, 'frame_s@1': 0.2,
+                                 'error': 'x'}}}
+        lines = benchmark.compare(old, new).split('\n')
+
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('a.rows_per_s'))
+        self.assertTrue(lines[0].endswith('+50.0%'))
+        self.assertTrue(lines[1].endswith('-100.0%'))
@@ -0,0 +1,83 @@
+import unittest
+from hypothesis import given, strategies as st
+
+# Test resources
+import os
+import math
+import tempfile
+
+# PingStats modules
+import binlog
+
+
+class BinLog_test(unittest.TestCase):
+    """ Tests `binlog` writing, reading and conversion. """
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'test' + binlog.EXTENSION)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, rows):
+        with open(self.path, 'ab') as f:
+            writer = binlog.BinaryWriter(f)
+            writer.writerows(rows)
+            writer.close()
+
+    @given(st.lists(st.floats(min_value=0, max_value=5000), min_size=1))
+    def test_round_trip(self, rtts):
+        os.path.exists(self.path) and os.remove(self.path)
+        os.path.exists(binlog.targets_path(self.path)) and os.remove(
+            binlog.targets_path(self.path))
+        self.write([(float(i), rtt, 3000, 64, 'a') for i, rtt in
+                    enumerate(rtts)])
+
+        log = binlog.BinaryLog(self.path)
+        self.assertEqual(len(log), len(rtts))
+        self.assertEqual(list(log.timestamps), [float(i) for i in
+                                                range(len(rtts))])
+        for a, b in zip(log.rtts, rtts):
+            self.assertTrue(math.isclose(a, b, rel_tol=1e-6, abs_tol=1e-3))
+        log.close()
+
+    def test_timeouts_and_targets(self):
+        self.write([(1.0, None, 3000, 64, 'a'), (2.0, 5.0, 3000, 64, 'b'),
+                    (3.0, -100.0, 3000, 64, 'a')])
+        self.write([(4.0, 6.0, 3000, 64, 'b')])
+
+        log = binlog.BinaryLog(self.path)
+        self.assertEqual(log.targets, ['a', 'b'])
+        self.assertEqual(list(log.target_ids), [0, 1, 0, 1])
+        self.assertEqual(list(log.flags & binlog.FLAG_TIMEOUT), [1, 0, 1, 0])
+        self.assertEqual(list(log.points()[1]), [-100.0, 5.0, -100.0, 6.0])
+        self.assertEqual(int(log.target_mask('b').sum()), 2)
+        log.close()
+
+    def test_empty_log(self):
+        self.write([])
+        self.assertEqual(len(binlog.BinaryLog(self.path)), 0)
+
+    def test_convert_csv(self):
+        path = binlog.convert_csv('./tests/TestCSVLog.csv', self.path)
+
+        with open('./tests/TestCSVLog.csv') as f:
+            rows = len(f.readlines())
+        log = binlog.BinaryLog(path)
+        self.assertEqual(len(log), rows)
+        self.assertEqual(log.targets, ['google.ca'])
+        log.close()
+
+        with self.assertRaises(FileExistsError):
+            binlog.convert_csv('./tests/TestCSVLog.csv', self.path)
+        log = binlog.BinaryLog(path)
+        self.assertEqual(len(log), rows)
+        log.close()
+
+    def test_parse_timestamp(self):
+        self.assertEqual(binlog.parse_timestamp('1500000000.25'),
+                         1500000000.25)
+        self.assertEqual(binlog.parse_timestamp('2017-06-02 06:35:35.5') -
+                         binlog.parse_timestamp('2017-06-02 06:35:35'), 0.5)
+        with self.assertRaises(ValueError):
+            binlog.parse_timestamp('yesterday')
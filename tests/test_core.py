@@ -5,10 +5,12 @@ import os
 import time
 import sys
 import csv
+import asyncio
 from tempfile import NamedTemporaryFile
 from io import TextIOWrapper
 
 import core as c
+import probers
 
 
 class TestCore(unittest.TestCase):
@@ -107,3 +109,239 @@ class TestCore(unittest.TestCase):
                nofile=True)
 
         self.assertFalse(os.access('tests/TestCSV.csv', os.F_OK))
+
+    def test_files_follow_rotation(self):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            core = c.Core('a', directory, 'log', batch_rows=1,
+                          sketch_interval=0, rollups=False,
+                          rotate_seconds=100, compress=False,
+                          prober=probers.SyntheticProber())
+            first = core.built_file
+            core.record((50.0, 1.0, 3000, 64, 'a'))
+            core.record((150.0, 1.0, 3000, 64, 'a'))
+
+            self.assertTrue(first.closed)
+            self.assertFalse(core.built_file.closed)
+            self.assertIs(core.csv_file, core.built_file)
+            self.assertIs(core.cwriter.fileobj, core.built_file)
+            core.close()
+
+        core = c.Core('a', nofile=True, prober=probers.SyntheticProber())
+        self.assertFalse(hasattr(core, 'built_file'))
+
+    def test_multiping_rows(self):
+        engine = c.MultiPing(['127.0.0.1', '0.0.0.0'], delay=0.1,
+                             prober=probers.SyntheticProber(seed=0))
+        rows = []
+        asyncio.run(engine.run(rows.append, duration=0.5))
+
+        self.assertGreaterEqual(len(rows), 2)
+        self.assertEqual({row[4] for row in rows}, {'127.0.0.1', '0.0.0.0'})
+        for row in rows:
+            self.assertEqual(len(row), 5)
+            self.assertIsInstance(row[0], float)
+
+    def test_multiping_records_failed_probes(self):
+        class Failing(c.Prober):
+            def send(self, address, timeout, seq, size):
+                raise OSError('network is unreachable')
+
+        engine = c.MultiPing(['10.0.0.1', '10.0.0.2'], delay=0.05,
+                             prober=Failing())
+        rows = []
+        asyncio.run(engine.run(rows.append, duration=0.3))
+
+        self.assertGreaterEqual(len(rows), 4)
+        self.assertEqual({row[1] for row in rows}, {c.TIMEOUT_RTT})
+        self.assertEqual({row[4] for row in rows}, {'10.0.0.1', '10.0.0.2'})
+
+    def test_probe_worker_buffers_rows(self):
+        core = c.Core('127.0.0.1', nofile=True, delay=0.02,
+                      prober=probers.SyntheticProber(seed=0))
+        worker = c.ProbeWorker(core)
+        worker.start()
+        time.sleep(0.3)
+        worker.stop(timeout=1)
+
+        rows = worker.drain()
+        self.assertFalse(worker.is_alive())
+        self.assertGreaterEqual(len(rows), 5)
+        self.assertEqual(worker.drain(), [])
+        self.assertEqual(core.stats.summary('127.0.0.1')[60]['count'],
+                         len(rows))
+
+    def test_probe_worker_probes_every_address(self):
+        addresses = ['10.0.0.%d' % i for i in range(10)]
+        core = c.Core(addresses, nofile=True, delay=0.02,
+                      prober=probers.SyntheticProber(seed=0))
+        worker = c.ProbeWorker(core)
+        worker.start()
+        time.sleep(0.3)
+        worker.stop(timeout=1)
+
+        self.assertFalse(worker.is_alive())
+        self.assertEqual({row[4] for row in worker.drain()}, set(addresses))
+
+    def test_probe_worker_survives_failed_probes(self):
+        class Failing(c.Prober):
+            def send(self, address, timeout, seq, size):
+                raise OSError('network is unreachable')
+
+        core = c.Core('10.0.0.1', nofile=True, delay=0.02, prober=Failing())
+        worker = c.ProbeWorker(core)
+        worker.start()
+        time.sleep(0.3)
+        self.assertTrue(worker.is_alive())
+        worker.stop(timeout=1)
+
+        rows = worker.drain()
+        self.assertGreaterEqual(len(rows), 5)
+        self.assertEqual({row[1] for row in rows}, {c.TIMEOUT_RTT})
+
+    def test_probe_worker_writes_outside_its_lock(self):
+        core = c.Core('a', nofile=True, prober=probers.SyntheticProber())
+        worker = c.ProbeWorker(core)
+        free = []
+
+        class Writer:
+            def writerow(self, row):
+                free.append(worker.lock.acquire(blocking=False))
+                if free[-1]:
+                    worker.lock.release()
+
+        core.nofile = False
+        core.writers = [Writer()]
+        worker.record((1.0, 2.0, 3000, 64, 'a'))
+
+        self.assertEqual(free, [True])
+        self.assertEqual(core.stats.summary('a')[60]['count'], 1)
+        self.assertEqual(worker.drain(), [(1.0, 2.0, 3000, 64, 'a')])
+
+    @given(st.integers(max_value=0))
+    def test_multiping_catch_bad_max_in_flight(self, max_in_flight):
+        with self.assertRaises(ValueError):
+            c.MultiPing('127.0.0.1', max_in_flight=max_in_flight)
+
+    def test_scheduler_holds_cadence(self):
+        now = [100.0]
+        scheduler = c.Scheduler(0.5, clock=lambda: now[0],
+                                sleep=lambda s: now.__setitem__(0, now[0] + s))
+        ticks = []
+        for i in range(4):
+            scheduler.wait()
+            ticks.append(now[0])
+            now[0] += 0.1  # time spent probing must not cause drift
+
+        self.assertEqual(ticks, [100.0, 100.5, 101.0, 101.5])
+        self.assertEqual(scheduler.missed, 0)
+
+    def test_scheduler_reports_missed_slots(self):
+        now = [0.0]
+        scheduler = c.Scheduler(1, clock=lambda: now[0],
+                                sleep=lambda s: now.__setitem__(0, now[0] + s))
+        scheduler.wait()
+        now[0] = 3.5
+
+        self.assertEqual(scheduler.wait(), 2)
+        self.assertEqual(scheduler.missed, 2)
+        self.assertEqual(scheduler.deadline, 4)
+
+    def test_batch_writer_commits_full_batches(self):
+        fileobj = NamedTemporaryFile('w+')
+        writer = c.BatchWriter(fileobj, batch_rows=3, batch_ms=60000)
+        for i in range(4):
+            writer.writerow([i, 1.0])
+
+        with open(fileobj.name) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        writer.flush()
+        with open(fileobj.name) as f:
+            self.assertEqual(len(f.readlines()), 4)
+
+        writer.close()
+
+    def test_batch_writer_commits_idle_batches(self):
+        fileobj = NamedTemporaryFile('w+')
+        writer = c.BatchWriter(fileobj, batch_rows=100, batch_ms=50)
+        writer.writerow([1, 2.0])
+        self.assertIsNotNone(writer.deadline)
+        time.sleep(0.3)
+
+        with open(fileobj.name) as f:
+            self.assertEqual(f.read().strip(), '1,2.0')
+        self.assertIsNone(writer.deadline)
+        writer.close()
+
+    def test_batch_writer_flushed_from_another_thread(self):
+        import threading
+
+        fileobj = NamedTemporaryFile('w+')
+        writer = c.BatchWriter(fileobj, batch_rows=7, batch_ms=60000)
+        done = threading.Event()
+
+        def flush():
+            while not done.is_set():
+                c.flush_all()
+        flusher = threading.Thread(target=flush)
+        flusher.start()
+        for i in range(5000):
+            writer.writerow([i, 1.0])
+        done.set()
+        flusher.join()
+        writer.flush()
+
+        with open(fileobj.name) as f:
+            self.assertEqual(f.read().splitlines(),
+                             ['%d,1.0' % i for i in range(5000)])
+        writer.close()
+
+    @given(st.integers(max_value=0))
+    def test_batch_writer_catch_bad_batch_rows(self, batch_rows):
+        with self.assertRaises(ValueError):
+            c.BatchWriter(NamedTemporaryFile('w+'), batch_rows=batch_rows)
+
+    def test_flush_all(self):
+        fileobj = NamedTemporaryFile('w+')
+        writer = c.BatchWriter(fileobj, batch_rows=100, batch_ms=60000)
+        writer.writerow([1, 2.0])
+        c.flush_all()
+
+        with open(fileobj.name) as f:
+            self.assertEqual(f.read().strip(), '1,2.0')
+
+    @given(st.lists(st.one_of(st.none(),
+                              st.floats(min_value=0, max_value=5000)),
+                    min_size=1, max_size=300))
+    def test_stats_window_matches_rescan(self, rtts):
+        window = c.StatsWindow(60)
+        for i, rtt in enumerate(rtts):
+            window.add(float(i), rtt)
+
+        kept = rtts[-61:]  # samples from the last 60 seconds inclusive
+        received = [rtt for rtt in kept if rtt is not None]
+        self.assertEqual(window.count, len(kept))
+        self.assertAlmostEqual(window.loss,
+                               (len(kept) - len(received)) / len(kept))
+        if received:
+            self.assertEqual(window.minimum, min(received))
+            self.assertEqual(window.maximum, max(received))
+            self.assertTrue(abs(window.mean - sum(received) / len(received))
+                            < 1e-6 * max(received) + 1e-6)
+        else:
+            self.assertIsNone(window.mean)
+
+    def test_rolling_stats_per_target(self):
+        stats = c.RollingStats(windows=(10,))
+        for i in range(20):
+            stats.add((float(i), 10.0 + i % 2, 3000, 64, 'a'))
+            stats.add((float(i), '' if i % 4 else 5.0, 3000, 64, 'b'))
+
+        a = stats.summary('a')[10]
+        self.assertEqual(a['count'], 11)
+        self.assertEqual(a['jitter'], 1.0)
+        self.assertEqual((a['min'], a['max']), (10.0, 11.0))
+        self.assertAlmostEqual(stats.summary('b')[10]['loss'], 9 / 11)
+        self.assertIn('a (jitter', stats.format())
@@ -0,0 +1,60 @@
+import unittest
+from hypothesis import given, strategies as st
+
+# Test resources
+import io
+import csv
+
+# PingStats modules
+import csvlog
+
+
+class CSVLog_test(unittest.TestCase):
+    """ Tests `csvlog` block parsing. """
+    def test_read(self):
+        x, y = csvlog.read('./tests/TestCSVLog.csv')
+
+        with open('./tests/TestCSVLog.csv') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(list(x), [float(row[0]) for row in rows])
+        self.assertEqual(list(y), [float(row[1]) if row[1] else -100.0
+                                   for row in rows])
+
+    @given(st.integers(min_value=1, max_value=200))
+    def test_chunk_boundaries(self, chunk_bytes):
+        with open('./tests/TestCSVLog.csv') as f:
+            text = f.read()
+        expected = csvlog.parse_block(text)
+
+        x, y = csvlog.read('./tests/TestCSVLog.csv',
+                           chunk_bytes=chunk_bytes)
+        # Every row is read, none dropped by a start filter.
+        self.assertEqual(len(x), len(text.strip().splitlines()))
+        self.assertEqual(list(x), list(expected[0]))
+        self.assertEqual(list(y), list(expected[1]))
+
+    def test_legacy_and_malformed_rows(self):
+        text = ('1481452874.5,,3000,64,a\r\n'
+                '2017-06-02 06:35:35.500000,-100.0,3000,64,a\r\n'
+                'garbage\r\n'
+                '1481452875.5,12.5,3000,64,a')
+        chunks = list(csvlog.read_chunks(io.StringIO(text)))
+        y = [v for chunk in chunks for v in chunk[1]]
+
+        self.assertEqual(y, [-100.0, -100.0, 12.5])
+
+    def test_address(self):
+        text = ('1.0,5.0,3000,64,a\r\n'
+                '2.0,,3000,64,ab\r\n'
+                '3.0,7.0,3000,64,a\r\n'
+                '2017-06-02 06:35:35,8.0,3000,64,a\n')
+        chunks = list(csvlog.read_chunks(io.StringIO(text), 16, address='a'))
+        y = [v for chunk in chunks for v in chunk[1]]
+        self.assertEqual(y, [5.0, 7.0, 8.0])
+
+        x, y = csvlog.parse_block(text, 'ab')
+        self.assertEqual((list(x), list(y)), ([2.0], [-100.0]))
+        self.assertEqual(len(csvlog.parse_block(text, 'b')[0]), 0)
+
+    def test_empty(self):
+        self.assertEqual(list(csvlog.read_chunks(io.StringIO(''))), [])
@@ -0,0 +1,82 @@
+import unittest
+
+# Test resources
+import tkinter
+
+# PingStats modules
+import core
+import probers
+
+
+def make_root():
+    try:
+        return tkinter.Tk()
+    except tkinter.TclError:
+        return None
+
+
+class Dashboard_test(unittest.TestCase):
+    """ Tests `plot.Dashboard` functionality. Needs a display. """
+    addresses = ['10.0.0.%d' % i for i in range(12)]
+
+    def setUp(self):
+        self.root = make_root()
+        if self.root is None:
+            self.skipTest('needs a display')
+
+        import plot
+        self.plot = plot
+        self.core = core.Core(self.addresses, nofile=True, delay=0.01,
+                              prober=probers.SyntheticProber(seed=0))
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def feed(self, dashboard, count):
+        for i in range(count):
+            for address in self.addresses:
+                row = (1.5e9 + i, 10.0 + i, 3000, 64, address)
+                self.core.stats.add(row)
+                dashboard.worker.rows.append(row)
+
+    def test_grid_budget(self):
+        dashboard = self.plot.Dashboard(self.root, self.core, budget=0)
+        self.feed(dashboard, 5)
+        dashboard.animate(0)  # the first frame draws every cell
+        self.assertEqual(len(dashboard.pending), 0)
+
+        self.feed(dashboard, 1)
+        drawn = dashboard.animate(1)
+        self.assertEqual(len(drawn), 1)
+        self.assertEqual(len(dashboard.pending), len(self.addresses) - 1)
+        self.assertEqual(list(dashboard.pending), self.addresses[1:])
+
+        for i in range(len(self.addresses) - 1):
+            dashboard.animate(i + 2)
+        self.assertEqual(len(dashboard.pending), 0)
+        for address in self.addresses:
+            self.assertEqual(len(dashboard.tables[address].x), 6)
+
+    def test_redraw_falls_due_during_a_frame(self):
+        dashboard = self.plot.Dashboard(self.root, self.core, budget=0)
+        self.feed(dashboard, 5)
+        dashboard.animate(0)
+
+        due = iter([False, True])
+        dashboard.redraw_due = lambda: next(due, True)
+        self.feed(dashboard, 1)
+        self.assertEqual(len(dashboard.animate(1)), 1)
+
+    def test_overlay(self):
+        dashboard = self.plot.Dashboard(self.root, self.core,
+                                        layout='overlay', points=120)
+        self.feed(dashboard, 100)
+        self.assertEqual(len(dashboard.animate(0)), len(self.addresses))
+        self.assertEqual(len(dashboard.pending), 0)
+        for line in dashboard.lines.values():
+            self.assertLessEqual(len(line.get_xdata()), 10 + 2)
+
+    def test_bad_layout(self):
+        with self.assertRaises(ValueError):
+            self.plot.Dashboard(self.root, self.core, layout='stacked')
+
@@ -0,0 +1,59 @@
+import unittest
+from hypothesis import given, strategies as st
+
+# Test resources
+import numpy as np
+
+# PingStats modules
+import downsample
+
+
+class Downsample_test(unittest.TestCase):
+    """ Tests `downsample` level of detail reduction. """
+    def points(self, count=100000):
+        x = np.arange(count, dtype=np.float64) * 0.22
+        y = np.random.RandomState(0).uniform(10, 50, count)
+        y[count // 8] = 4000.0  # spike
+        y[count // 2] = -100.0  # timeout
+        return x, y
+
+    @given(st.sampled_from(['minmax', 'lttb']),
+           st.integers(min_value=10, max_value=2000))
+    def test_output_bounded_by_width(self, method, width):
+        x, y = self.points()
+        dx, dy = downsample.downsample(x, y, width, method)
+
+        self.assertLessEqual(len(dx), 4 * width)
+        self.assertEqual(len(dx), len(dy))
+        self.assertTrue(np.all(np.diff(dx) > 0))
+
+    @given(st.sampled_from(['minmax', 'lttb']))
+    def test_keeps_spikes_and_timeouts(self, method):
+        x, y = self.points()
+        dx, dy = downsample.downsample(x, y, 500, method)
+
+        self.assertIn(4000.0, dy)
+        self.assertIn(-100.0, dy)
+        self.assertEqual(dx[0], x[0])
+        self.assertEqual(dx[-1], x[-1])
+
+    def test_small_input_unchanged(self):
+        x, y = self.points(50)
+        dx, dy = downsample.downsample(x, y, 500)
+
+        self.assertTrue(np.array_equal(dx, x))
+        self.assertTrue(np.array_equal(dy, y))
+
+    def test_unsorted_input(self):
+        x, y = self.points(10000)
+        dx, dy = downsample.downsample(x[::-1], y[::-1], 100)
+
+        self.assertTrue(np.all(np.diff(dx) > 0))
+        self.assertIn(-100.0, dy)
+
+    @given(st.text())
+    def test_catch_bad_method(self, method):
+        if method in downsample.METHODS:
+            return
+        with self.assertRaises(ValueError):
+            downsample.downsample([1.0], [1.0], 10, method)
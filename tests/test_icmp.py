@@ -0,0 +1,128 @@
+import unittest
+from hypothesis import given, strategies as st
+
+# Test resources
+import socket
+import struct
+import threading
+
+# PingStats modules
+import icmp
+
+
+def can_open_socket():
+    try:
+        icmp.EchoSocket(socket.AF_INET).close()
+        return True
+    except OSError:
+        return False
+
+
+class Icmp_test(unittest.TestCase):
+    """ Tests the shared ICMP socket of `icmp`. """
+    @given(st.integers(min_value=0, max_value=0xffff),
+           st.integers(min_value=0, max_value=0xffff),
+           st.integers(min_value=0, max_value=1024))
+    def test_echo_request(self, identifier, seq, size):
+        packet = icmp.echo_request(socket.AF_INET, identifier, seq, size)
+
+        self.assertEqual(len(packet), icmp.HEADER.size + size)
+        self.assertEqual(icmp.checksum(packet), 0)
+        self.assertEqual(icmp.HEADER.unpack_from(packet)[3:],
+                         (identifier, seq))
+
+    def test_parse_reply(self):
+        request = icmp.echo_request(socket.AF_INET, 7, 9, 8)
+        reply = bytes([0]) + request[1:]
+        ip_header = bytes([0x45]) + bytes(19)
+
+        self.assertIsNone(icmp.parse_reply(socket.AF_INET, request, False))
+        self.assertEqual(icmp.parse_reply(socket.AF_INET, reply, False),
+                         (7, 9))
+        self.assertEqual(icmp.parse_reply(socket.AF_INET, ip_header + reply,
+                                          True), (7, 9))
+        self.assertIsNone(icmp.parse_reply(socket.AF_INET, b'\x00', False))
+
+        reply6 = struct.pack('!BBHHH', 129, 0, 0, 7, 9)
+        self.assertEqual(icmp.parse_reply(socket.AF_INET6, reply6, True),
+                         (7, 9))
+
+    def test_unresolvable_target(self):
+        prober = icmp.SocketProber()
+        self.assertIsNone(prober.send('no such host.invalid', 100, 1, 8))
+        prober.close()
+
+    @unittest.skipUnless(can_open_socket(), 'needs an ICMP socket')
+    def test_shared_socket(self):
+        prober = icmp.SocketProber()
+        results = []
+
+        def probe():
+            for i in range(20):
+                results.append(prober.send('127.0.0.1', 1000, i, 56))
+        threads = [threading.Thread(target=probe) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(prober.sockets), 1)
+        echo = prober.sockets[socket.AF_INET]
+        self.assertEqual(echo.seq, 80)
+        self.assertEqual(echo.pending, {})
+        self.assertNotIn(None, results)
+        self.assertTrue(all(0 <= rtt < 1000 for rtt in results))
+
+        prober.close()
+        self.assertFalse(echo.receiver.is_alive())
+
+    @unittest.skipUnless(can_open_socket(), 'needs an ICMP socket')
+    def test_multiping_without_threads(self):
+        import asyncio
+        import core
+
+        prober = icmp.SocketProber()
+        self.addCleanup(prober.close)
+        engine = core.MultiPing(['127.0.0.1'] * 50, delay=0.1,
+                                prober=prober)
+        rows = []
+        asyncio.run(engine.run(rows.append, duration=0.35))
+
+        self.assertGreaterEqual(len(rows), 100)
+        self.assertTrue(all(0 <= row[1] < 3000 for row in rows))
+        self.assertEqual(prober.sockets[socket.AF_INET].pending, {})
+
+    @unittest.skipUnless(can_open_socket(), 'needs an ICMP socket')
+    def test_reply_from_another_address(self):
+        prober = icmp.SocketProber()
+        self.addCleanup(prober.close)
+        self.assertIsNotNone(prober.send('0.0.0.0', 1000, 1, 56))
+
+    @unittest.skipUnless(can_open_socket(), 'needs an ICMP socket')
+    def test_receiver_survives_errors(self):
+        echo = icmp.EchoSocket(socket.AF_INET)
+        self.addCleanup(echo.close)
+        real = echo.socket
+
+        failed = threading.Event()
+
+        class Failing:
+            def recv(self, size):
+                echo.socket = real
+                failed.set()
+                raise ConnectionRefusedError('port unreachable')
+
+        echo.socket = Failing()
+        self.assertTrue(failed.wait(1))
+        self.assertIsNotNone(echo.send('127.0.0.1', 1000, 56))
+        self.assertTrue(echo.receiver.is_alive())
+
+    @unittest.skipUnless(can_open_socket(), 'needs an ICMP socket')
+    def test_lost_probe(self):
+        echo = icmp.EchoSocket(socket.AF_INET)
+        echo.closed = True  # stop receiving, so the reply is never seen
+        echo.receiver.join()
+
+        self.assertIsNone(echo.send('127.0.0.1', 200, 56))
+        self.assertEqual(echo.pending, {})
+        echo.socket.close()
@@ -0,0 +1,102 @@
+import unittest
+from hypothesis import given, strategies as st
+
+# Test resources
+import queue
+import logging
+import threading
+
+# PingStats modules
+import log
+
+
+class Log_test(unittest.TestCase):
+    """ Tests the queued logging pipeline and hot path sampling of `log`. """
+    def tearDown(self):
+        log.set_hot_path(0)
+
+    def test_sampler_off_by_default(self):
+        sampler = log.Sampler()
+        self.assertFalse(any(sampler() for i in range(100)))
+        self.assertEqual(sampler.calls, 0)
+
+    @given(st.integers(min_value=1, max_value=50),
+           st.integers(min_value=0, max_value=500))
+    def test_sampler_every(self, every, calls):
+        log.set_hot_path(every)
+        sampler = log.Sampler(per_second=None)
+        passed = sum(sampler() for i in range(calls))
+
+        self.assertEqual(passed, calls // every)
+        self.assertEqual(sampler.skipped, calls - passed)
+
+    def test_sampler_per_second(self):
+        now = [0.0]
+        sampler = log.Sampler(every=1, per_second=5, clock=lambda: now[0])
+        self.assertEqual(sum(sampler() for i in range(20)), 5)
+
+        now[0] = 0.4  # the allowance refills at 5 a second
+        self.assertEqual(sum(sampler() for i in range(20)), 2)
+        now[0] = 10.0  # but never holds more than a second's worth
+        self.assertEqual(sum(sampler() for i in range(20)), 5)
+        self.assertEqual(sampler.skipped, 48)
+
+    def test_bad_hot_path(self):
+        with self.assertRaises(ValueError):
+            log.set_hot_path(-1)
+
+    def test_records_reach_their_route(self):
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        log.ROUTES['base.test'] = (handler,)
+
+        logger = logging.getLogger('base.test')
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(log.queue_handler)
+        try:
+            logger.debug('row %s', (1, 2.0))
+            log.log_queue.join()
+        finally:
+            logger.removeHandler(log.queue_handler)
+            del log.ROUTES['base.test']
+
+        self.assertEqual([record.getMessage() for record in records],
+                         ['row (1, 2.0)'])
+
+    def test_formatted_on_the_listener(self):
+        threads = []
+
+        class Formatter(logging.Formatter):
+            def format(self, record):
+                threads.append((threading.current_thread(), record.args))
+                return super(Formatter, self).format(record)
+
+        handler = logging.Handler()
+        handler.setFormatter(Formatter())
+        handler.emit = handler.format
+        log.ROUTES['base.test'] = (handler,)
+
+        logger = logging.getLogger('base.test')
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(log.queue_handler)
+        try:
+            logger.debug('row %s', (1, 2.0))
+            log.log_queue.join()
+        finally:
+            logger.removeHandler(log.queue_handler)
+            del log.ROUTES['base.test']
+
+        # Formatting on the logging thread would have merged the arguments.
+        [(thread, args)] = threads
+        self.assertIsNot(thread, threading.current_thread())
+        self.assertEqual(args, ((1, 2.0),))
+
+    def test_full_queue_drops(self):
+        handler = log.DroppingQueueHandler(queue.Queue(1))
+        dropped = log.DROPPED.value
+        for i in range(3):
+            handler.handle(logging.makeLogRecord({'msg': 'row %d' % i}))
+
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertEqual(log.DROPPED.value - dropped, 2)
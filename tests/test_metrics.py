@@ -0,0 +1,107 @@
+import unittest
+from hypothesis import given, strategies as st
+
+# Test resources
+import os
+import signal
+import tempfile
+import time
+
+# PingStats modules
+import core
+import metrics
+import probers
+
+
+class Metrics_test(unittest.TestCase):
+    """ Tests `metrics` and the metrics updated by `core`. """
+    @given(st.lists(st.floats(min_value=0, max_value=100), max_size=200))
+    def test_histogram(self, values):
+        histogram = metrics.Histogram('h', 'A histogram.')
+        for value in values:
+            histogram.observe(value)
+
+        samples = dict(histogram.samples())
+        self.assertEqual(samples['h_count'], len(values))
+        self.assertEqual(samples['h_bucket{le="+Inf"}'], len(values))
+        self.assertAlmostEqual(samples['h_sum'], sum(values))
+        for bound in metrics.BUCKETS:
+            self.assertEqual(samples['h_bucket{le="%r"}' % bound],
+                             len([v for v in values if v <= bound]))
+
+    def test_render(self):
+        registry = metrics.Registry()
+        registry.counter('c_total', 'A counter.').inc(3)
+        registry.gauge('g', 'A gauge.', lambda: 2.5)
+        registry.histogram('h_seconds', 'A histogram.', (0.1, 1)).observe(0.5)
+
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP c_total A counter.', '# TYPE c_total counter',
+            'c_total 3',
+            '# HELP g A gauge.', '# TYPE g gauge', 'g 2.5',
+            '# HELP h_seconds A histogram.', '# TYPE h_seconds histogram',
+            'h_seconds_bucket{le="0.1"} 0', 'h_seconds_bucket{le="1.0"} 1',
+            'h_seconds_bucket{le="+Inf"} 1', 'h_seconds_sum 0.5',
+            'h_seconds_count 1']) + '\n')
+
+        with self.assertRaises(ValueError):
+            registry.counter('g', 'Taken.')
+
+    def test_quantile(self):
+        histogram = metrics.Histogram('h', 'A histogram.', (1, 2, 3))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in (0.5, 1.5, 1.5, 2.5):
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.5), 2)
+        self.assertEqual(histogram.quantile(1), 3)
+
+    def test_dumper(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pingstats.prom')
+            dumper = metrics.Dumper(path, interval=0.01)
+            dumper.start()
+            dumper.stop()
+
+            with open(path) as f:
+                self.assertEqual(f.read(), metrics.render())
+            self.assertEqual(os.listdir(directory), ['pingstats.prom'])
+
+    @unittest.skipUnless(hasattr(signal, 'SIGUSR1'), 'needs SIGUSR1')
+    def test_dump_on_signal(self):
+        previous = signal.getsignal(signal.SIGUSR1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pingstats.prom')
+            try:
+                metrics.dump_on_signal(path)
+                # Signalled while the main thread holds a metric's lock.
+                with core.PROBE_SECONDS.lock:
+                    os.kill(os.getpid(), signal.SIGUSR1)
+            finally:
+                signal.signal(signal.SIGUSR1, previous)
+
+            deadline = time.monotonic() + 5
+            while not os.path.exists(path) and time.monotonic() < deadline:
+                time.sleep(0.01)
+            with open(path) as f:
+                self.assertIn('pingstats_probes_total', f.read())
+
+    def test_core_metrics(self):
+        probes = core.PROBES.value
+        lost = core.PROBES_LOST.value
+        written = core.ROWS_WRITTEN.value
+
+        with tempfile.TemporaryDirectory() as directory:
+            c = core.Core('127.0.0.1', directory, 'metrics', delay=0,
+                          blocking=True, batch_rows=1000,
+                          prober=probers.SyntheticProber(loss=0.5, seed=1))
+            for i, row in zip(range(100), c.ping_generator):
+                c.record(row)
+            self.assertGreaterEqual(dict(metrics.REGISTRY.metrics[
+                'pingstats_pending_rows'].samples())[
+                'pingstats_pending_rows'], 100)
+            c.close()
+
+        self.assertEqual(core.PROBES.value - probes, 100)
+        self.assertGreater(core.PROBES_LOST.value - lost, 20)
+        self.assertEqual(core.ROWS_WRITTEN.value - written, 100)
+        self.assertGreater(core.COMMIT_SECONDS.count, 0)
@@ -2,8 +2,10 @@ import unittest
 from hypothesis import given, strategies as st
 
 # Test resources
+import os
 import csv
 import time
+import tempfile
 import datetime as dt
 
 # PingStats modules
@@ -34,8 +36,113 @@ class Plotfile_test(unittest.TestCase):
                               type(dt.datetime.fromtimestamp(timestamp)))
 
     def test_yield_points(self):
-        with open('./tests/TestCSVLog.csv') as f:
-            reader = csv.reader(f)
-            for x, y in plot.PlotFile.yield_points(reader):
-                self.assertIsInstance(x, dt.datetime)
-                self.assertIsInstance(y, float)
+        obj = plot.PlotFile('./tests/TestCSVLog.csv')
+        for x, y in obj.yield_points():
+            self.assertIsInstance(x, dt.datetime)
+            self.assertIsInstance(y, float)
+
+    def test_follow(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log.csv')
+            with open(path, 'w') as f:
+                f.writelines('%d,5.0,3000,64,a\n' % i for i in range(100))
+
+            obj = plot.PlotFile(path, os.path.join(directory, 'log.png'),
+                                rollups=False, follow=True)
+            self.assertFalse(obj.update())
+
+            with open(path, 'a') as f:
+                f.write('100,7.0,3000,64,a\n')
+            self.assertTrue(obj.update())
+            self.assertEqual(obj.line.get_ydata()[-1], 7.0)
+            self.assertFalse(obj.update())
+
+            width = obj.fig.get_figwidth() * obj.fig.dpi
+            for start in range(101, 20101, 1000):
+                with open(path, 'a') as f:
+                    f.writelines('%d,%d,3000,64,a\n' % (i, i % 100)
+                                 for i in range(start, start + 1000))
+                self.assertTrue(obj.update())
+            self.assertLessEqual(len(obj.line.get_xdata()), 6 * width)
+            self.assertEqual(obj.line.get_ydata().max(), 99.0)
+            self.assertEqual(len(obj.x), 100)
+
+    def test_address(self):
+        import binlog
+        import rollup
+
+        rows = [(1000.0 + i, float(i), 3000, 64, 'ab'[i % 2])
+                for i in range(100)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log.csv')
+            with open(path, 'w') as f:
+                csv.writer(f).writerows(rows)
+            binary = os.path.join(directory, 'log' + binlog.EXTENSION)
+            with open(binary, 'ab') as f:
+                writer = binlog.BinaryWriter(f)
+                writer.writerows(rows)
+                writer.close()
+            writer = rollup.RollupWriter(path, (('1m', 60, 86400),))
+            writer.writerows(rows)
+            writer.close()
+
+            for log in (path, binary):
+                obj = plot.PlotFile(log, os.path.join(directory, 'log.png'),
+                                    rollups=False, address='b')
+                self.assertEqual(obj.y.tolist(), [float(i) for i in
+                                                  range(1, 100, 2)])
+
+            obj = plot.PlotFile(path, os.path.join(directory, 'log.png'),
+                                address='b')
+            obj.plot_rollup(path, '1m', address='b')
+            self.assertEqual(obj.y.tolist(), [10.0, 50.0, 90.0])
+
+    def test_log_older_than_rollups(self):
+        import rollup
+
+        rows = [(1000.0 + i * 10, 1.0, 3000, 64, 'a') for i in range(1000)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log.csv')
+            with open(path, 'w') as f:
+                csv.writer(f).writerows(rows)
+            writer = rollup.RollupWriter(path)
+            writer.writerows(rows[500:])  # rollups began halfway
+            writer.close()
+
+            self.assertEqual(plot.first_timestamp(path), 1000.0)
+            obj = plot.PlotFile(path, os.path.join(directory, 'log.png'))
+            self.assertEqual(obj.x.tolist(), [row[0] for row in rows])
+
+            obj = plot.PlotFile(path, os.path.join(directory, 'log.png'),
+                                start=6000.0)
+            self.assertEqual(len(obj.x), 2)  # from the 1h rollup
+
+    def test_sorted(self):
+        rows = [(1000.0 + i, float(i), 3000, 64, 'ab'[i % 2])
+                for i in range(10)]
+        rows.append((1002.5, 99.0, 3000, 64, 'a'))  # logged late
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log.csv')
+            with open(path, 'w') as f:
+                csv.writer(f).writerows(rows)
+
+            obj = plot.PlotFile(path, os.path.join(directory, 'log.png'))
+            self.assertEqual(obj.x.tolist(), sorted(row[0] for row in rows))
+            self.assertEqual(obj.y[3], 99.0)
+            self.assertEqual(obj.shown[0].tolist(), obj.x.tolist())
+
+    def test_sqlite(self):
+        import sqlitelog
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log' + sqlitelog.EXTENSION)
+            writer = sqlitelog.SqliteWriter(path)
+            writer.writerows((1000.0 + i, float(i), 3000, 64, 'ab'[i % 2])
+                             for i in range(100))
+            writer.close()
+
+            obj = plot.PlotFile(path, os.path.join(directory, 'log.png'),
+                                start=1010, end=1020, address='b')
+            self.assertEqual(obj.x.tolist(), [1011.0 + i for i in range(0, 10,
+                                                                        2)])
+
@@ -0,0 +1,107 @@
+import unittest
+from hypothesis import given, settings, strategies as st
+
+# Test resources
+import os
+import tempfile
+
+# PingStats modules
+import core
+import icmp
+import probers
+
+
+class Probers_test(unittest.TestCase):
+    """ Tests the simulated `core.Prober`s in `probers`. """
+    def send_many(self, prober, count, address='127.0.0.1'):
+        return [prober.send(address, 3000, i, 64) for i in range(count)]
+
+    @settings(max_examples=20, deadline=None)
+    @given(st.sampled_from(probers.LATENCIES),
+           st.floats(min_value=1, max_value=500),
+           st.integers())
+    def test_latency(self, latency, mean, seed):
+        prober = probers.SyntheticProber(latency, mean, mean / 4, seed=seed)
+        rtts = self.send_many(prober, 2000)
+
+        self.assertNotIn(None, rtts)
+        self.assertGreaterEqual(min(rtts), 0)
+        self.assertAlmostEqual(sum(rtts) / len(rtts), mean, delta=mean / 10)
+        self.assertEqual(self.send_many(probers.SyntheticProber(
+            latency, mean, mean / 4, seed=seed), 2000), rtts)
+
+    def test_loss_bursts(self):
+        prober = probers.SyntheticProber(loss=0.1, burst=5, seed=3)
+        lost = [rtt is None for rtt in self.send_many(prober, 50000)]
+        bursts = sum(1 for i in range(len(lost))
+                     if lost[i] and (i == 0 or not lost[i - 1]))
+
+        self.assertAlmostEqual(sum(lost) / len(lost), 0.1, delta=0.02)
+        self.assertAlmostEqual(sum(lost) / bursts, 5, delta=1)
+
+    def test_outages(self):
+        now = [0.0]
+        prober = probers.SyntheticProber(outage_every=60, outage_length=10,
+                                         seed=1, clock=lambda: now[0])
+        lost = []
+        for i in range(36000):  # ten hours, a probe a second
+            now[0] = float(i)
+            lost.append(prober.send('a', 3000, i, 64) is None)
+
+        self.assertAlmostEqual(sum(lost) / len(lost), 10 / 70, delta=0.05)
+
+    def test_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log.csv')
+            with open(path, 'w') as f:
+                f.write('1.0,12.5,3000,64,a\n2.0,,3000,64,a\n'
+                        '3.0,-100.0,3000,64,a\n4.0,7.0,3000,64,a\n')
+
+            looped = probers.ReplayProber(path)
+            once = probers.ReplayProber(path, loop=False)
+
+        expected = [12.5, None, None, 7.0]
+        self.assertEqual(self.send_many(looped, 6), expected + expected[:2])
+        self.assertEqual(self.send_many(looped, 2, 'b'), expected[:2])
+        self.assertEqual(self.send_many(once, 6), expected + [None, None])
+
+    def test_replay_per_target(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'log.csv')
+            with open(path, 'w') as f:
+                f.write('1.0,1.0,3000,64,a\n1.0,10.0,3000,64,b\n'
+                        '2.0,2.0,3000,64,a\n2.0,,3000,64,b\n'
+                        '3.0,3.0,3000,64,a\n')
+            prober = probers.ReplayProber(path)
+
+        self.assertEqual(self.send_many(prober, 4, 'b'),
+                         [10.0, None, 10.0, None])
+        self.assertEqual(self.send_many(prober, 4, 'a'), [1.0, 2.0, 3.0, 1.0])
+        self.assertEqual(self.send_many(prober, 2, 'c'), [None, None])
+
+    def test_from_spec(self):
+        self.assertIsInstance(probers.from_spec('icmp'), icmp.SocketProber)
+        self.assertIsInstance(probers.from_spec('pythonping'),
+                              core.IcmpProber)
+
+        prober = probers.from_spec('synthetic:latency=normal,mean=80,loss=0.5,'
+                                   'seed=2,sleep=no')
+        self.assertEqual((prober.latency, prober.mean, prober.loss,
+                          prober.sleep), ('normal', 80.0, 0.5, False))
+
+        for spec in ('ssh', 'replay:', 'synthetic:colour=red',
+                     'synthetic:latency=pareto', 'synthetic:mean=x'):
+            with self.assertRaises(ValueError):
+                probers.from_spec(spec)
+
+    def test_core_with_prober(self):
+        c = core.Core('127.0.0.1,127.0.0.2', nofile=True, delay=0,
+                      blocking=True,
+                      prober=probers.SyntheticProber('constant', 5.0))
+        rows = [next(c.ping_generator) for i in range(3)]
+        self.assertEqual([row[1] for row in rows], [5.0] * 3)
+
+        c.prober = probers.SyntheticProber(loss=1.0)
+        worker = core.ProbeWorker(c)
+        worker.start()
+        worker.stop(timeout=1)
@@ -0,0 +1,206 @@
+import unittest
+from hypothesis import given, settings, strategies as st
+
+# Test resources
+import os
+import time
+import tempfile
+import tkinter
+
+# PingStats modules
+import core
+import binlog
+import replay
+import timeindex
+
+
+def log_rows(count, start=1000.0, gap_after=None, gap=0.0):
+    """ Returns `count` rows one second apart for two targets, every
+    seventh lost, with `gap` seconds skipped after row `gap_after`. """
+    rows = []
+    for i in range(count):
+        timestamp = start + i + (gap if gap_after is not None and
+                                 i > gap_after else 0.0)
+        rows.append((timestamp, '' if i % 7 == 0 else float(i % 50),
+                     3000, 64, 'a' if i % 2 else 'b'))
+    return rows
+
+
+class Replay_test(unittest.TestCase):
+    """ Tests reading logs by time and replaying them with a
+    `replay.Replayer`. """
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.TemporaryDirectory()
+        cls.rows = log_rows(1000)
+        cls.csv = os.path.join(cls.dir.name, 'log.csv')
+        open(cls.csv, 'w').close()
+        with open(cls.csv, 'a+') as f:
+            writer = core.BatchWriter(f, batch_rows=100,
+                                      index=timeindex.TimeIndex(cls.csv, 10))
+            writer.writerows(cls.rows)
+            writer.close()
+
+        cls.binary = os.path.join(cls.dir.name, 'log' + binlog.EXTENSION)
+        with open(cls.binary, 'ab') as f:
+            writer = binlog.BinaryWriter(f)
+            writer.writerows(cls.rows)
+            writer.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dir.cleanup()
+
+    def expected(self, start=None, address=None):
+        return [(row[0], core.TIMEOUT_RTT if row[1] == '' else row[1],
+                 row[4]) for row in self.rows
+                if (start is None or row[0] >= start) and
+                (address is None or row[4] == address)]
+
+    @staticmethod
+    def summarize(rows):
+        return [(row[0], row[1], row[4]) for row in rows]
+
+    @settings(max_examples=30, deadline=None)
+    @given(st.one_of(st.none(), st.floats(min_value=900, max_value=2100)),
+           st.sampled_from([None, 'a', 'b']))
+    def test_rows_from_start(self, start, address):
+        for path in (self.csv, self.binary):
+            self.assertEqual(self.summarize(replay.rows(path, start,
+                                                        address)),
+                             self.expected(start, address))
+
+    def test_out_of_order_binary_rows(self):
+        # Every seventh probe is lost, and its row written 3s late.
+        rows = sorted(self.rows, key=lambda row: row[0] +
+                      (3 if row[1] == '' else 0))
+        path = os.path.join(self.dir.name, 'unsorted' + binlog.EXTENSION)
+        with open(path, 'ab') as f:
+            writer = binlog.BinaryWriter(f)
+            writer.writerows(rows)
+            writer.close()
+
+        for start in (1000.5, 1500.5, 1998.0):
+            self.assertEqual(sorted(self.summarize(replay.rows(path, start))),
+                             self.expected(start))
+
+    def test_csv_rows_keep_fields(self):
+        row = next(replay.csv_rows(self.csv, 1500))
+        self.assertEqual(row, (1500.0, 0.0, '3000', '64', 'b'))
+
+    def test_bounds(self):
+        for path in (self.csv, self.binary):
+            first, last = replay.bounds(path)
+            self.assertEqual(first[0], 1000.0)
+            self.assertEqual(last, 1999.0)
+
+        empty = os.path.join(self.dir.name, 'empty.csv')
+        open(empty, 'w').close()
+        self.assertIsNone(replay.bounds(empty))
+
+    def replayer(self, path=None, **kwargs):
+        c = core.Core('b', nofile=True)
+        worker = replay.Replayer(path or self.csv, c, **kwargs)
+        self.addCleanup(worker.stop, 1)
+        return worker
+
+    def test_replays_every_row(self):
+        worker = self.replayer(speed=replay.MAX_SPEED, address='b',
+                               start=1900.0)
+        worker.start()
+        self.assertTrue(worker.finished.wait(5))
+
+        self.assertEqual(self.summarize(worker.drain()),
+                         self.expected(1900.0, 'b'))
+        self.assertEqual(list(worker.core.stats.windows), ['b'])
+        self.assertGreaterEqual(worker.position, 1998.0)
+
+    def test_skips_gaps(self):
+        path = os.path.join(self.dir.name, 'gap.csv')
+        with open(path, 'w') as f:
+            writer = core.BatchWriter(f)
+            writer.writerows(log_rows(20, gap_after=9, gap=1e6))
+            writer.close()
+
+        worker = self.replayer(path, speed=100, max_wait=0.05)
+        started = time.monotonic()
+        worker.start()
+        self.assertTrue(worker.finished.wait(5))
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(len(worker.drain()), 20)
+
+    def test_pause_and_resume(self):
+        worker = self.replayer(speed=replay.MAX_SPEED, start=1950.0)
+        worker.pause()
+        worker.start()
+        time.sleep(0.2)
+        self.assertFalse(worker.finished.is_set())
+        self.assertEqual(worker.drain(), [])
+
+        worker.resume()
+        self.assertTrue(worker.finished.wait(5))
+        self.assertEqual(len(worker.drain()), 50)
+
+    def test_seek(self):
+        worker = self.replayer(speed=replay.MAX_SPEED, start=1990.0)
+        worker.start()
+        self.assertTrue(worker.finished.wait(5))
+
+        worker.seek(1100.0)
+        self.assertEqual(worker.seeks, 1)
+        self.assertEqual(worker.drain(), [])
+        self.assertEqual(worker.core.stats.windows, {})
+
+        worker.pause()
+        worker.seek(1500.0)  # seeking while paused shows nothing new
+        time.sleep(0.2)
+        self.assertEqual(worker.drain(), [])
+
+        worker.seek(1995.0)
+        worker.resume()
+        self.assertTrue(worker.finished.wait(5))
+        self.assertEqual(self.summarize(worker.drain()),
+                         self.expected(1995.0))
+
+    def test_speed(self):
+        worker = self.replayer()
+        for speed in (0, -1, replay.MAX_SPEED * 2):
+            self.assertRaises(ValueError, worker.set_speed, speed)
+            self.assertRaises(ValueError, self.replayer, speed=speed)
+        worker.set_speed(replay.MAX_SPEED)
+        self.assertEqual(worker.speed, replay.MAX_SPEED)
+
+
+class ReplayPlot_test(unittest.TestCase):
+    """ Tests `plot.Replay` functionality. Needs a display. """
+    def setUp(self):
+        try:
+            self.root = tkinter.Tk()
+        except tkinter.TclError:
+            self.skipTest('needs a display')
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def test_restarts_after_seek(self):
+        import plot
+
+        c = core.Core('a', nofile=True)
+        worker = replay.Replayer(os.devnull, c)
+        p = plot.Replay(self.root, c, worker, table_length=100)
+        self.assertIs(p.worker, worker)
+
+        worker.rows.extend((i, 5.0, None, None, 'a') for i in range(10))
+        p.animate(0)
+        self.assertEqual(len(p.x_list), 10)
+
+        worker.seek(0)
+        worker.rows.extend((5000.0 + i, 5.0, None, None, 'a')
+                           for i in range(3))
+        p.animate(1)
+        self.assertEqual(list(p.x_list), [5000.0, 5001.0, 5002.0])
+        self.assertGreater(p.ax1.get_xlim()[1], plot.epoch_to_num(5002.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+from hypothesis import given, settings, strategies as st
+
+# Test resources
+import os
+import time
+import tempfile
+
+# PingStats modules
+import rollup
+
+
+class Rollup_test(unittest.TestCase):
+    """ Tests `rollup` aggregation, wrapping and tier selection. """
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.dir.name, 'log.csv')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    @settings(max_examples=20, deadline=None)
+    @given(st.lists(st.one_of(st.none(), st.floats(min_value=0.1,
+                                                   max_value=5000)),
+                    min_size=1, max_size=600))
+    def test_minute_slots_match_rows(self, rtts):
+        for path in os.listdir(self.dir.name):
+            os.remove(os.path.join(self.dir.name, path))
+
+        writer = rollup.RollupWriter(self.log)
+        for i, rtt in enumerate(rtts):
+            writer.writerow((6000.0 + i * 0.5, '' if rtt is None else rtt,
+                             3000, 64, 'host'))
+        writer.close()
+
+        slots = rollup.read_tier(self.log, '1m')
+        self.assertEqual(int(slots['count'].sum()), len(rtts))
+        self.assertEqual(int(slots['lost'].sum()), rtts.count(None))
+        received = [rtt for rtt in rtts if rtt is not None]
+        if received:
+            self.assertAlmostEqual(float(slots['sum'].sum()), sum(received),
+                                   delta=1e-6 * sum(received))
+
+    def test_late_rows_and_restarts(self):
+        writer = rollup.RollupWriter(self.log)
+        writer.writerow((10.5, 1.0, 3000, 64, 'a'))
+        writer.writerow((11.5, 2.0, 3000, 64, 'a'))
+        writer.writerow((10.7, 3.0, 3000, 64, 'a'))  # late
+        writer.close()
+
+        writer = rollup.RollupWriter(self.log)  # restart in the same second
+        writer.writerow((11.9, '', 3000, 64, 'a'))
+        writer.close()
+
+        slots = rollup.read_tier(self.log, '1s')
+        self.assertEqual(list(slots['start']), [10.0, 11.0])
+        self.assertEqual(list(slots['count']), [2, 2])
+        self.assertEqual(list(slots['lost']), [0, 1])
+        self.assertEqual(list(slots['max']), [3.0, 2.0])
+
+    def test_targets_merge(self):
+        writer = rollup.RollupWriter(self.log)
+        writer.writerow((60.0, 1.0, 3000, 64, 'a'))
+        writer.writerow((61.0, 5.0, 3000, 64, 'b/c'))
+        writer.close()
+
+        slots = rollup.read_tier(self.log, '1m')
+        self.assertEqual(len(slots), 1)
+        self.assertEqual((slots['min'][0], slots['max'][0]), (1.0, 5.0))
+        x, lows, means, highs = rollup.points(slots)
+        self.assertEqual(means[0], 3.0)
+
+        slots = rollup.read_tier(self.log, '1m', 'b/c')
+        self.assertEqual((slots['min'][0], slots['max'][0]), (5.0, 5.0))
+        self.assertEqual(len(rollup.read_tier(self.log, '1m', 'd')), 0)
+
+    def test_batches_reach_disk(self):
+        writer = rollup.RollupWriter(self.log, batch_rows=4,
+                                     batch_ms=float('inf'))
+        for i in range(6):
+            writer.writerow((60.0 + i, 1.0, 3000, 64, 'a'))
+        self.assertEqual(int(rollup.read_tier(self.log, '1s')['count'].sum()),
+                         4)
+        writer.close()
+
+        writer = rollup.RollupWriter(self.log + '.idle', batch_ms=50)
+        writer.writerow((60.0, 1.0, 3000, 64, 'a'))
+        time.sleep(0.3)
+        self.assertEqual(len(rollup.read_tier(self.log + '.idle', '1s')), 1)
+        writer.close()
+
+    def test_files_wrap_at_retention(self):
+        tiers = (('1s', 1, 10),)
+        writer = rollup.RollupWriter(self.log, tiers)
+        for i in range(25):
+            writer.writerow((float(i), 1.0, 3000, 64, 'a'))
+        writer.close()
+
+        slots = rollup.read_tier(self.log, '1s')
+        self.assertEqual(list(slots['start']), [float(i) for i in
+                                                range(15, 25)])
+        self.assertEqual(os.path.getsize(rollup.tier_path(self.log, 'a',
+                                                          '1s')),
+                         rollup.HEADER.size + 10 * rollup.SLOT.size)
+
+    def test_choose_tier(self):
+        now = time.time()
+        writer = rollup.RollupWriter(self.log)
+        writer.writerow((now - 7 * 86400, 1.0, 3000, 64, 'a'))
+        writer.writerow((now, 1.0, 3000, 64, 'a'))
+        writer.close()
+
+        self.assertIsNone(rollup.choose_tier(self.log, now - 60, now, 10000))
+        self.assertEqual(rollup.choose_tier(self.log, now - 7200, now, 10000),
+                         '1s')
+        self.assertEqual(rollup.choose_tier(self.log, now - 86400, now,
+                                            10000), '1m')
+        self.assertEqual(rollup.choose_tier(self.log, None, None, 10000),
+                         '1h')
+        self.assertIsNone(rollup.choose_tier(self.log + 'x', None, None, 10))
+
+        # Raw rows logged before the rollups are only in the log.
+        older = now - 30 * 86400
+        self.assertIsNone(rollup.choose_tier(self.log, None, None, 10000,
+                                             first=older))
+        self.assertIsNone(rollup.choose_tier(self.log, older, now, 10000,
+                                             first=older))
+        self.assertEqual(rollup.choose_tier(self.log, now - 86400, now,
+                                            10000, first=older), '1m')
+        self.assertEqual(rollup.choose_tier(self.log, None, None, 10000,
+                                            first=now - 7 * 86400), '1h')
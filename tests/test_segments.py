@@ -0,0 +1,121 @@
+import unittest
+from hypothesis import given, strategies as st
+
+# Test resources
+import os
+import gzip
+import tempfile
+
+# PingStats modules
+import csvlog
+import segments
+import timeindex
+
+
+class Segments_test(unittest.TestCase):
+    """ Tests `segments` rotation, compression and reading. """
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'log.csv')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def writer(self, **kwargs):
+        fileobj = open(self.path, 'a+')
+        return segments.SegmentWriter(fileobj, batch_rows=10,
+                                      batch_ms=float('inf'),
+                                      index=timeindex.TimeIndex(self.path, 4),
+                                      **kwargs)
+
+    def test_rotate_by_period(self):
+        writer = self.writer(period=100, compress=False)
+        writer.writerows((1000.0 + i * 10, 1.0, 3000, 64, 'a')
+                         for i in range(35))
+        writer.close()
+
+        found = segments.list_segments(self.path)
+        self.assertEqual([start for start, path in found],
+                         [1000.0, 1100.0, 1200.0])
+        for start, path in found:
+            x, y = csvlog.read(path)
+            self.assertTrue(((x // 100) == start // 100).all())
+            self.assertTrue(os.path.exists(timeindex.index_path(path)))
+
+        x, y = csvlog.read(self.path)
+        self.assertEqual(list(x), [1000.0 + i * 10 for i in range(35)])
+
+    def test_late_rows_stay_in_the_log(self):
+        writer = self.writer(period=100, compress=False)
+        for timestamp in (90.0, 95.0, 101.0, 98.0, 102.0, 103.0):
+            writer.writerow((timestamp, 1.0, 3000, 64, 'a'))
+        writer.close()
+
+        found = segments.list_segments(self.path)
+        self.assertEqual([start for start, path in found], [90.0])
+        self.assertEqual(list(csvlog.read(found[0][1])[0]), [90.0, 95.0])
+        self.assertEqual(list(csvlog.read_file(self.path)[0][0]),
+                         [101.0, 98.0, 102.0, 103.0])
+
+    def test_rotate_by_size_and_compress(self):
+        writer = self.writer(max_bytes=200)
+        writer.writerows((1000.0 + i, 1.0, 3000, 64, 'a') for i in range(60))
+        writer.close()
+
+        found = segments.list_segments(self.path)
+        self.assertGreater(len(found), 2)
+        for start, path in found:
+            self.assertTrue(path.endswith('.gz'))
+            self.assertFalse(os.path.exists(timeindex.index_path(path[:-3])))
+            with gzip.open(path, 'rt') as f:
+                self.assertLessEqual(len(f.read()), 200 + 10 * 40)
+
+        x, y = csvlog.read(self.path)
+        self.assertEqual(list(x), [1000.0 + i for i in range(60)])
+
+        x, y = csvlog.read(self.path, 1025.0, 1030.0)
+        self.assertEqual(list(x), [1025.0 + i for i in range(6)])
+
+    def test_compress_leftover_segments(self):
+        with open(segments.segment_path(self.path, 5.0), 'w') as f:
+            f.write('5.0,1.0,3000,64,a\n')
+        writer = self.writer(period=100)
+        writer.writerow((7.0, 2.0, 3000, 64, 'a'))
+        writer.close()
+
+        self.assertEqual(segments.list_segments(self.path),
+                         [(5.0, segments.segment_path(self.path, 5.0) +
+                           '.gz')])
+        self.assertEqual(list(csvlog.read(self.path)[0]), [5.0, 7.0])
+
+    def test_segment_compressed_once_listed(self):
+        segment = segments.segment_path(self.path, 5.0)
+        with open(segment, 'w') as f:
+            f.write('5.0,1.0,3000,64,a\n')
+        self.assertEqual(segments.list_segments(self.path), [(5.0, segment)])
+
+        segments.compress(segment)
+        self.assertEqual(list(csvlog.read_file(segment)[0][0]), [5.0])
+        with self.assertRaises(FileNotFoundError):
+            segments.open_segment(self.path)
+
+    @given(st.lists(st.integers(min_value=0, max_value=100), min_size=1,
+                    max_size=10, unique=True),
+           st.one_of(st.none(), st.integers(min_value=0, max_value=120)),
+           st.one_of(st.none(), st.integers(min_value=0, max_value=120)))
+    def test_log_paths(self, starts, start, end):
+        starts = sorted(starts)
+        for name in os.listdir(self.dir.name):
+            os.remove(os.path.join(self.dir.name, name))
+        for first in starts:
+            open(segments.segment_path(self.path, first), 'w').close()
+
+        paths = segments.log_paths(self.path, start, end)
+        self.assertEqual(paths[-1], self.path)
+        for i, first in enumerate(starts):
+            following = starts[i + 1] if i + 1 < len(starts) else None
+            overlaps = (end is None or first <= end + timeindex.SLACK) and \
+                (start is None or following is None or
+                 following > start - timeindex.SLACK)
+            self.assertEqual(segments.segment_path(self.path, first) in paths,
+                             overlaps)
@@ -0,0 +1,92 @@
+import unittest
+from hypothesis import given, settings, strategies as st
+
+# Test resources
+import os
+import tempfile
+
+# PingStats modules
+import sketch
+
+
+class Sketch_test(unittest.TestCase):
+    """ Tests `sketch` quantile accuracy, merging and persistence. """
+    @staticmethod
+    def exact(values, q):
+        values = sorted(values)
+        return values[int(q * (len(values) - 1))]
+
+    @settings(max_examples=50)
+    @given(st.lists(st.floats(min_value=0.01, max_value=60000), min_size=1,
+                    max_size=2000),
+           st.sampled_from(sketch.QUANTILES))
+    def test_relative_accuracy(self, values, q):
+        s = sketch.DDSketch(0.01)
+        for value in values:
+            s.add(value)
+
+        exact = self.exact(values, q)
+        self.assertLessEqual(abs(s.quantile(q) - exact), 0.0101 * exact)
+
+    @given(st.lists(st.floats(min_value=0.01, max_value=60000), min_size=2,
+                    max_size=500))
+    def test_merge_equals_single_sketch(self, values):
+        whole = sketch.DDSketch()
+        left = sketch.DDSketch()
+        right = sketch.DDSketch()
+        for i, value in enumerate(values):
+            whole.add(value)
+            (left if i % 2 else right).add(value)
+
+        merged = left.merge(right)
+        self.assertEqual(merged.bins, whole.bins)
+        for q in sketch.QUANTILES:
+            self.assertEqual(merged.quantile(q), whole.quantile(q))
+
+    def test_bounded_bins(self):
+        s = sketch.DDSketch(0.01, max_bins=64)
+        for i in range(1, 100000):
+            s.add(i * 0.01)
+
+        self.assertLessEqual(len(s.bins), 64)
+        self.assertEqual(s.count, 99999)
+        self.assertLessEqual(abs(s.quantile(0.99) - 990), 10)
+
+    def test_writer_persists_and_merges(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for name in ('a.csv', 'b.csv'):
+                writer = sketch.SketchWriter(os.path.join(directory, name))
+                for i in range(100):
+                    writer.writerow((float(i), float(i + 1), 3000, 64, 'host'))
+                writer.writerow((100.0, '', 3000, 64, 'host'))
+                writer.close()
+                paths.append(writer.path)
+
+            merged = sketch.merge_files(paths)['host']
+            self.assertEqual((merged.count, merged.lost), (200, 2))
+            self.assertLessEqual(abs(merged.quantile(0.5) - 50), 1)
+            self.assertIn('host: n=202 lost=2', sketch.format_quantiles(
+                {'host': merged}))
+
+    def test_writer_flushed_from_another_thread(self):
+        import threading
+
+        with tempfile.TemporaryDirectory() as directory:
+            writer = sketch.SketchWriter(os.path.join(directory, 'a.csv'),
+                                         batch_rows=7)
+            done = threading.Event()
+
+            def flush():
+                while not done.is_set():
+                    writer.flush()
+            flusher = threading.Thread(target=flush)
+            flusher.start()
+            for i in range(5000):
+                writer.writerow((float(i), 1.0, 3000, 64, 'host%d' % i))
+            done.set()
+            flusher.join()
+
+            self.assertEqual(writer.format().count('\n'), 4999)
+            writer.close()
+            self.assertEqual(len(sketch.load(writer.path)), 5000)
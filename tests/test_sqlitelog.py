@@ -0,0 +1,104 @@
+import unittest
+from hypothesis import given, settings, strategies as st
+
+# Test resources
+import os
+import sqlite3
+import tempfile
+
+# PingStats modules
+import core
+import probers
+import sqlitelog
+
+
+def log_rows(count):
+    """ Returns `count` rows one second apart for three targets, every
+    fifth lost. """
+    return [(1000.0 + i, '' if i % 5 == 0 else float(i), 3000, 64,
+             'abc'[i % 3]) for i in range(count)]
+
+
+class SqliteLog_test(unittest.TestCase):
+    """ Tests writing and querying `sqlitelog` databases. """
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.dir.name, 'log' + sqlitelog.EXTENSION)
+        cls.rows = log_rows(3000)
+        writer = sqlitelog.SqliteWriter(cls.path, batch_rows=500)
+        writer.writerows(cls.rows)
+        writer.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dir.cleanup()
+
+    def expected(self, target=None, start=None, end=None):
+        return [(row[0], core.TIMEOUT_RTT if row[1] == '' else row[1])
+                for row in self.rows
+                if (target is None or row[4] == target) and
+                (start is None or row[0] >= start) and
+                (end is None or row[0] <= end)]
+
+    @settings(max_examples=30, deadline=None)
+    @given(st.sampled_from([None, 'a', 'b', 'c', 'd']),
+           st.one_of(st.none(), st.floats(min_value=900, max_value=4100)),
+           st.one_of(st.none(), st.floats(min_value=900, max_value=4100)))
+    def test_read(self, target, start, end):
+        x, y = sqlitelog.read(self.path, target, start, end)
+        self.assertEqual(list(zip(x.tolist(), y.tolist())),
+                         self.expected(target, start, end))
+
+    def test_schema(self):
+        connection = sqlite3.connect(self.path)
+        self.addCleanup(connection.close)
+        self.assertEqual(connection.execute('PRAGMA journal_mode').fetchone(),
+                         ('wal',))
+        plan = ' '.join(str(row) for row in connection.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM pings WHERE target = 1 AND '
+            'timestamp BETWEEN 0 AND 1'))
+        self.assertIn('pings_target_timestamp', plan)
+        self.assertEqual(connection.execute(
+            'SELECT * FROM pings ORDER BY timestamp LIMIT 2').fetchall(),
+            [(1, 1000.0, None, 3000, 64), (2, 1001.0, 1.0, 3000, 64)])
+
+    def test_targets_and_loss(self):
+        self.assertEqual(sqlitelog.targets(self.path), ['a', 'b', 'c'])
+        slots = sqlitelog.loss(self.path, 1000, 'a')
+        self.assertEqual(slots, [('a', 1000, 334, 67), ('a', 2000, 333, 67),
+                                 ('a', 3000, 333, 66)])
+        self.assertEqual(len(sqlitelog.loss(self.path, 1000)), 9)
+
+    def test_batches(self):
+        path = os.path.join(self.dir.name, 'batches' + sqlitelog.EXTENSION)
+        writer = sqlitelog.SqliteWriter(path, batch_rows=10,
+                                        batch_ms=float('inf'))
+        writer.writerows(log_rows(25))
+        self.assertEqual(len(writer.rows), 5)
+        self.assertEqual(len(sqlitelog.read(path)[0]), 20)
+        writer.close()
+        self.assertEqual(len(sqlitelog.read(path)[0]), 25)
+
+        writer = sqlitelog.SqliteWriter(path)  # reopened, targets kept
+        writer.writerow((5000.0, 1.0, 3000, 64, 'b'))
+        writer.writerow((5001.0, 1.0, 3000, 64, 'd'))
+        writer.close()
+        self.assertEqual(sqlitelog.targets(path), ['a', 'b', 'c', 'd'])
+        self.assertEqual(len(sqlitelog.read(path, 'b')[0]), 9)
+
+    def test_core_sink(self):
+        c = core.Core('a,b', self.dir.name, 'core', delay=0, blocking=True,
+                      sketch_interval=0, rollups=False, sqlite=True,
+                      prober=probers.SyntheticProber(seed=0))
+        for i, row in zip(range(50), c.ping_generator):
+            c.record(row)
+        c.close()
+
+        path = os.path.join(self.dir.name, 'core' + sqlitelog.EXTENSION)
+        x, y = sqlitelog.read(path, 'a')
+        self.assertEqual(len(x), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
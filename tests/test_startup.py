@@ -0,0 +1,41 @@
+import unittest
+
+# Test resources
+import os
+import tempfile
+
+# PingStats modules
+import benchmark
+
+
+class Startup_test(unittest.TestCase):
+    """ Tests that `main.py` only imports the GUI and plotting modules when
+    it needs them. """
+    def test_version_imports_nothing_heavy(self):
+        modules = benchmark.imported_modules(['-v'])
+
+        self.assertIn('core', modules)
+        for name in benchmark.HEAVY:
+            self.assertNotIn(name, modules)
+
+    def test_render_does_not_import_tk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, 'log.csv')
+            with open(log_path, 'w') as f:
+                f.write('1500000000.0,12.5,3000,64,127.0.0.1\n'
+                        '1500000001.0,,3000,64,127.0.0.1\n')
+
+            image_path = os.path.join(directory, 'log.png')
+            modules = benchmark.imported_modules(['-pf', log_path, '-gi',
+                                                  image_path, '-nR'])
+
+            self.assertTrue(os.path.exists(image_path))
+        self.assertIn('matplotlib', modules)
+        self.assertNotIn('tkinter', modules)
+
+    def test_startup(self):
+        result = benchmark.startup(['-v'], runs=2)
+
+        self.assertEqual(result['runs'], 2)
+        self.assertLessEqual(result['min'], result['max'])
+        self.assertEqual(result['heavy'], [])
@@ -0,0 +1,118 @@
+import unittest
+from hypothesis import given, settings, strategies as st
+
+# Test resources
+import os
+import tempfile
+
+# PingStats modules
+import core
+import tail
+
+
+def row_text(timestamp, rtt=5.0):
+    return '%r,%s,3000,64,a\n' % (timestamp, '' if rtt is None else rtt)
+
+
+class Tail_test(unittest.TestCase):
+    """ Tests following a growing log with `tail`. """
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'log.csv')
+        self.append(''.join(row_text(1000.0 + i) for i in range(10)))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def append(self, text, path=None):
+        with open(path or self.path, 'a') as f:
+            f.write(text)
+
+    def read(self, follower):
+        x, y, truncated = follower.read()
+        return x.tolist(), y.tolist(), truncated
+
+    def test_reads_only_appended_rows(self):
+        follower = tail.Follower(self.path)
+        self.assertEqual(len(self.read(follower)[0]), 10)
+        self.assertEqual(self.read(follower), ([], [], False))
+
+        self.append(row_text(2000.0) + row_text(2001.0, None))
+        self.assertEqual(self.read(follower),
+                         ([2000.0, 2001.0], [5.0, core.TIMEOUT_RTT], False))
+        self.assertEqual(follower.offset, os.path.getsize(self.path))
+
+    @settings(max_examples=30, deadline=None)
+    @given(st.integers(min_value=1, max_value=40))
+    def test_partial_rows(self, cut):
+        text = row_text(2000.0) + row_text(2001.0)
+        follower = tail.Follower(self.path, os.path.getsize(self.path),
+                                 chunk_bytes=7)
+        self.append(text[:cut])
+        first = self.read(follower)[0]
+        self.append(text[cut:])
+        self.assertEqual(first + self.read(follower)[0], [2000.0, 2001.0])
+        os.truncate(self.path, os.path.getsize(self.path) - len(text))
+
+    def test_offset_inside_a_row(self):
+        follower = tail.Follower(self.path, 5)
+        self.assertEqual(self.read(follower)[0],
+                         [1000.0 + i for i in range(1, 10)])
+
+    def test_missing_log(self):
+        follower = tail.Follower(os.path.join(self.dir.name, 'new.csv'))
+        self.assertEqual(self.read(follower), ([], [], False))
+        self.append(row_text(3000.0), follower.path)
+        self.assertEqual(self.read(follower)[0], [3000.0])
+
+    def test_rotation(self):
+        follower = tail.Follower(self.path)
+        self.read(follower)
+
+        self.append(row_text(2000.0))
+        os.replace(self.path, self.path + '.1000000')
+        self.append(row_text(3000.0))
+        self.assertEqual(self.read(follower), ([2000.0, 3000.0],
+                                               [5.0, 5.0], False))
+
+        os.remove(self.path)  # between a rotation and the next row
+        self.assertEqual(self.read(follower)[0], [])
+        self.append(row_text(4000.0))
+        self.assertEqual(self.read(follower)[0], [4000.0])
+
+    def test_truncation(self):
+        follower = tail.Follower(self.path)
+        self.read(follower)
+
+        with open(self.path, 'w') as f:
+            f.write(row_text(5000.0))
+        self.assertEqual(self.read(follower), ([5000.0], [5.0], True))
+        self.assertEqual(self.read(follower), ([], [], False))
+
+    def check_watcher(self, watcher):
+        self.addCleanup(watcher.close)
+        self.assertFalse(watcher.changed())
+
+        self.append(row_text(2000.0))
+        self.assertTrue(watcher.changed())
+        self.assertFalse(watcher.changed())
+
+        self.append('', os.path.join(self.dir.name, 'other.csv'))
+        os.replace(self.path, self.path + '.1000000')
+        self.append(row_text(3000.0))
+        self.assertTrue(watcher.changed())
+
+    def test_inotify_watcher(self):
+        watcher = tail.Watcher(self.path)
+        if watcher.fd is None:
+            self.skipTest('needs inotify')
+        self.check_watcher(watcher)
+
+    def test_polling_watcher(self):
+        watcher = tail.Watcher(self.path, inotify=False)
+        self.assertIsNone(watcher.fd)
+        self.check_watcher(watcher)
+
+
+if __name__ == '__main__':
+    unittest.main()
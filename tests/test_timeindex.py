@@ -0,0 +1,93 @@
+import unittest
+from hypothesis import given, settings, strategies as st
+
+# Test resources
+import os
+import tempfile
+
+# PingStats modules
+import core
+import csvlog
+import timeindex
+
+
+class TimeIndex_test(unittest.TestCase):
+    """ Tests `timeindex` upkeep and range reads through `csvlog`. """
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.dir.name, 'log.csv')
+        open(cls.path, 'w').close()
+
+        with open(cls.path, 'a+') as f:
+            writer = core.BatchWriter(f, batch_rows=100,
+                                      index=timeindex.TimeIndex(cls.path, 10))
+            for i in range(1000):
+                writer.writerow((1000.0 + i, '' if i % 7 else 5.0, 3000, 64,
+                                 'a'))
+            writer.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.dir.cleanup()
+
+    def test_index_entries(self):
+        timestamps, offsets = timeindex.read_index(self.path)
+
+        self.assertEqual(timestamps, [1000.0 + i for i in range(0, 1000, 10)])
+        with open(self.path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                self.assertEqual(timeindex.row_timestamp(f.readline()),
+                                 timestamps[offsets.index(offset)])
+
+    def test_rebuild_matches_live_index(self):
+        live = timeindex.read_index(self.path)
+        timeindex.rebuild(self.path, 10)
+
+        self.assertEqual(timeindex.read_index(self.path), live)
+
+    @settings(max_examples=50)
+    @given(st.floats(min_value=900, max_value=2100),
+           st.floats(min_value=0, max_value=1200))
+    def test_range_matches_full_read(self, start, length):
+        end = start + length
+        x, y = csvlog.read(self.path)
+        keep = (x >= start) & (x <= end)
+        rx, ry = csvlog.read(self.path, start, end)
+
+        self.assertEqual(list(rx), list(x[keep]))
+        self.assertEqual(list(ry), list(y[keep]))
+
+    def test_range_reads_less(self):
+        offset, limit = timeindex.byte_range(self.path, 1500.0, 1520.0,
+                                             slack=0)
+        self.assertGreater(offset, 0)
+        self.assertLess(limit, os.path.getsize(self.path) / 10)
+
+        offset, limit = timeindex.byte_range(self.path, 1500.0, 1520.0)
+        self.assertGreater(offset, 0)
+        self.assertLess(limit, os.path.getsize(self.path) / 5)
+
+    @settings(max_examples=50, deadline=None)
+    @given(st.floats(min_value=900, max_value=2100),
+           st.floats(min_value=0, max_value=300))
+    def test_out_of_order_rows(self, start, length):
+        # Every fifth probe is lost, and its row written 3s late.
+        path = os.path.join(self.dir.name, 'unsorted.csv')
+        if not os.path.exists(path):
+            open(path, 'w').close()
+            rows = sorted(((1000.0 + i, '' if i % 5 == 0 else 5.0, 3000, 64,
+                            'a') for i in range(1000)),
+                          key=lambda row: row[0] + (3 if row[1] == '' else 0))
+            with open(path, 'a+') as f:
+                writer = core.BatchWriter(f, index=timeindex.TimeIndex(path,
+                                                                       10))
+                writer.writerows(rows)
+                writer.close()
+
+        end = start + length
+        x, y = csvlog.read(path)
+        keep = (x >= start) & (x <= end)
+        self.assertEqual(sorted(csvlog.read(path, start, end)[0]),
+                         sorted(x[keep]))
@@ -0,0 +1,127 @@
+""" A sparse time index for PingStats CSV logs.
+
+The index is a '.idx' sidecar next to the log holding a `(timestamp, byte
+offset)` entry for every `every`th row, so a time range can be read by
+seeking straight to it instead of parsing the log from the start. `core.Core`
+keeps the index up to date while it writes, and `rebuild` creates one for
+an existing log. Offsets assume the log is ASCII, which PingStats logs are.
+"""
+import os
+import bisect
+import struct
+
+from log import core_logger as logger
+
+EXTENSION = '.idx'
+ENTRY = struct.Struct('<dQ')
+EVERY = 1024
+# Rows are written as their probes end, so the row of a lost probe follows
+# rows stamped up to its timeout later. Searches by time are widened by
+# this many seconds, which covers timeouts of up to a minute.
+SLACK = 60.0
+
+
+def index_path(path):
+    """ Returns the path of the index sidecar for the log at `path`. """
+    return path + EXTENSION
+
+
+def row_timestamp(line):
+    """ Returns the timestamp of a CSV log `line`, in bytes. """
+    import binlog  # binlog imports core, which imports this module
+    return binlog.parse_timestamp(line[:line.index(b',')].decode())
+
+
+class TimeIndex:
+    """ Appends entries to the index of the log at `path` as rows are
+    written to it. """
+
+    def __init__(self, path, every=EVERY):
+        if every < 1:
+            raise ValueError('every must be at least 1')
+
+        self.path = index_path(path)
+        self.every = every
+        self.entries = []
+        self.rows = 0
+
+        if os.path.getsize(path) and not os.path.exists(self.path):
+            logger.info('Indexing %s' % path)
+            rebuild(path, every)
+
+    def add(self, timestamp, offset):
+        """ Notes that a row stamped `timestamp` starts at byte `offset`. """
+        if self.rows % self.every == 0:
+            self.entries.append(ENTRY.pack(timestamp, offset))
+        self.rows += 1
+
+    def flush(self):
+        """ Appends the held entries to the index file. """
+        if self.entries:
+            with open(self.path, 'ab') as f:
+                f.write(b''.join(self.entries))
+            self.entries = []
+
+
+def read_index(path):
+    """ Returns the `(timestamps, offsets)` lists in the index of the log at
+    `path`, or two empty lists if it has none. """
+    try:
+        with open(index_path(path), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return [], []
+
+    data = data[:len(data) - len(data) % ENTRY.size]
+    entries = [ENTRY.unpack_from(data, i)
+               for i in range(0, len(data), ENTRY.size)]
+    return [e[0] for e in entries], [e[1] for e in entries]
+
+
+def rebuild(path, every=EVERY):
+    """ Replaces the index of the log at `path` with one built by scanning
+    the whole log. Returns the number of entries written. """
+    if every < 1:
+        raise ValueError('every must be at least 1')
+
+    entries = []
+    offset = 0
+    with open(path, 'rb') as f:
+        for i, line in enumerate(f):
+            if i % every == 0:
+                try:
+                    entries.append(ENTRY.pack(row_timestamp(line), offset))
+                except ValueError:
+                    logger.warning('Skipping malformed row: %s' % line)
+            offset += len(line)
+
+    with open(index_path(path), 'wb') as f:
+        f.write(b''.join(entries))
+    return len(entries)
+
+
+def byte_range(path, start=None, end=None, slack=SLACK):
+    """ Returns the `(offset, limit)` of the part of the log at `path` that
+    holds every row from `start` to `end`, as epoch timestamps. `limit` is
+    None when the range runs to the end of the log.
+
+    The log may be out of order by up to `slack` seconds, so the range is
+    widened by `slack` and then to the nearest index entries. The rows still
+    need to be filtered by time. """
+    timestamps, offsets = read_index(path)
+    offset = 0
+    limit = None
+
+    # Both searches stop beside an entry on the far side of the widened
+    # bound, which is all they need, even where the entries are unsorted.
+    if start is not None:
+        i = bisect.bisect_left(timestamps, start - slack) - 1
+        if i > 0:
+            offset = offsets[i]
+
+    if end is not None:
+        i = bisect.bisect_right(timestamps, end + slack)
+        if i < len(offsets):
+            limit = offsets[i] - offset
+
+    return offset, limit